@@ -1,3 +1,17 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import AuditEvent, Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "progress", "attempts", "created_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("artifact",)
+
+
+@admin.register(AuditEvent)
+class AuditEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "created_at", "source", "actor", "remote_addr", "total_score", "risk_tier")
+    list_filter = ("source", "meets_classification")
+    search_fields = ("actor", "remote_addr")
@@ -0,0 +1,250 @@
+"""
+Admission control for expensive endpoints.
+
+settings.ADMISSION_LIMITS maps URL names to limits, e.g.
+
+    {"criteria:export_pdf": {"slots": 2, "queue": 4, "timeout": 5.0, "retry_after": 2}}
+
+At most `slots` requests to that endpoint run at once on the host (all
+workers and threads), at most `queue` more wait up to `timeout` seconds for a
+slot, and anything beyond is answered immediately with 503 + Retry-After.
+
+Slots and queue places are `flock`ed files in ADMISSION_DIR, one file per
+place: the kernel releases a place when its holder closes it or dies, so a
+crashed worker never leaks capacity. For streaming responses the slot is held
+until the response is closed.
+
+Limits of the queue:
+- waiters poll for a free slot every POLL_INTERVAL, so a released slot goes
+  to whichever waiter (on any worker) polls first, not to the oldest one;
+- a queued sync request keeps its worker (a gunicorn sync worker or thread)
+  busy sleeping until it gets a slot or times out, which is capacity every
+  other endpoint loses. Sync requests are therefore not queued unless
+  ADMISSION_SYNC_QUEUE is set: with no free slot they get 503 at once.
+  Async requests wait on the event loop and always use the queue.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+from . import metrics
+
+POLL_INTERVAL = 0.02
+
+
+def admission_dir() -> Path:
+    return Path(getattr(settings, "ADMISSION_DIR", None) or Path(tempfile.gettempdir()) / "sleweb-admission")
+
+
+def _try_lock(path: Path) -> Optional[int]:
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _unlock(fd: int) -> None:
+    try:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+@dataclass
+class Limiter:
+    endpoint: str
+    slots: int
+    queue: int = 0
+    timeout: float = 5.0
+    retry_after: int = 2
+    directory: Optional[Path] = None
+
+    def __post_init__(self):
+        directory = self.directory or admission_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        safe = self.endpoint.replace(":", "__")
+        self._slot_paths = [directory / f"{safe}.slot{i}" for i in range(self.slots)]
+        self._queue_paths = [directory / f"{safe}.queue{i}" for i in range(self.queue)]
+
+    def _first_free(self, paths) -> Optional[int]:
+        for path in paths:
+            fd = _try_lock(path)
+            if fd is not None:
+                return fd
+        return None
+
+    def _enter(self) -> Tuple[Optional[int], Optional[int]]:
+        """
+        (slot_fd, None) when a slot is free, (None, queue_fd) when queued;
+        raises Rejected("queue_full") otherwise.
+        """
+        fd = self._first_free(self._slot_paths)
+        if fd is not None:
+            return fd, None
+        queue_fd = self._first_free(self._queue_paths)
+        if queue_fd is None:
+            raise Rejected("queue_full")
+        return None, queue_fd
+
+    def acquire(self, queue: bool = True) -> int:
+        """
+        Blocking acquire; returns the slot fd to pass to release(). With
+        queue=False, fail at once (queue_full) when no slot is free.
+        """
+        t0 = time.monotonic()
+        if not queue:
+            fd = self._first_free(self._slot_paths)
+            if fd is None:
+                raise Rejected("queue_full")
+            self._admitted(t0)
+            return fd
+        fd, queue_fd = self._enter()
+        if fd is None:
+            metrics.REGISTRY.gauge_add("sle_admission_queue_depth", 1, endpoint=self.endpoint)
+            try:
+                deadline = t0 + self.timeout
+                while fd is None:
+                    if time.monotonic() >= deadline:
+                        raise Rejected("timeout")
+                    time.sleep(POLL_INTERVAL)
+                    fd = self._first_free(self._slot_paths)
+            finally:
+                metrics.REGISTRY.gauge_add("sle_admission_queue_depth", -1, endpoint=self.endpoint)
+                _unlock(queue_fd)
+        self._admitted(t0)
+        return fd
+
+    async def aacquire(self) -> int:
+        """
+        Same as acquire() but waits with asyncio.sleep instead of blocking the thread.
+        """
+        t0 = time.monotonic()
+        fd, queue_fd = self._enter()
+        if fd is None:
+            metrics.REGISTRY.gauge_add("sle_admission_queue_depth", 1, endpoint=self.endpoint)
+            try:
+                deadline = t0 + self.timeout
+                while fd is None:
+                    if time.monotonic() >= deadline:
+                        raise Rejected("timeout")
+                    await asyncio.sleep(POLL_INTERVAL)
+                    fd = self._first_free(self._slot_paths)
+            finally:
+                metrics.REGISTRY.gauge_add("sle_admission_queue_depth", -1, endpoint=self.endpoint)
+                _unlock(queue_fd)
+        self._admitted(t0)
+        return fd
+
+    def _admitted(self, t0: float) -> None:
+        metrics.REGISTRY.observe("sle_admission_wait_seconds", time.monotonic() - t0, endpoint=self.endpoint)
+        metrics.REGISTRY.gauge_add("sle_admission_in_use", 1, endpoint=self.endpoint)
+
+    def release(self, fd: int) -> None:
+        metrics.REGISTRY.gauge_add("sle_admission_in_use", -1, endpoint=self.endpoint)
+        _unlock(fd)
+
+
+def limiters_from_settings() -> Dict[str, Limiter]:
+    limits = getattr(settings, "ADMISSION_LIMITS", None) or {}
+    return {name: Limiter(endpoint=name, **conf) for name, conf in limits.items()}
+
+
+@lru_cache(maxsize=1024)
+def _url_name(urlconf: Optional[str], path: str) -> Optional[str]:
+    try:
+        return resolve(path, urlconf=urlconf).view_name
+    except Resolver404:
+        return None
+
+
+class AdmissionMiddleware:
+    """
+    Applies ADMISSION_LIMITS by URL name. Place it after MetricsMiddleware (so
+    rejections are counted) and before anything expensive.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "ADMISSION_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.limiters = limiters_from_settings()
+        if not self.limiters:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sync_queue = bool(getattr(settings, "ADMISSION_SYNC_QUEUE", False))
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _limiter(self, request) -> Optional[Limiter]:
+        return self.limiters.get(_url_name(getattr(request, "urlconf", None), request.path_info))
+
+    def _reject(self, limiter: Limiter, reason: str) -> JsonResponse:
+        metrics.REGISTRY.inc("sle_admission_rejected_total", endpoint=limiter.endpoint, reason=reason)
+        response = JsonResponse({"error": "Máy chủ đang bận, vui lòng thử lại sau."}, status=503)
+        response["Retry-After"] = str(limiter.retry_after)
+        return response
+
+    def _hold(self, limiter: Limiter, fd: int, response):
+        if response.streaming:
+            response._resource_closers.append(lambda: limiter.release(fd))
+        else:
+            limiter.release(fd)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        limiter = self._limiter(request)
+        if limiter is None:
+            return self.get_response(request)
+        try:
+            fd = limiter.acquire(queue=self.sync_queue)
+        except Rejected as e:
+            return self._reject(limiter, e.reason)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            limiter.release(fd)
+            raise
+        return self._hold(limiter, fd, response)
+
+    async def __acall__(self, request):
+        limiter = self._limiter(request)
+        if limiter is None:
+            return await self.get_response(request)
+        try:
+            fd = await limiter.aacquire()
+        except Rejected as e:
+            return self._reject(limiter, e.reason)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            limiter.release(fd)
+            raise
+        return self._hold(limiter, fd, response)
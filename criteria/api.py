@@ -0,0 +1,247 @@
+"""
+Request parsing and response payloads for the scoring API, kept free of
+Django request/response objects so the Django views and the raw WSGI fast
+path (fastpath.py) share exactly the same behavior.
+"""
+
+from __future__ import annotations
+
+import json
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpRequest
+
+from . import cbor, reachability
+from .scoring import DomainScore, ScoreResult, criterion_ids, get_domains
+
+ALLOWED_IDS = frozenset(c.id for d in get_domains() for c in d.criteria)
+MAX_MASK = (1 << len(criterion_ids())) - 1
+MAX_MASK_DIGITS = (len(criterion_ids()) + 3) // 4
+# Larger integer masks are rejected without listing their unknown bits.
+MAX_INT_MASK_BITS = 64
+
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def payload(self) -> Dict[str, Any]:
+        return {"error": self.message}
+
+
+_BITS: Dict[str, int] = {cid: 1 << i for i, cid in enumerate(criterion_ids())}
+_HEX = frozenset("0123456789abcdefABCDEF")
+
+
+def _hex_digits(text: str) -> Optional[str]:
+    """
+    Significant digits of a plain hex string, or None if it has anything
+    int(..., 16) would also accept besides hex digits (sign, "_", whitespace).
+    """
+    if not text or not _HEX.issuperset(text):
+        return None
+    return text.lstrip("0") or "0"
+
+
+def _short(value: str, limit: int = 32) -> str:
+    return repr(value if len(value) <= limit else value[:limit] + "...")
+
+
+def parse_selections(value: Any, field: str = "selections") -> Dict[str, bool]:
+    """
+    Validate a criterion set given as an object of flags, or a list of criterion IDs.
+    Objects keep the original lenient contract (unknown keys ignored); lists
+    are strict and name every unknown ID with its position.
+    """
+    if value is None:
+        return {}
+    if isinstance(value, dict):
+        return {k: bool(v) for k, v in value.items() if k in ALLOWED_IDS}
+    if isinstance(value, list):
+        bad = [
+            f"{field}[{i}]: unknown criterion id {cid!r}" if isinstance(cid, str) else f"{field}[{i}]: expected a criterion id string"
+            for i, cid in enumerate(value)
+            if not isinstance(cid, str) or cid not in _BITS
+        ]
+        if bad:
+            raise ApiError("; ".join(bad))
+        return {cid: True for cid in value}
+    raise ApiError(f"{field} must be an object/dict or a list of criterion ids")
+
+
+def parse_mask(value: Any, field: str = "mask") -> int:
+    """
+    Criterion set as an integer mask or a hex string (bit i = scoring.criterion_ids()[i]).
+    """
+    if isinstance(value, bool):
+        raise ApiError(f"{field} must be an integer or a hex string")
+    if isinstance(value, str):
+        digits = _hex_digits(value[2:] if value[:2].lower() == "0x" else value)
+        if digits is None:
+            raise ApiError(f"{field}: invalid hex string {_short(value)}")
+        if len(digits) > MAX_MASK_DIGITS:
+            raise ApiError(f"{field}: more than {MAX_MASK_DIGITS} hex digits (max {MAX_MASK:#x})")
+        mask = int(digits, 16)
+    elif isinstance(value, int):
+        mask = value
+        if mask < 0:
+            raise ApiError(f"{field} must be >= 0")
+        if mask.bit_length() > MAX_INT_MASK_BITS:
+            raise ApiError(f"{field} out of range (max {MAX_MASK:#x})")
+    else:
+        raise ApiError(f"{field} must be an integer or a hex string")
+    extra = mask >> len(_BITS)
+    if extra:
+        unknown = []
+        while extra and len(unknown) < 9:
+            low = extra & -extra
+            unknown.append(len(_BITS) + low.bit_length() - 1)
+            extra ^= low
+        shown = ", ".join(map(str, unknown[:8])) + (", ..." if len(unknown) > 8 else "")
+        raise ApiError(f"{field}: bit(s) {shown} do not map to a criterion (max {MAX_MASK:#x})")
+    return mask
+
+
+def parse_score_input(payload: Any) -> Tuple[bool, Dict[str, bool]]:
+    """
+    One scoring input: {"ana_positive": bool} plus the criterion set as
+    "selections" (object of flags or list of IDs) or "mask" (int or hex string).
+    """
+    if not isinstance(payload, dict):
+        raise ApiError("Invalid JSON body")
+    ana_positive = bool(payload.get("ana_positive"))
+    if "mask" in payload:
+        if payload.get("selections") is not None:
+            raise ApiError("Give either selections or mask, not both")
+        mask = parse_mask(payload["mask"])
+        return ana_positive, {cid: True for cid, bit in _BITS.items() if mask & bit}
+    return ana_positive, parse_selections(payload.get("selections"))
+
+
+def parse_score_request(body: bytes) -> Tuple[bool, Dict[str, bool]]:
+    """
+    POST JSON, any of:
+    {"ana_positive": true, "selections": {"fever": true, "leukopenia": false, ...}}
+    {"ana_positive": true, "selections": ["fever", "leukopenia"]}
+    {"ana_positive": true, "mask": 65}    or    {"ana_positive": true, "mask": "41"}
+    Unknown keys in the object form are ignored; the list and mask forms reject them.
+    """
+    try:
+        payload = json.loads(body.decode("utf-8"))
+    except Exception:
+        raise ApiError("Invalid JSON body")
+    return parse_score_input(payload)
+
+
+def parse_score_path(ana: str, mask: str) -> Tuple[bool, int]:
+    """
+    `GET /api/score/<ana>/<mask>`: ana is 1/0, mask is the criterion set as hex
+    (bit i = scoring.criterion_ids()[i]).
+    """
+    if ana not in ("0", "1"):
+        raise ApiError("ana must be 0 or 1")
+    digits = _hex_digits(mask)
+    if digits is None:
+        raise ApiError("mask must be hexadecimal")
+    value = int(digits, 16) if len(digits) <= MAX_MASK_DIGITS else MAX_MASK + 1
+    if value > MAX_MASK:
+        raise ApiError(f"mask out of range (max {MAX_MASK:x})")
+    return ana == "1", value
+
+
+def canonical_score_path(ana_positive: bool, mask: int) -> Tuple[str, str]:
+    """
+    Canonical (ana, mask) URL parts: lowercase hex without leading zeros, and
+    mask 0 when ANA is negative (the payload does not depend on it then).
+    """
+    if not ana_positive:
+        return "0", "0"
+    return "1", f"{mask:x}"
+
+
+def _domain_payload(ds: DomainScore) -> Dict[str, Any]:
+    return {
+        "domain_id": ds.domain_id,
+        "domain_label": ds.domain_label,
+        "awarded_points": ds.awarded_points,
+        "awarded_criterion": (
+            {
+                "id": ds.awarded_criterion.id,
+                "label": ds.awarded_criterion.label,
+                "points": ds.awarded_criterion.points,
+            }
+            if ds.awarded_criterion
+            else None
+        ),
+        "selected_criteria": [
+            {"id": c.id, "label": c.label, "points": c.points}
+            for c in ds.selected_criteria
+        ],
+        "note": ds.note,
+    }
+
+
+# Response fields in output order; each builder only runs when its field is requested.
+PAYLOAD_FIELDS: Dict[str, Callable[[ScoreResult], Any]] = {
+    "ana_positive": lambda r: r.ana_positive,
+    "eligible": lambda r: r.eligible,
+    "ineligible_reason": lambda r: r.ineligible_reason,
+    "total_score": lambda r: r.total_score,
+    "meets_classification": lambda r: r.meets_classification,
+    "risk_tier": lambda r: r.risk_tier,
+    "risk_note": lambda r: r.risk_note,
+    "domains": lambda r: [_domain_payload(ds) for ds in r.domain_scores],
+    "reachability": lambda r: [reachability.reach_payload(x) for x in reachability.reach_for_result(r)] or None,
+}
+# Only returned when asked for with `fields=`; the default payload stays unchanged.
+OPTIONAL_FIELDS = frozenset({"reachability"})
+
+
+@lru_cache(maxsize=256)
+def parse_fields(value: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    `fields=total_score,risk_tier` -> the requested fields in output order,
+    or None (all default fields) when the parameter is absent or empty.
+    """
+    if not value:
+        return None
+    wanted = {f.strip() for f in value.split(",") if f.strip()}
+    unknown = sorted(wanted - PAYLOAD_FIELDS.keys())
+    if unknown:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(PAYLOAD_FIELDS)}")
+    return tuple(f for f in PAYLOAD_FIELDS if f in wanted)
+
+
+def score_payload(result: ScoreResult, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    if fields is None:
+        return {name: build(result) for name, build in PAYLOAD_FIELDS.items() if name not in OPTIONAL_FIELDS}
+    return {name: PAYLOAD_FIELDS[name](result) for name in fields}
+
+
+# -- content negotiation ----------------------------------------------------
+
+JSON = "application/json"
+MEDIA_TYPES = (JSON, cbor.CONTENT_TYPE)
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Response media type for an Accept header (same matching as
+    HttpRequest.get_preferred_type); JSON unless CBOR is preferred.
+    """
+    request = HttpRequest()
+    if accept is not None:
+        request.META["HTTP_ACCEPT"] = accept
+    return request.get_preferred_type(MEDIA_TYPES) or JSON
+
+
+def encode(data: Any, media_type: str) -> bytes:
+    if media_type == cbor.CONTENT_TYPE:
+        return cbor.dumps(data)
+    # Same encoding as JsonResponse's defaults.
+    return json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8")
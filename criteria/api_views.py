@@ -0,0 +1,144 @@
+"""
+Views of the machine-facing API (scoring, readiness, metrics).
+
+Kept apart from views.py, which also pulls in forms, templates, PDF export and
+the test-case runner, so the API-only profile (sleweb/settings_api.py) imports
+only what these endpoints need. views.py re-exports them.
+"""
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponsePermanentRedirect, JsonResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from . import audit, metrics, warmup
+from .idempotency import idempotent
+from .api import (
+    PAYLOAD_FIELDS,
+    ApiError,
+    canonical_score_path,
+    encode,
+    negotiate,
+    parse_fields,
+    parse_score_path,
+    parse_score_request,
+    score_payload,
+)
+from .scoring import compute_score, ruleset_version, selections_from_mask
+
+
+def api_response(request: HttpRequest, data, status: int = 200) -> HttpResponse:
+    """
+    Encode an API payload as JSON or CBOR according to the Accept header.
+    """
+    media_type = negotiate(request.headers.get("Accept"))
+    response = HttpResponse(encode(data, media_type), content_type=media_type, status=status)
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@idempotent("api_score")
+def api_score(request: HttpRequest):
+    """
+    POST JSON:
+    {
+      "ana_positive": true,
+      "selections": { "fever": true, "leukopenia": false, ... }
+    }
+    or the compact forms "selections": ["fever", ...] / "mask": 65 / "mask": "41"
+    (see api.parse_score_request).
+
+    `?fields=total_score,risk_tier` limits the response to those fields;
+    `Accept: application/cbor` returns CBOR instead of JSON. A retried request
+    carrying the same `Idempotency-Key` gets the first response back
+    (idempotency.py).
+
+    Stateless (no session/cookie auth), so CSRF does not apply. Production WSGI
+    serves this path through fastpath.ScoreFastPath; keep both in sync via api.py.
+    """
+    try:
+        fields = parse_fields(request.GET.get("fields"))
+        ana_positive, selections = parse_score_request(request.body)
+    except ApiError as e:
+        return api_response(request, e.payload(), status=e.status)
+
+    with metrics.stage("compute_score"):
+        result = compute_score(ana_positive=ana_positive, selections=selections)
+    audit.record_request("api_score", request, ana_positive, selections, result)
+    return api_response(request, score_payload(result, fields))
+
+
+def _score_etag(ana: str, mask: str, fields, media_type: str) -> str:
+    tag = f"{ruleset_version()}-{ana}-{mask}"
+    if fields is not None:
+        tag += "-f" + format(sum(1 << i for i, name in enumerate(PAYLOAD_FIELDS) if name in fields), "x")
+    if media_type != "application/json":
+        tag += "-cbor"
+    return f'"{tag}"'
+
+
+@require_http_methods(["GET", "HEAD"])
+def api_score_get(request: HttpRequest, ana: str, mask: str):
+    """
+    GET /api/score/<ana>/<mask>: same payload as POST /api/score, addressed by
+    ANA (1/0) and the hex criterion mask (bit i = scoring.criterion_ids()[i]).
+    Cacheable: strong ETag over (ruleset version, ana, mask, fields, encoding)
+    and public Cache-Control for API_SCORE_CACHE_MAX_AGE seconds, after which
+    caches revalidate (the URL does not carry the ruleset version, so the ETag
+    is what notices a ruleset change). Non-canonical URLs redirect to the
+    canonical one so caches see a single key per input.
+    """
+    try:
+        fields = parse_fields(request.GET.get("fields"))
+        ana_positive, value = parse_score_path(ana, mask)
+    except ApiError as e:
+        return api_response(request, e.payload(), status=e.status)
+
+    canonical = canonical_score_path(ana_positive, value)
+    if (ana, mask) != canonical:
+        url = reverse("criteria:api_score_get", args=canonical)
+        query = request.META.get("QUERY_STRING")
+        return HttpResponsePermanentRedirect(f"{url}?{query}" if query else url)
+
+    etag = _score_etag(*canonical, fields, negotiate(request.headers.get("Accept")))
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        selections = selections_from_mask(value)
+        with metrics.stage("compute_score"):
+            result = compute_score(ana_positive=ana_positive, selections=selections)
+        audit.record_request("api_score_get", request, ana_positive, selections, result)
+        response = api_response(request, score_payload(result, fields))
+    else:
+        patch_vary_headers(response, ("Accept",))
+    response["ETag"] = etag
+    response["X-Ruleset-Version"] = ruleset_version()
+    patch_cache_control(response, public=True, must_revalidate=True, max_age=int(getattr(settings, "API_SCORE_CACHE_MAX_AGE", 60)))
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def readyz(request: HttpRequest):
+    """
+    Readiness probe: 503 until this worker has finished warmup.warm_up()
+    (started here in the background if no server hook started it).
+    """
+    if not warmup.is_ready():
+        warmup.start_background()
+        response = JsonResponse({"ready": False}, status=503)
+        response["Retry-After"] = "1"
+    else:
+        response = JsonResponse({"ready": True, **warmup.report()})
+    patch_cache_control(response, no_store=True)
+    return response
+
+
+@require_http_methods(["GET"])
+def metrics_view(request: HttpRequest):
+    """
+    Prometheus text exposition of request/stage metrics aggregated across workers.
+    """
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CriteriaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'criteria'
+
+    def ready(self):
+        if getattr(settings, "WARMUP_ON_READY", False):
+            from . import warmup
+
+            warmup.start_background()
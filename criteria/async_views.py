@@ -0,0 +1,138 @@
+"""
+Async versions of the API, test-case runner and PDF export views, routed by
+criteria/urls_asgi.py when the app is served over ASGI (sleweb/asgi.py).
+
+Scoring is a few microseconds of pure Python and runs on the event loop.
+Blocking work (file reads, the test-case runner, WeasyPrint) goes to the
+bounded pools in offload.py, so a slow PDF render waits on the `pdf` pool
+while scoring requests keep being served.
+"""
+
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.deprecation import MiddlewareMixin
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from . import audit, metrics, offload, run_cache
+from .api import ApiError, parse_fields, parse_score_request, score_payload
+from .api_views import api_response
+from .idempotency import idempotent
+from .pdf import PdfUnavailable, html_to_pdf, load_weasyprint, pdf_filename, render_report_html
+from .scoring import compute_score
+from .testcase_runner import iter_run_cases, run_cases
+from .views import (
+    TEST_CASES_PATH,
+    _run_result_to_dict,
+    _run_summary,
+    _run_workers,
+    _selected_cases,
+    _sse_event,
+)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@idempotent("api_score")
+async def api_score(request: HttpRequest):
+    """
+    Same contract as api_views.api_score.
+    """
+    try:
+        fields = parse_fields(request.GET.get("fields"))
+        ana_positive, selections = parse_score_request(request.body)
+    except ApiError as e:
+        return api_response(request, e.payload(), status=e.status)
+
+    with metrics.stage("compute_score"):
+        result = compute_score(ana_positive=ana_positive, selections=selections)
+    await audit.arecord_request("api_score", request, ana_positive, selections, result)
+    return api_response(request, score_payload(result, fields))
+
+
+def _load_suite():
+    return json.loads(TEST_CASES_PATH.read_text(encoding="utf-8"))
+
+
+async def _stream_run_events(cases):
+    results = []
+    done = object()
+    it = iter_run_cases(cases, max_workers=_run_workers(), cache=run_cache.default_cache())
+    try:
+        while True:
+            r = await offload.run("io", next, it, done)
+            if r is done:
+                break
+            row = _run_result_to_dict(r)
+            results.append({"status": row["status"], "cached": row["cached"]})
+            yield _sse_event("result", row)
+        yield _sse_event("summary", _run_summary(results))
+    finally:
+        # Closing runs the generator's cleanup (pool shutdown, run cache write).
+        await offload.run("io", it.close)
+
+
+@require_http_methods(["POST"])
+async def test_cases_run(request: HttpRequest):
+    """
+    Same contract as views.test_cases_run (including SSE streaming).
+    """
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except Exception:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    suite = await offload.run("io", _load_suite)
+    cases = _selected_cases(suite, payload.get("mode", "all"), payload.get("id"))
+
+    stream = bool(payload.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+    if stream:
+        resp = StreamingHttpResponse(_stream_run_events(cases), content_type="text/event-stream; charset=utf-8")
+        resp["Cache-Control"] = "no-cache"
+        resp["X-Accel-Buffering"] = "no"
+        return resp
+
+    run = await offload.run("io", run_cases, cases, max_workers=_run_workers(), cache=run_cache.default_cache())
+    results = [_run_result_to_dict(r) for r in run]
+    return JsonResponse({"summary": _run_summary(results), "results": results}, json_dumps_params={"ensure_ascii": False})
+
+
+@require_http_methods(["GET"])
+async def export_pdf(request: HttpRequest):
+    """
+    Same contract as views.export_pdf. Loading WeasyPrint (a slow first import)
+    and the PDF render run on the `pdf` pool, the template render on `io`.
+    """
+    report = await request.session.aget("last_report")
+    if not report:
+        return JsonResponse({"error": "Chưa có kết quả để xuất PDF. Hãy tính điểm trước."}, status=400)
+
+    try:
+        await offload.run("pdf", load_weasyprint)
+    except PdfUnavailable as e:
+        return JsonResponse({"error": str(e)}, status=500)
+
+    with metrics.stage("template_render"):
+        html = await offload.run("io", render_report_html, report)
+
+    with metrics.stage("weasyprint_render"):
+        pdf_bytes = await offload.run("pdf", html_to_pdf, html)
+
+    resp = HttpResponse(pdf_bytes, content_type="application/pdf")
+    resp["Content-Disposition"] = f'attachment; filename="{pdf_filename(report)}"'
+    return resp
+
+
+class AsgiUrlconfMiddleware(MiddlewareMixin):
+    """
+    Route ASGI requests through settings.ASGI_URLCONF (the async views);
+    WSGI requests keep ROOT_URLCONF.
+    """
+
+    def process_request(self, request):
+        urlconf = getattr(settings, "ASGI_URLCONF", None)
+        if urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = urlconf
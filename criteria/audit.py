@@ -0,0 +1,250 @@
+"""
+Write-behind audit log of scoring events (models.AuditEvent).
+
+record_score() only appends the event to an in-process buffer, so a scoring
+request never waits on the database. A daemon thread writes the buffer with
+one bulk_create per batch: as soon as AUDIT_BATCH_SIZE events are pending, or
+at most AUDIT_FLUSH_INTERVAL seconds after they were recorded. A batch the
+database does not accept is appended to a JSON-lines spool file
+(AUDIT_SPOOL_DIR/audit-<pid>.jsonl) and replayed by a later flush once writes
+succeed again (only after a spool: once at startup for files left by exited
+processes, then after this process spooled); events beyond AUDIT_MAX_BUFFER
+are spooled directly rather than growing the buffer. drain() stops the thread and writes what is left; it runs
+at exit and from gunicorn's worker_exit hook (gunicorn.conf.py).
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .metrics import _pid_alive
+from .scoring import ScoreResult, ruleset_version
+
+logger = logging.getLogger("criteria.audit")
+
+
+def spool_dir() -> Path:
+    return Path(getattr(settings, "AUDIT_SPOOL_DIR", None) or Path(settings.BASE_DIR) / "audit_spool")
+
+
+def _write(events: List[Dict[str, Any]]) -> None:
+    from .models import AuditEvent
+
+    AuditEvent.objects.bulk_create([AuditEvent(**event) for event in events], batch_size=500)
+
+
+class AuditBuffer:
+    def __init__(self, background: bool = True):
+        self.background = background
+        self._reset()
+
+    def _reset(self) -> None:
+        # Also called in a forked child: the parent still owns what it buffered.
+        self._pid = os.getpid()
+        self._events: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # Whether spool files may be waiting; starts set for those of exited processes.
+        self._spooled = True
+
+    @property
+    def pending(self) -> int:
+        return len(self._events)
+
+    def record(self, event: Dict[str, Any]) -> None:
+        if self._pid != os.getpid():
+            self._reset()
+        with self._cond:
+            if len(self._events) >= int(getattr(settings, "AUDIT_MAX_BUFFER", 10_000)):
+                full = True
+            else:
+                full = False
+                self._events.append(event)
+                if len(self._events) >= int(getattr(settings, "AUDIT_BATCH_SIZE", 200)):
+                    self._cond.notify()
+            if self.background and self._thread is None and not self._stopping:
+                self._thread = threading.Thread(target=self._run, name="audit-flush", daemon=True)
+                self._thread.start()
+        if full:
+            self._spool([event])
+
+    def flush(self, replay: bool = True) -> int:
+        """
+        Write the pending events (spooling them if the database fails) and
+        replay spooled batches, if any, once writes succeed; returns events
+        written.
+        """
+        with self._cond:
+            batch, self._events = self._events, []
+        written = 0
+        if batch:
+            try:
+                _write(batch)
+            except Exception:
+                logger.exception("Audit write of %s events failed; spooling them", len(batch))
+                self._spool(batch)
+                return 0
+            written = len(batch)
+        if replay and self._spooled:
+            self._spooled = False  # set again by _spool() if the replay fails
+            written += self._replay()
+        return written
+
+    def drain(self, timeout: float = 10.0) -> int:
+        """
+        Stop the flush thread and write everything still buffered (spooled
+        batches are left to the next process' flushes).
+        """
+        if self._pid != os.getpid():
+            return 0
+        with self._cond:
+            self._stopping = True
+            thread = self._thread
+            self._cond.notify()
+        if thread is not None:
+            thread.join(timeout)
+        return self.flush(replay=False)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._events) < int(getattr(settings, "AUDIT_BATCH_SIZE", 200)):
+                    self._cond.wait(float(getattr(settings, "AUDIT_FLUSH_INTERVAL", 2.0)))
+                stopping = self._stopping
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Audit flush failed")
+            finally:
+                close_old_connections()
+            if stopping:
+                return
+
+    # -- spool --------------------------------------------------------------
+
+    def _spool(self, events: List[Dict[str, Any]]) -> None:
+        directory = spool_dir()
+        lines = "".join(
+            json.dumps({**event, "created_at": event["created_at"].isoformat()}, ensure_ascii=False) + "\n"
+            for event in events
+        )
+        with self._spool_lock:
+            directory.mkdir(parents=True, exist_ok=True)
+            with open(directory / f"audit-{os.getpid()}.jsonl", "a", encoding="utf-8") as f:
+                f.write(lines)
+            self._spooled = True
+
+    def _replay(self) -> int:
+        """
+        Write spool files of this process and of processes that have exited.
+        """
+        directory = spool_dir()
+        if not directory.is_dir():
+            return 0
+        written = 0
+        for path in sorted(directory.glob("audit-*.jsonl")):
+            pid = path.stem.partition("-")[2]
+            if not pid.isdigit() or (int(pid) != os.getpid() and _pid_alive(int(pid))):
+                continue
+            claimed = path.with_name(f"{path.stem}.replay-{os.getpid()}")
+            with self._spool_lock:
+                try:
+                    os.rename(path, claimed)
+                except OSError:
+                    continue  # taken by another process
+            events = []
+            for line in claimed.read_text(encoding="utf-8").splitlines():
+                try:
+                    event = json.loads(line)
+                    event["created_at"] = datetime.fromisoformat(event["created_at"])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning("Skipping unreadable audit spool line in %s", path.name)
+                    continue
+                events.append(event)
+            try:
+                if events:
+                    _write(events)
+            except Exception:
+                logger.exception("Audit spool replay failed; keeping %s", path.name)
+                self._spool(events)
+                claimed.unlink()
+                break
+            claimed.unlink()
+            written += len(events)
+        return written
+
+
+BUFFER = AuditBuffer()
+
+
+def _username(user) -> str:
+    return user.get_username() if user is not None and user.is_authenticated else ""
+
+
+def request_actor(request) -> str:
+    return _username(getattr(request, "user", None))
+
+
+def record_score(
+    source: str,
+    ana_positive: bool,
+    selections: Dict[str, bool],
+    result: ScoreResult,
+    actor: str = "",
+    remote_addr: str = "",
+) -> None:
+    if not getattr(settings, "AUDIT_ENABLED", True):
+        return
+    BUFFER.record(
+        {
+            "created_at": timezone.now(),
+            "source": source,
+            "actor": actor,
+            "remote_addr": remote_addr or "",
+            "ana_positive": bool(ana_positive),
+            "selections": [cid for cid, on in selections.items() if on],
+            "total_score": result.total_score,
+            "meets_classification": result.meets_classification,
+            "risk_tier": result.risk_tier,
+            "ruleset_version": ruleset_version(),
+        }
+    )
+
+
+def record_request(source: str, request, ana_positive: bool, selections: Dict[str, bool], result: ScoreResult) -> None:
+    if not getattr(settings, "AUDIT_ENABLED", True):
+        return  # skip the user lookup
+    record_score(source, ana_positive, selections, result, request_actor(request), request.META.get("REMOTE_ADDR", ""))
+
+
+async def arecord_request(source: str, request, ana_positive: bool, selections: Dict[str, bool], result: ScoreResult) -> None:
+    """
+    record_request() for async views, where request.user cannot be evaluated.
+    """
+    if not getattr(settings, "AUDIT_ENABLED", True):
+        return
+    auser = getattr(request, "auser", None)
+    actor = _username(await auser()) if auser is not None else ""
+    record_score(source, ana_positive, selections, result, actor, request.META.get("REMOTE_ADDR", ""))
+
+
+@atexit.register
+def _drain_at_exit() -> None:
+    try:
+        BUFFER.drain(timeout=5.0)
+    except Exception:
+        pass
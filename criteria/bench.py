@@ -0,0 +1,396 @@
+"""
+Microbenchmarks for the scoring, form, serialization and view hot paths.
+
+Each benchmark is a setup function registered with @benchmark; it returns the
+zero-argument callable that is timed. Run them with `manage.py bench`.
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+import django
+
+SAMPLE_SELECTIONS = {
+    "fever": True,
+    "leukopenia": True,
+    "thrombocytopenia": True,
+    "oral_ulcers": True,
+    "joint_involvement": True,
+    "proteinuria": True,
+    "renal_biopsy_class_iii_or_iv": True,
+    "low_c3_or_c4": True,
+    "anti_dsdna_or_anti_sm": True,
+}
+
+SAMPLE_FORM_DATA = {
+    "full_name": "Nguyễn Văn A",
+    "patient_code": "BN-0001",
+    "ana_positive": "true",
+    **{k: "on" for k in SAMPLE_SELECTIONS},
+}
+
+BENCHMARKS: Dict[str, Callable[[], Optional[Callable[[], object]]]] = {}
+
+
+def benchmark(name: str):
+    """
+    Register a setup function. It returns the callable to time, or None when the
+    benchmark cannot run in this environment (e.g. WeasyPrint missing).
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _bench_client():
+    from django.test import Client
+
+    return Client()
+
+
+@benchmark("compute_score")
+def _compute_score():
+    from .scoring import compute_score
+
+    return lambda: compute_score(ana_positive=True, selections=SAMPLE_SELECTIONS)
+
+
+@benchmark("score_batch_10k")
+def _score_batch_10k():
+    """
+    10,000 mixed inputs scored and kept, like a registry rescore; peak bytes
+    show what a batch of results holds in memory.
+    """
+    import random
+
+    from .scoring import compute_score, criterion_ids
+
+    rng = random.Random(2019)
+    ids = criterion_ids()
+    inputs = [
+        (rng.random() < 0.9, {cid: True for cid in ids if rng.random() < 0.15}) for _ in range(10_000)
+    ]
+    return lambda: [compute_score(ana_positive=ana, selections=sel) for ana, sel in inputs]
+
+
+@benchmark("form_init")
+def _form_init():
+    from .forms import CriteriaForm
+
+    return lambda: CriteriaForm()
+
+
+@benchmark("form_validate")
+def _form_validate():
+    from .forms import CriteriaForm
+
+    def op():
+        form = CriteriaForm(SAMPLE_FORM_DATA)
+        form.is_valid()
+        return form.cleaned_selections(), form.cleaned_ana_positive(), form.cleaned_patient_info()
+
+    return op
+
+
+@benchmark("result_to_dict")
+def _result_to_dict():
+    from .scoring import compute_score
+    from .views import _result_to_dict
+
+    result = compute_score(ana_positive=True, selections=SAMPLE_SELECTIONS)
+    return lambda: _result_to_dict(result)
+
+
+@benchmark("radar_payload")
+def _radar_payload():
+    from .scoring import compute_score
+    from .views import _radar_payload
+
+    result = compute_score(ana_positive=True, selections=SAMPLE_SELECTIONS)
+    return lambda: _radar_payload(result)
+
+
+@benchmark("view_index_get")
+def _view_index_get():
+    client = _bench_client()
+    return lambda: client.get("/")
+
+
+@benchmark("view_index_post")
+def _view_index_post():
+    client = _bench_client()
+    return lambda: client.post("/", SAMPLE_FORM_DATA)
+
+
+@benchmark("view_api_score")
+def _view_api_score():
+    client = _bench_client()
+    body = json.dumps({"ana_positive": True, "selections": SAMPLE_SELECTIONS})
+    return lambda: client.post("/api/score", data=body, content_type="application/json")
+
+
+@benchmark("api_parse_object")
+def _api_parse_object():
+    from .api import parse_score_request
+
+    body = json.dumps({"ana_positive": True, "selections": SAMPLE_SELECTIONS}).encode()
+    return lambda: parse_score_request(body)
+
+
+@benchmark("api_parse_mask")
+def _api_parse_mask():
+    from .api import parse_score_request
+    from .scoring import mask_from_selections
+
+    body = json.dumps({"ana_positive": True, "mask": f"{mask_from_selections(SAMPLE_SELECTIONS):x}"}).encode()
+    return lambda: parse_score_request(body)
+
+
+@benchmark("api_encode_full_json")
+def _api_encode_full_json():
+    from .api import encode, score_payload
+    from .scoring import compute_score
+
+    result = compute_score(ana_positive=True, selections=SAMPLE_SELECTIONS)
+    return lambda: encode(score_payload(result), "application/json")
+
+
+@benchmark("api_encode_summary_cbor")
+def _api_encode_summary_cbor():
+    from .api import encode, parse_fields, score_payload
+    from .scoring import compute_score
+
+    result = compute_score(ana_positive=True, selections=SAMPLE_SELECTIONS)
+    fields = parse_fields("total_score,meets_classification,risk_tier")
+    return lambda: encode(score_payload(result, fields), "application/cbor")
+
+
+def _wsgi_call(app, body: bytes):
+    import io
+
+    def start_response(status, headers):
+        pass
+
+    def call():
+        environ = {
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": "/api/score",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "HTTP_HOST": "testserver",
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.url_scheme": "http",
+            "wsgi.errors": sys.stderr,
+        }
+        return b"".join(app(environ, start_response))
+
+    return call
+
+
+@benchmark("wsgi_api_score_django")
+def _wsgi_api_score_django():
+    from django.core.handlers.wsgi import WSGIHandler
+
+    body = json.dumps({"ana_positive": True, "selections": SAMPLE_SELECTIONS}).encode()
+    return _wsgi_call(WSGIHandler(), body)
+
+
+@benchmark("wsgi_api_score_fastpath")
+def _wsgi_api_score_fastpath():
+    from django.core.handlers.wsgi import WSGIHandler
+
+    from .fastpath import ScoreFastPath
+
+    body = json.dumps({"ana_positive": True, "selections": SAMPLE_SELECTIONS}).encode()
+    return _wsgi_call(ScoreFastPath(WSGIHandler()), body)
+
+
+@benchmark("view_test_cases_run")
+def _view_test_cases_run():
+    from django.test.utils import override_settings
+
+    client = _bench_client()
+
+    def call():
+        # Measure evaluating the suite, not run-cache hits, and keep the shared cache directory untouched.
+        with override_settings(TEST_CASES_CACHE=False):
+            return client.post("/test-cases/run", data={"mode": "all"}, content_type="application/json")
+
+    return call
+
+
+@benchmark("view_export_pdf")
+def _view_export_pdf():
+    try:
+        import weasyprint  # type: ignore  # noqa: F401
+    except Exception:
+        return None
+    client = _bench_client()
+    client.post("/", SAMPLE_FORM_DATA)
+    return lambda: client.get("/export/pdf")
+
+
+@dataclass
+class BenchResult:
+    name: str
+    iterations: int
+    ops_per_sec: float
+    mean_us: float
+    p50_us: float
+    p95_us: float
+    p99_us: float
+    peak_bytes_per_op: int
+    net_blocks_per_op: float
+
+
+def _percentile(sorted_values: List[int], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return float(sorted_values[k])
+
+
+def _allocations(op: Callable[[], object], n: int):
+    """
+    (peak traced bytes of a single op, net allocated blocks per op).
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peak = 0
+        for _ in range(n):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            op()
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    gc.collect()
+    before = sys.getallocatedblocks()
+    for _ in range(n):
+        op()
+    gc.collect()
+    net = (sys.getallocatedblocks() - before) / n
+    return peak, net
+
+
+def run_benchmark(name: str, op: Callable[[], object], iterations: int, max_time: float, warmup: int) -> BenchResult:
+    for _ in range(warmup):
+        op()
+
+    timings: List[int] = []
+    clock = time.perf_counter_ns
+    deadline = clock() + int(max_time * 1e9)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while len(timings) < iterations:
+            t0 = clock()
+            op()
+            t1 = clock()
+            timings.append(t1 - t0)
+            if t1 > deadline:
+                break
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    total_ns = sum(timings)
+    timings.sort()
+    peak, net = _allocations(op, min(len(timings), 50))
+    return BenchResult(
+        name=name,
+        iterations=len(timings),
+        ops_per_sec=len(timings) / (total_ns / 1e9) if total_ns else 0.0,
+        mean_us=total_ns / len(timings) / 1e3,
+        p50_us=_percentile(timings, 50) / 1e3,
+        p95_us=_percentile(timings, 95) / 1e3,
+        p99_us=_percentile(timings, 99) / 1e3,
+        peak_bytes_per_op=peak,
+        net_blocks_per_op=net,
+    )
+
+
+def run(
+    names: Optional[Iterable[str]] = None,
+    iterations: int = 2000,
+    max_time: float = 2.0,
+    warmup: int = 20,
+    log: Callable[[str], None] = lambda _msg: None,
+) -> Dict[str, object]:
+    selected = list(names) if names else list(BENCHMARKS)
+    unknown = [n for n in selected if n not in BENCHMARKS]
+    if unknown:
+        raise KeyError(", ".join(unknown))
+
+    results: Dict[str, dict] = {}
+    skipped: List[str] = []
+    for name in selected:
+        op = BENCHMARKS[name]()
+        if op is None:
+            skipped.append(name)
+            log(f"{name}: skipped (not available in this environment)")
+            continue
+        r = run_benchmark(name, op, iterations=iterations, max_time=max_time, warmup=warmup)
+        results[name] = asdict(r)
+        log(format_result(r))
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "platform": platform.platform(),
+            "iterations": iterations,
+            "max_time": max_time,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def format_result(r: BenchResult) -> str:
+    return (
+        f"{r.name:<22} {r.ops_per_sec:>12,.0f} ops/s  "
+        f"p50 {r.p50_us:>9.1f}us  p95 {r.p95_us:>9.1f}us  p99 {r.p99_us:>9.1f}us  "
+        f"peak {r.peak_bytes_per_op:>9,} B/op  net {r.net_blocks_per_op:>7.1f} blk/op  (n={r.iterations})"
+    )
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], threshold: float) -> List[Dict[str, object]]:
+    """
+    Compare ops/sec per benchmark. A benchmark regresses when it is slower than
+    the baseline by more than `threshold` (0.10 == 10%).
+    """
+    rows = []
+    base_results = baseline.get("results", {}) or {}
+    for name, cur in (current.get("results", {}) or {}).items():
+        base = base_results.get(name)
+        if not base or not base.get("ops_per_sec"):
+            continue
+        change = cur["ops_per_sec"] / base["ops_per_sec"] - 1.0
+        rows.append(
+            {
+                "name": name,
+                "baseline_ops_per_sec": base["ops_per_sec"],
+                "ops_per_sec": cur["ops_per_sec"],
+                "change": change,
+                "regression": change < -threshold,
+            }
+        )
+    return rows
@@ -0,0 +1,122 @@
+"""
+Minimal CBOR (RFC 8949) encoder/decoder for API payloads.
+
+Covers what score payloads contain: None, bools, ints, floats, str, bytes,
+lists/tuples and dicts with string keys. Encoding uses definite lengths and
+the shortest integer heads; floats are always 64-bit.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, List, Tuple
+
+CONTENT_TYPE = "application/cbor"
+
+_HEAD_STRUCTS = ((24, ">B", 0xFF), (25, ">H", 0xFFFF), (26, ">I", 0xFFFFFFFF), (27, ">Q", 0xFFFFFFFFFFFFFFFF))
+
+
+def _head(major: int, value: int, out: List[bytes]) -> None:
+    if value < 24:
+        out.append(bytes((major << 5 | value,)))
+        return
+    for info, fmt, limit in _HEAD_STRUCTS:
+        if value <= limit:
+            out.append(bytes((major << 5 | info,)) + struct.pack(fmt, value))
+            return
+    raise ValueError("integer too large for CBOR")
+
+
+def _encode(obj: Any, out: List[bytes]) -> None:
+    if obj is None:
+        out.append(b"\xf6")
+    elif obj is True:
+        out.append(b"\xf5")
+    elif obj is False:
+        out.append(b"\xf4")
+    elif isinstance(obj, int):
+        if obj >= 0:
+            _head(0, obj, out)
+        else:
+            _head(1, -1 - obj, out)
+    elif isinstance(obj, float):
+        out.append(b"\xfb" + struct.pack(">d", obj))
+    elif isinstance(obj, str):
+        data = obj.encode("utf-8")
+        _head(3, len(data), out)
+        out.append(data)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        _head(2, len(data), out)
+        out.append(data)
+    elif isinstance(obj, (list, tuple)):
+        _head(4, len(obj), out)
+        for item in obj:
+            _encode(item, out)
+    elif isinstance(obj, dict):
+        _head(5, len(obj), out)
+        for key, value in obj.items():
+            _encode(key, out)
+            _encode(value, out)
+    else:
+        raise TypeError(f"Object of type {type(obj).__name__} is not CBOR serializable")
+
+
+def dumps(obj: Any) -> bytes:
+    out: List[bytes] = []
+    _encode(obj, out)
+    return b"".join(out)
+
+
+def _decode(data: bytes, pos: int) -> Tuple[Any, int]:
+    initial = data[pos]
+    major, info = initial >> 5, initial & 0x1F
+    pos += 1
+    if major == 7:
+        simple = {20: False, 21: True, 22: None}
+        if info in simple:
+            return simple[info], pos
+        if info == 25:
+            return struct.unpack_from(">e", data, pos)[0], pos + 2
+        if info == 26:
+            return struct.unpack_from(">f", data, pos)[0], pos + 4
+        if info == 27:
+            return struct.unpack_from(">d", data, pos)[0], pos + 8
+        raise ValueError(f"unsupported CBOR simple value {info}")
+    if info < 24:
+        value = info
+    elif info <= 27:
+        size = 1 << (info - 24)
+        value = int.from_bytes(data[pos : pos + size], "big")
+        pos += size
+    else:
+        raise ValueError("indefinite-length CBOR items are not supported")
+
+    if major == 0:
+        return value, pos
+    if major == 1:
+        return -1 - value, pos
+    if major == 2:
+        return data[pos : pos + value], pos + value
+    if major == 3:
+        return data[pos : pos + value].decode("utf-8"), pos + value
+    if major == 4:
+        items = []
+        for _ in range(value):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return items, pos
+    if major == 5:
+        result = {}
+        for _ in range(value):
+            key, pos = _decode(data, pos)
+            result[key], pos = _decode(data, pos)
+        return result, pos
+    raise ValueError(f"unsupported CBOR major type {major}")
+
+
+def loads(data: bytes) -> Any:
+    obj, pos = _decode(bytes(data), 0)
+    if pos != len(data):
+        raise ValueError("trailing data after CBOR item")
+    return obj
@@ -0,0 +1,379 @@
+"""
+Packed binary cohort files (.sleco) and in-place scoring.
+
+Layout (little-endian):
+
+    header   "<8s16sHHI": magic b"SLECOH1\\0", ruleset_version (ASCII),
+             key_width, n_ids, data_offset
+    id map   n_ids criterion IDs joined by "\\n" (UTF-8); bit i of a record's
+             mask is id_map[i]; zero-padded up to data_offset (8-aligned)
+    records  key_width bytes of key (UTF-8, NUL-padded, key_width % 4 == 0)
+             + uint32 word: bits 0..n_ids-1 criterion mask, bit 31 ANA positive
+
+The record count is implied by the file size, so files can be written as a
+stream. Because keys and words are 4-byte aligned, the scorer memory-maps the
+file, views the record area as uint32 and reads every word with one strided
+slice: it counts distinct words (in C, without building rows), scores each
+distinct word once through two lookup tables and, if asked, writes one score
+byte per record. The id map lets files packed under an older criterion order
+be scored with the current ruleset; the stored ruleset version is reported
+next to the current one.
+"""
+
+from __future__ import annotations
+
+import csv
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .scoring import (
+    CLASSIFICATION_THRESHOLD,
+    _risk_tier,
+    compute_score,
+    criterion_ids,
+    get_domains,
+    ruleset_version,
+    selections_from_mask,
+)
+
+MAGIC = b"SLECOH1\0"
+HEADER = struct.Struct("<8s16sHHI")
+ANA_BIT = 1 << 31
+DEFAULT_KEY_WIDTH = 16
+TRUE_VALUES = frozenset({"1", "true", "yes", "y", "x", "on", "+"})
+
+if sys.byteorder != "little":  # memoryview.cast("I") uses native order
+    raise ImportError("criteria.cohort requires a little-endian platform")
+
+
+class CohortError(ValueError):
+    pass
+
+
+def _align(n: int, to: int) -> int:
+    return -(-n // to) * to
+
+
+# -- writing ----------------------------------------------------------------
+
+
+class CohortWriter:
+    """
+    Stream records into a cohort file:
+
+        with CohortWriter(path) as w:
+            w.add("P0001", True, mask)
+    """
+
+    def __init__(self, path: Union[str, Path], key_width: int = DEFAULT_KEY_WIDTH, ids: Optional[Tuple[str, ...]] = None):
+        self.ids = tuple(ids or criterion_ids())
+        if len(self.ids) > 31:
+            raise CohortError("at most 31 criteria fit in a record word")
+        self.key_width = _align(max(4, key_width), 4)
+        self.count = 0
+        self._record = struct.Struct(f"<{self.key_width}sI")
+        self._mask_limit = 1 << len(self.ids)
+        id_map = "\n".join(self.ids).encode("utf-8")
+        data_offset = _align(HEADER.size + len(id_map), 8)
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, ruleset_version().encode("ascii"), self.key_width, len(self.ids), data_offset))
+        self._file.write(id_map.ljust(data_offset - HEADER.size, b"\0"))
+        self._buffer: List[bytes] = []
+
+    def add(self, key: str, ana_positive: bool, mask: int) -> None:
+        data = key.encode("utf-8")
+        if len(data) > self.key_width:
+            raise CohortError(f"key {key!r} is longer than {self.key_width} bytes (use a larger key width)")
+        if not 0 <= mask < self._mask_limit:
+            raise CohortError(f"mask {mask:#x} of {key!r} has bits outside the {len(self.ids)} criteria")
+        self._buffer.append(self._record.pack(data, mask | (ANA_BIT if ana_positive else 0)))
+        self.count += 1
+        if len(self._buffer) >= 65536:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.write(b"".join(self._buffer))
+        self._buffer.clear()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _truthy(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in TRUE_VALUES
+
+
+def pack_csv(
+    csv_path: Union[str, Path],
+    out_path: Union[str, Path],
+    key_column: str = "id",
+    ana_column: str = "ana_positive",
+    key_width: int = DEFAULT_KEY_WIDTH,
+) -> int:
+    """
+    Convert a CSV with a key column, an ANA column and either one column per
+    criterion ID (truthy: 1/true/yes/x/on/+) or a `mask` column (integer or
+    0x-hex) into a cohort file. Returns the number of records.
+    """
+    ids = criterion_ids()
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise CohortError("empty CSV")
+        header = [h.strip() for h in header]
+        for required in (key_column, ana_column):
+            if required not in header:
+                raise CohortError(f"CSV has no {required!r} column")
+        key_i, ana_i = header.index(key_column), header.index(ana_column)
+        mask_i = header.index("mask") if "mask" in header else None
+        bit_columns = [(header.index(cid), 1 << bit) for bit, cid in enumerate(ids) if cid in header]
+        if mask_i is None and not bit_columns:
+            raise CohortError("CSV needs a 'mask' column or criterion ID columns")
+
+        with CohortWriter(out_path, key_width=key_width) as writer:
+            for line, row in enumerate(reader, start=2):
+                if not row:
+                    continue
+                try:
+                    mask = 0
+                    if mask_i is not None and row[mask_i].strip():
+                        text = row[mask_i].strip()
+                        mask = int(text, 16) if text[:2].lower() == "0x" else int(text)
+                    for i, bit in bit_columns:
+                        if _truthy(row[i]):
+                            mask |= bit
+                    writer.add(row[key_i].strip(), _truthy(row[ana_i]), mask)
+                except (IndexError, ValueError) as e:
+                    raise CohortError(f"line {line}: {e}") from e
+            return writer.count
+
+
+# -- reading ----------------------------------------------------------------
+
+
+@dataclass
+class CohortHeader:
+    ruleset_version: str
+    key_width: int
+    ids: Tuple[str, ...]
+    data_offset: int
+
+    @property
+    def record_size(self) -> int:
+        return self.key_width + 4
+
+
+def read_header(data: bytes) -> CohortHeader:
+    if len(data) < HEADER.size:
+        raise CohortError("not a cohort file (too short)")
+    magic, version, key_width, n_ids, data_offset = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise CohortError("not a cohort file (bad magic)")
+    if key_width % 4 or data_offset % 8 or data_offset < HEADER.size:
+        raise CohortError("corrupt cohort header")
+    ids = tuple(data[HEADER.size : data_offset].rstrip(b"\0").decode("utf-8").split("\n")) if n_ids else ()
+    if len(ids) != n_ids:
+        raise CohortError("corrupt cohort id map")
+    return CohortHeader(version.decode("ascii"), key_width, ids, data_offset)
+
+
+class Cohort:
+    """
+    Read-only memory map of a cohort file; use as a context manager.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        try:
+            self.header = read_header(self._map if self._map is not None else b"")
+            body = size - self.header.data_offset
+            if body < 0 or body % self.header.record_size:
+                raise CohortError("truncated cohort file")
+        except CohortError:
+            self.close()
+            raise
+        self.count = body // self.header.record_size
+
+    def __len__(self) -> int:
+        return self.count
+
+    def words(self) -> memoryview:
+        """
+        The uint32 word (ANA bit + mask) of every record, as a strided view of the map.
+        """
+        stride = self.header.record_size // 4
+        area = memoryview(self._map)[self.header.data_offset :].cast("I")
+        return area[self.header.key_width // 4 :: stride]
+
+    def __iter__(self) -> Iterator[Tuple[str, bool, int]]:
+        h = self.header
+        record = struct.Struct(f"<{h.key_width}sI")
+        for key, word in record.iter_unpack(self._map[h.data_offset :]):
+            yield key.rstrip(b"\0").decode("utf-8"), bool(word & ANA_BIT), word & ~ANA_BIT
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# -- scoring ----------------------------------------------------------------
+
+
+def _bit_remap(ids: Tuple[str, ...]) -> Optional[List[Tuple[int, int]]]:
+    """
+    (file bit, current bit) pairs, or None when the file uses the current order.
+    """
+    current = criterion_ids()
+    if tuple(ids) == current:
+        return None
+    unknown = [cid for cid in ids if cid not in current]
+    if unknown:
+        raise CohortError(f"cohort uses criteria unknown to this ruleset: {', '.join(unknown)}")
+    return [(1 << i, 1 << current.index(cid)) for i, cid in enumerate(ids)]
+
+
+def check_words(words: Iterable[int], n_ids: int) -> None:
+    """
+    Reject record words with mask bits beyond the file's n_ids criteria (the
+    writer never produces them; scoring would otherwise drop them silently).
+    """
+    for word in words:
+        if (word & ~ANA_BIT) >> n_ids:
+            raise CohortError(f"record word {word:#010x} has bits outside the {n_ids} criteria")
+
+
+def split_bit() -> int:
+    """
+    The domain boundary closest to the middle of the criterion mask.
+    """
+    n = len(criterion_ids())
+    boundaries, bit = [], 0
+    for dom in get_domains():
+        bit += len(dom.criteria)
+        boundaries.append(bit)
+    return min(boundaries, key=lambda b: abs(n - 2 * b))
+
+
+def score_tables() -> Tuple[int, List[int], List[int]]:
+    """
+    (split, low, high): the total score of an ANA-positive mask m is
+    low[m & (1 << split) - 1] + high[m >> split]. split falls on a domain
+    boundary, so each half is scored independently by compute_score.
+    """
+    n = len(criterion_ids())
+    split = split_bit()
+
+    def table(bits: range) -> List[int]:
+        offset = bits.start
+        return [
+            compute_score(ana_positive=True, selections=selections_from_mask(m << offset)).total_score
+            for m in range(1 << len(bits))
+        ]
+
+    return split, table(range(0, split)), table(range(split, n))
+
+
+@dataclass
+class CohortSummary:
+    path: str
+    records: int
+    distinct_words: int
+    file_ruleset_version: str
+    ruleset_version: str
+    eligible: int
+    classified: int
+    tiers: Dict[str, int] = field(default_factory=dict)
+    score_histogram: Dict[int, int] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+def score_cohort(path: Union[str, Path], scores_out: Optional[Union[str, Path]] = None) -> CohortSummary:
+    """
+    Score every record of a cohort file in place. With scores_out, also write
+    one byte per record (the total score, in record order).
+    """
+    t0 = time.perf_counter()
+    with Cohort(path) as cohort:
+        remap = _bit_remap(cohort.header.ids)
+        words = cohort.words()
+        # Release the view even on errors: closing the map with it exported raises BufferError.
+        try:
+            counts = Counter(words)
+            check_words(counts, len(cohort.header.ids))
+
+            split, low, high = score_tables()
+            low_mask = (1 << split) - 1
+            score_of: Dict[int, int] = {}
+            for word in counts:
+                if not word & ANA_BIT:
+                    score_of[word] = 0
+                    continue
+                mask = word & ~ANA_BIT
+                if remap is not None:
+                    mask = sum(new for old, new in remap if mask & old)
+                score_of[word] = low[mask & low_mask] + high[mask >> split]
+
+            if scores_out is not None:
+                with open(scores_out, "wb") as f:
+                    f.write(bytes(map(score_of.__getitem__, words)))
+        finally:
+            words.release()
+
+        summary = CohortSummary(
+            path=str(path),
+            records=cohort.count,
+            distinct_words=len(counts),
+            file_ruleset_version=cohort.header.ruleset_version,
+            ruleset_version=ruleset_version(),
+            eligible=0,
+            classified=0,
+        )
+    for word, n in counts.items():
+        score = score_of[word]
+        eligible = bool(word & ANA_BIT)
+        summary.eligible += n if eligible else 0
+        summary.classified += n if eligible and score >= CLASSIFICATION_THRESHOLD else 0
+        tier = _risk_tier(score, eligible)[0]
+        summary.tiers[tier] = summary.tiers.get(tier, 0) + n
+        if eligible:
+            summary.score_histogram[score] = summary.score_histogram.get(score, 0) + n
+    summary.score_histogram = dict(sorted(summary.score_histogram.items()))
+    summary.seconds = round(time.perf_counter() - t0, 4)
+    return summary
+
+
+def write_records(path: Union[str, Path], records: Iterable[Tuple[str, bool, int]], key_width: int = DEFAULT_KEY_WIDTH) -> int:
+    with CohortWriter(path, key_width=key_width) as writer:
+        for key, ana_positive, mask in records:
+            writer.add(key, ana_positive, mask)
+        return writer.count
@@ -0,0 +1,302 @@
+"""
+Differential verification of scoring.compute_score against an independent,
+table-driven reference of the EULAR/ACR 2019 rules.
+
+The reference below is written out by hand from the rules documented in
+scoring.get_domains() (points per criterion, max-in-domain, ANA gate,
+threshold >= 10, tiers <10 / 10-19 / >=20) and deliberately shares no code
+with scoring.py. Every (ANA, criterion-mask) pair can be swept exhaustively,
+or sampled, and any disagreement is shrunk to a minimal reproducer.
+"""
+
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .scoring import compute_score, get_domains
+
+# (domain_id, max_in_domain, ((criterion_id, points), ...))
+REFERENCE_RULES: Tuple[Tuple[str, bool, Tuple[Tuple[str, int], ...]], ...] = (
+    ("constitutional", False, (("fever", 2),)),
+    ("hematologic", True, (("leukopenia", 3), ("thrombocytopenia", 4), ("autoimmune_hemolysis", 4))),
+    ("neuropsychiatric", True, (("delirium", 2), ("psychosis", 3), ("seizure", 5))),
+    (
+        "mucocutaneous",
+        True,
+        (
+            ("nonscarring_alopecia", 2),
+            ("oral_ulcers", 2),
+            ("subacute_cutaneous_or_discoid", 4),
+            ("acute_cutaneous", 6),
+        ),
+    ),
+    ("serosal", True, (("pleural_or_pericardial_effusion", 5), ("acute_pericarditis", 6))),
+    ("musculoskeletal", False, (("joint_involvement", 6),)),
+    ("renal", True, (("proteinuria", 4), ("renal_biopsy_class_ii_or_v", 8), ("renal_biopsy_class_iii_or_iv", 10))),
+    ("antiphospholipid", False, (("antiphospholipid_any", 2),)),
+    ("complement", True, (("low_c3_or_c4", 3), ("low_c3_and_c4", 4))),
+    ("sle_specific_abs", False, (("anti_dsdna_or_anti_sm", 6),)),
+)
+
+CLASSIFICATION_THRESHOLD = 10
+INELIGIBLE_TIER = "Không đủ điều kiện tính điểm"
+TIERS: Tuple[Tuple[Optional[int], str], ...] = (
+    (10, "Chưa đủ tiêu chuẩn"),
+    (20, "SLE Tiêu chuẩn"),
+    (None, "SLE Nguy cơ cao / Ominous"),
+)
+
+CRITERION_IDS: Tuple[str, ...] = tuple(cid for _, _, crit in REFERENCE_RULES for cid, _ in crit)
+N_BITS = len(CRITERION_IDS)
+
+Scorer = Callable[..., object]
+
+
+def _build_domain_tables():
+    """
+    Per domain: (domain_id, shift, submask, table) where
+    table[submask] = (points, awarded_id, selected_ids).
+    """
+    tables = []
+    shift = 0
+    for dom_id, max_in_domain, crit in REFERENCE_RULES:
+        width = len(crit)
+        table = []
+        for sub in range(1 << width):
+            chosen = [crit[i] for i in range(width) if sub >> i & 1]
+            if not chosen:
+                table.append((0, None, ()))
+                continue
+            # Max-in-domain: the highest weight wins, first listed on ties.
+            # Single-value domains only ever have one criterion.
+            best = chosen[0]
+            if max_in_domain:
+                for c in chosen[1:]:
+                    if c[1] > best[1]:
+                        best = c
+            table.append((best[1], best[0], tuple(c[0] for c in chosen)))
+        tables.append((dom_id, shift, (1 << width) - 1, tuple(table)))
+        shift += width
+    return tuple(tables)
+
+
+_DOMAIN_TABLES = _build_domain_tables()
+
+
+def reference_tier(total: int) -> str:
+    for upper, tier in TIERS:
+        if upper is None or total < upper:
+            return tier
+    raise AssertionError("unreachable")
+
+
+def reference_score(ana_positive: bool, mask: int) -> Dict[str, object]:
+    if not ana_positive:
+        return {
+            "eligible": False,
+            "total_score": 0,
+            "meets_classification": False,
+            "risk_tier": INELIGIBLE_TIER,
+            "domains": (),
+        }
+    total = 0
+    domains = []
+    for dom_id, shift, width_mask, table in _DOMAIN_TABLES:
+        points, awarded, selected = table[(mask >> shift) & width_mask]
+        total += points
+        domains.append((dom_id, points, awarded, selected))
+    return {
+        "eligible": True,
+        "total_score": total,
+        "meets_classification": total >= CLASSIFICATION_THRESHOLD,
+        "risk_tier": reference_tier(total),
+        "domains": tuple(domains),
+    }
+
+
+def selections_for_mask(mask: int) -> Dict[str, bool]:
+    return {cid: True for i, cid in enumerate(CRITERION_IDS) if mask >> i & 1}
+
+
+def describe_mask(mask: int) -> List[str]:
+    return [cid for i, cid in enumerate(CRITERION_IDS) if mask >> i & 1]
+
+
+def compare(ana_positive: bool, mask: int, scorer: Scorer = compute_score) -> List[str]:
+    """
+    Return a list of human-readable differences between `scorer` and the reference.
+    """
+    ref = reference_score(ana_positive, mask)
+    try:
+        res = scorer(ana_positive=ana_positive, selections=selections_for_mask(mask))
+    except Exception as e:
+        return [f"scorer raised {type(e).__name__}: {e}"]
+
+    diffs: List[str] = []
+    for key in ("eligible", "total_score", "meets_classification", "risk_tier"):
+        actual = getattr(res, key, None)
+        if actual != ref[key]:
+            diffs.append(f"{key}: reference {ref[key]!r} != actual {actual!r}")
+
+    actual_domains = tuple(
+        (
+            ds.domain_id,
+            ds.awarded_points,
+            ds.awarded_criterion.id if ds.awarded_criterion else None,
+            tuple(c.id for c in ds.selected_criteria),
+        )
+        for ds in getattr(res, "domain_scores", ())
+    )
+    if actual_domains != ref["domains"]:
+        ref_by_id = {d[0]: d for d in ref["domains"]}
+        act_by_id = {d[0]: d for d in actual_domains}
+        for dom_id in sorted(set(ref_by_id) | set(act_by_id)):
+            if ref_by_id.get(dom_id) != act_by_id.get(dom_id):
+                diffs.append(f"domain {dom_id}: reference {ref_by_id.get(dom_id)!r} != actual {act_by_id.get(dom_id)!r}")
+    return diffs
+
+
+def minimize(ana_positive: bool, mask: int, scorer: Scorer = compute_score) -> int:
+    """
+    Greedily drop criteria while the disagreement persists (1-minimal reproducer).
+    """
+    changed = True
+    while changed:
+        changed = False
+        for i in range(N_BITS):
+            if mask >> i & 1:
+                smaller = mask & ~(1 << i)
+                if compare(ana_positive, smaller, scorer):
+                    mask = smaller
+                    changed = True
+    return mask
+
+
+def ruleset_drift() -> List[str]:
+    """
+    Structural differences between get_domains() and the reference table.
+    Any entry here means the rules were changed on one side only.
+    """
+    actual = tuple(
+        (d.id, d.max_in_domain, tuple((c.id, c.points) for c in d.criteria)) for d in get_domains()
+    )
+    if actual == REFERENCE_RULES:
+        return []
+    ref_by_id = {d[0]: d for d in REFERENCE_RULES}
+    act_by_id = {d[0]: d for d in actual}
+    out = []
+    for dom_id in sorted(set(ref_by_id) | set(act_by_id)):
+        if ref_by_id.get(dom_id) != act_by_id.get(dom_id):
+            out.append(f"domain {dom_id}: reference {ref_by_id.get(dom_id)!r} != get_domains() {act_by_id.get(dom_id)!r}")
+    if not out:
+        out.append("domain order differs between reference and get_domains()")
+    return out
+
+
+@dataclass
+class Disagreement:
+    ana_positive: bool
+    mask: int
+    diffs: List[str]
+    minimal_mask: int
+    minimal_diffs: List[str]
+
+    def reproducer(self) -> str:
+        return f"compute_score(ana_positive={self.ana_positive!r}, selections={selections_for_mask(self.minimal_mask)!r})"
+
+
+@dataclass
+class FuzzReport:
+    checked: int = 0
+    disagreements: List[Disagreement] = field(default_factory=list)
+    drift: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.disagreements and not self.drift
+
+
+def _check_batch(args) -> Tuple[int, List[Tuple[bool, int, List[str]]]]:
+    ana_positive, masks, limit, scorer = args
+    found = []
+    n = 0
+    for mask in masks:
+        n += 1
+        diffs = compare(ana_positive, mask, scorer)
+        if diffs:
+            found.append((ana_positive, mask, diffs))
+            if len(found) >= limit:
+                break
+    return n, found
+
+
+def _batches(samples: Optional[int], seed: int, batch_size: int) -> List[Tuple[bool, Sequence[int]]]:
+    space = 1 << N_BITS
+    if samples is None:
+        return [(ana, range(start, min(start + batch_size, space))) for ana in (True, False) for start in range(0, space, batch_size)]
+    rng = random.Random(seed)
+    out = []
+    remaining = samples
+    while remaining > 0:
+        n = min(batch_size, remaining)
+        # Bias toward the ANA+ half: ANA- is a single code path.
+        out.append((rng.random() < 0.9, [rng.getrandbits(N_BITS) for _ in range(n)]))
+        remaining -= n
+    return out
+
+
+def run(
+    samples: Optional[int] = None,
+    seed: int = 0,
+    workers: int = 1,
+    batch_size: int = 1 << 14,
+    max_failures: int = 10,
+    scorer: Scorer = compute_score,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> FuzzReport:
+    """
+    Sweep the whole 2 x 2^N_BITS input space (samples=None) or `samples` random
+    points, in batches spread over `workers` processes.
+    """
+    report = FuzzReport(drift=ruleset_drift())
+    batches = _batches(samples, seed, batch_size)
+    total = sum(len(m) for _, m in batches)
+    jobs = [(ana, masks, max_failures, scorer) for ana, masks in batches]
+
+    raw: List[Tuple[bool, int, List[str]]] = []
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = pool.imap_unordered(_check_batch, jobs)
+            for n, found in results:
+                report.checked += n
+                raw.extend(found)
+                if progress:
+                    progress(report.checked, total)
+                if len(raw) >= max_failures:
+                    pool.terminate()
+                    break
+    else:
+        for job in jobs:
+            n, found = _check_batch(job)
+            report.checked += n
+            raw.extend(found)
+            if progress:
+                progress(report.checked, total)
+            if len(raw) >= max_failures:
+                break
+
+    for ana, mask, diffs in sorted(raw, key=lambda d: (not d[0], bin(d[1]).count("1"), d[1]))[:max_failures]:
+        small = minimize(ana, mask, scorer)
+        report.disagreements.append(
+            Disagreement(
+                ana_positive=ana,
+                mask=mask,
+                diffs=diffs,
+                minimal_mask=small,
+                minimal_diffs=compare(ana, small, scorer),
+            )
+        )
+    return report
@@ -0,0 +1,129 @@
+"""
+Raw WSGI fast path for POST /api/score.
+
+The scoring API is stateless, yet through Django it pays for URL resolution,
+request/response objects and every MIDDLEWARE entry. ScoreFastPath wraps the
+Django WSGI application and answers plain `POST /api/score` requests itself,
+using the same parse/payload code as the Django view (api.py) and emitting
+the same status, headers and body the full middleware stack would. Anything
+it is not sure about (other paths/methods, disallowed hosts, oversized or
+chunked bodies, profiling requests, requests with an Idempotency-Key,
+settings that change responses) is handed to Django unchanged.
+"""
+
+from __future__ import annotations
+
+import time
+from http import HTTPStatus
+from typing import Callable, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+from django.http.request import split_domain_port, validate_host
+
+from . import audit, metrics
+from .api import ApiError, encode, negotiate, parse_fields, parse_score_request, score_payload
+from .scoring import compute_score
+
+PATH = "/api/score"
+VIEW_NAME = "criteria:api_score"
+
+
+class ScoreFastPath:
+    def __init__(self, django_app: Callable):
+        self.django_app = django_app
+        self.enabled = bool(getattr(settings, "API_FAST_PATH", True)) and self._settings_compatible()
+        self.max_body = getattr(settings, "DATA_UPLOAD_MAX_MEMORY_SIZE", 2621440)
+        self.allowed_hosts = list(settings.ALLOWED_HOSTS)
+        if settings.DEBUG and not self.allowed_hosts:
+            self.allowed_hosts = [".localhost", "127.0.0.1", "[::1]"]
+
+        # Headers added by the default middleware stack, in the order Django emits them.
+        self.extra_headers: List[Tuple[str, str]] = []
+        xfo = getattr(settings, "X_FRAME_OPTIONS", "DENY")
+        if "django.middleware.clickjacking.XFrameOptionsMiddleware" in settings.MIDDLEWARE and xfo:
+            self.extra_headers.append(("X-Frame-Options", xfo.upper()))
+        self.security_headers: List[Tuple[str, str]] = []
+        if "django.middleware.security.SecurityMiddleware" in settings.MIDDLEWARE:
+            if getattr(settings, "SECURE_CONTENT_TYPE_NOSNIFF", True):
+                self.security_headers.append(("X-Content-Type-Options", "nosniff"))
+            referrer = getattr(settings, "SECURE_REFERRER_POLICY", "same-origin")
+            if referrer:
+                if not isinstance(referrer, str):
+                    referrer = ",".join(referrer)
+                self.security_headers.append(("Referrer-Policy", referrer))
+            coop = getattr(settings, "SECURE_CROSS_ORIGIN_OPENER_POLICY", "same-origin")
+            if coop:
+                self.security_headers.append(("Cross-Origin-Opener-Policy", coop))
+
+    @staticmethod
+    def _settings_compatible() -> bool:
+        # Settings under which the middleware stack would alter or redirect the response.
+        return not (
+            getattr(settings, "SECURE_SSL_REDIRECT", False)
+            or getattr(settings, "SECURE_HSTS_SECONDS", 0)
+            or getattr(settings, "PREPEND_WWW", False)
+            or getattr(settings, "DISALLOWED_USER_AGENTS", [])
+            or getattr(settings, "MEMORY_PROFILING_ENABLED", False)
+            or (
+                getattr(settings, "PROFILING_ENABLED", False)
+                and float(getattr(settings, "PROFILING_SAMPLE_RATE", 0.0)) > 0
+            )
+        )
+
+    def _eligible(self, environ) -> bool:
+        if not self.enabled or environ.get("PATH_INFO") != PATH or environ.get("REQUEST_METHOD") != "POST":
+            return False
+        if "HTTP_X_PROFILE" in environ or "HTTP_IDEMPOTENCY_KEY" in environ:
+            return False
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or "")
+        except ValueError:
+            return False
+        if self.max_body is not None and length > self.max_body:
+            return False
+        host = environ.get("HTTP_HOST") or environ.get("SERVER_NAME", "")
+        domain, _port = split_domain_port(host)
+        return bool(domain) and validate_host(domain, self.allowed_hosts)
+
+    def __call__(self, environ, start_response) -> Iterable[bytes]:
+        if not self._eligible(environ):
+            return self.django_app(environ, start_response)
+
+        metrics.REGISTRY.gauge_add("sle_http_requests_in_flight", 1)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            body = environ["wsgi.input"].read(int(environ["CONTENT_LENGTH"]))
+            media_type = negotiate(environ.get("HTTP_ACCEPT"))
+            status, content = self.handle(body, environ.get("QUERY_STRING", ""), media_type, environ.get("REMOTE_ADDR", ""))
+            headers = [("Content-Type", media_type), ("Vary", "Accept"), *self.extra_headers]
+            headers.append(("Content-Length", str(len(content))))
+            headers.extend(self.security_headers)
+            start_response(f"{status} {HTTPStatus(status).phrase}", headers)
+            return [content]
+        finally:
+            metrics.REGISTRY.observe("sle_http_request_duration_seconds", time.perf_counter() - t0, view=VIEW_NAME)
+            metrics.REGISTRY.inc("sle_http_requests_total", view=VIEW_NAME, method="POST", status=status)
+            metrics.REGISTRY.gauge_add("sle_http_requests_in_flight", -1)
+            metrics.REGISTRY.flush()
+
+    @staticmethod
+    def _fields_param(query: str) -> Optional[str]:
+        # QueryDict.get() semantics: the last value wins.
+        value = None
+        for key, v in parse_qsl(query, keep_blank_values=True):
+            if key == "fields":
+                value = v
+        return value
+
+    def handle(self, body: bytes, query: str, media_type: str, remote_addr: str = "") -> Tuple[int, bytes]:
+        try:
+            fields = parse_fields(self._fields_param(query)) if query else None
+            ana_positive, selections = parse_score_request(body)
+        except ApiError as e:
+            return e.status, encode(e.payload(), media_type)
+        with metrics.stage("compute_score"):
+            result = compute_score(ana_positive=ana_positive, selections=selections)
+        audit.record_score("api_score", ana_positive, selections, result, remote_addr=remote_addr)
+        return 200, encode(score_payload(result, fields), media_type)
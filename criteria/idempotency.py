@@ -0,0 +1,221 @@
+"""
+Idempotency-Key support for POST /api/score and POST /api/jobs.
+
+An integration that retries after a timeout sends the same `Idempotency-Key`
+header again; the view then runs once per key and endpoint:
+
+- the first request claims the key (atomic add of a pending marker that
+  expires after IDEMPOTENCY_LOCK_TTL seconds) and its response is stored for
+  IDEMPOTENCY_TTL seconds; 5xx responses and exceptions release the key so a
+  retry runs again;
+- a later request with the key gets the stored response back, marked
+  `Idempotent-Replayed: true`, without running the view (no second score,
+  audit event or job);
+- a duplicate arriving while the first request is still running waits for its
+  response (polling the store for up to IDEMPOTENCY_WAIT seconds, then 409 +
+  Retry-After);
+- reusing a key for a different request (method, path, query, Accept or body)
+  is rejected with 422.
+
+The store is pluggable: IDEMPOTENCY_STORE is the dotted path of a class with
+add/get/set/delete. The default keeps entries in the Django cache
+IDEMPOTENCY_CACHE (the `idempotency` DatabaseCache in settings), which has to
+be shared by the worker processes for duplicates sent to different workers to
+be recognized; a per-process LocMemCache is refused.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpRequest, HttpResponse
+from django.utils.module_loading import import_string
+
+from . import metrics, offload
+from .api import encode, negotiate
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+PENDING = "pending"
+DONE = "done"
+
+
+class CacheStore:
+    """
+    Entries in a Django cache (add() is atomic on the shared backends).
+    """
+
+    @property
+    def cache(self):
+        alias = getattr(settings, "IDEMPOTENCY_CACHE", "idempotency")
+        cache = caches[alias]
+        if isinstance(cache, LocMemCache):
+            raise ImproperlyConfigured(f"IDEMPOTENCY_CACHE {alias!r} is per process; use a cache shared by all workers")
+        return cache
+
+    def add(self, key: str, value: Dict[str, Any], ttl: float) -> bool:
+        return self.cache.add(key, value, ttl)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self.cache.get(key)
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        self.cache.set(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        self.cache.delete(key)
+
+
+@functools.lru_cache(maxsize=4)
+def _store_for(path: str):
+    return import_string(path)()
+
+
+def get_store():
+    return _store_for(getattr(settings, "IDEMPOTENCY_STORE", "criteria.idempotency.CacheStore"))
+
+
+def _fingerprint(request: HttpRequest) -> str:
+    digest = hashlib.sha256()
+    for part in (request.method, request.path, request.META.get("QUERY_STRING", ""), request.headers.get("Accept", "")):
+        digest.update(part.encode("utf-8") + b"\0")
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _error(request: HttpRequest, message: str, status: int) -> HttpResponse:
+    media_type = negotiate(request.headers.get("Accept"))
+    return HttpResponse(encode({"error": message}, media_type), content_type=media_type, status=status)
+
+
+def _prepare(request: HttpRequest, scope: str) -> Tuple[Optional[str], Optional[str], Optional[HttpResponse]]:
+    """
+    (store key, request fingerprint, error response) for a request; no key
+    when the request has no Idempotency-Key header.
+    """
+    value = request.headers.get(HEADER)
+    if value is None:
+        return None, None, None
+    if not value or len(value) > MAX_KEY_LENGTH or not value.isprintable():
+        return None, None, _error(request, f"{HEADER} must be 1-{MAX_KEY_LENGTH} printable characters", 400)
+    key = f"idempotency:{scope}:{hashlib.sha256(value.encode('utf-8')).hexdigest()}"
+    return key, _fingerprint(request), None
+
+
+def _check(store, request: HttpRequest, scope: str, key: str, fingerprint: str):
+    """
+    One attempt: True when this request claimed the key (run the view), a
+    response to return, or None to keep waiting for the in-flight request.
+    """
+    if store.add(key, {"state": PENDING, "fingerprint": fingerprint}, float(getattr(settings, "IDEMPOTENCY_LOCK_TTL", 60))):
+        return True
+    entry = store.get(key)
+    if entry is None:
+        return None  # released or expired between add() and get(); try to claim it again
+    if entry["fingerprint"] != fingerprint:
+        metrics.REGISTRY.inc("sle_idempotency_requests_total", view=scope, outcome="mismatch")
+        return _error(request, f"{HEADER} was already used for a different request", 422)
+    if entry["state"] != DONE:
+        return None
+    metrics.REGISTRY.inc("sle_idempotency_requests_total", view=scope, outcome="replayed")
+    response = HttpResponse(entry["content"], status=entry["status"])
+    for name, value in entry["headers"]:
+        response[name] = value
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _timeout(request: HttpRequest, scope: str) -> HttpResponse:
+    metrics.REGISTRY.inc("sle_idempotency_requests_total", view=scope, outcome="timeout")
+    response = _error(request, f"A request with this {HEADER} is still in progress", 409)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _finish(store, scope: str, key: str, fingerprint: str, response: HttpResponse) -> None:
+    if response.status_code >= 500 or response.streaming:
+        store.delete(key)
+        return
+    metrics.REGISTRY.inc("sle_idempotency_requests_total", view=scope, outcome="stored")
+    entry = {
+        "state": DONE,
+        "fingerprint": fingerprint,
+        "status": response.status_code,
+        "headers": list(response.items()),
+        "content": response.content,
+    }
+    store.set(key, entry, float(getattr(settings, "IDEMPOTENCY_TTL", 86400)))
+
+
+def idempotent(scope: str):
+    """
+    Run the (sync or async) view once per Idempotency-Key within `scope`.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+
+            @functools.wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key, fingerprint, error = _prepare(request, scope)
+                if key is None:
+                    return error or await view(request, *args, **kwargs)
+                store = get_store()
+                deadline = time.monotonic() + float(getattr(settings, "IDEMPOTENCY_WAIT", 10))
+                while True:
+                    outcome = await offload.run("io", _check, store, request, scope, key, fingerprint)
+                    if outcome is not None:
+                        break
+                    if time.monotonic() >= deadline:
+                        return _timeout(request, scope)
+                    await asyncio.sleep(POLL_INTERVAL)
+                if outcome is not True:
+                    return outcome
+                try:
+                    response = await view(request, *args, **kwargs)
+                except BaseException:
+                    await offload.run("io", store.delete, key)
+                    raise
+                await offload.run("io", _finish, store, scope, key, fingerprint, response)
+                return response
+
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key, fingerprint, error = _prepare(request, scope)
+            if key is None:
+                return error or view(request, *args, **kwargs)
+            store = get_store()
+            deadline = time.monotonic() + float(getattr(settings, "IDEMPOTENCY_WAIT", 10))
+            while True:
+                outcome = _check(store, request, scope, key, fingerprint)
+                if outcome is not None:
+                    break
+                if time.monotonic() >= deadline:
+                    return _timeout(request, scope)
+                time.sleep(POLL_INTERVAL)
+            if outcome is not True:
+                return outcome
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                store.delete(key)
+                raise
+            _finish(store, scope, key, fingerprint, response)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,156 @@
+"""
+Cold-start measurement of WSGI entry points.
+
+measure() imports an entry point (e.g. sleweb.wsgi or sleweb.wsgi_api) in a
+fresh interpreter under `python -X importtime`, then serves one POST
+/api/score through the resulting application. It reports wall time of the
+import and of that first request, resident memory afterwards (RSS; ru_maxrss
+would include the parent's peak), the number of loaded modules and
+the per-module `-X importtime` breakdown. Used by `manage.py importtime`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+# Runs in the child interpreter; prints one JSON line on stdout.
+_CHILD = r"""
+import io, json, os, sys, time
+t0 = time.perf_counter()
+import importlib
+app = importlib.import_module(sys.argv[1]).application
+t1 = time.perf_counter()
+body = b'{"ana_positive": true, "mask": 1}'
+status = []
+environ = {
+    "REQUEST_METHOD": "POST", "PATH_INFO": "/api/score", "QUERY_STRING": "",
+    "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+    "CONTENT_TYPE": "application/json", "CONTENT_LENGTH": str(len(body)),
+    "wsgi.input": io.BytesIO(body), "wsgi.url_scheme": "http", "wsgi.errors": sys.stderr,
+}
+b"".join(app(environ, lambda s, h: status.append(s)))
+t2 = time.perf_counter()
+try:
+    rss = int(open("/proc/self/statm").read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+except (OSError, ValueError):
+    rss = None
+print(json.dumps({
+    "import_seconds": t1 - t0,
+    "first_request_seconds": t2 - t1,
+    "status": status[0] if status else None,
+    "rss_bytes": rss,
+    "modules": len(sys.modules),
+    "settings": os.environ.get("DJANGO_SETTINGS_MODULE"),
+}))
+"""
+
+
+@dataclass
+class ImportRecord:
+    name: str
+    depth: int
+    self_us: int
+    cumulative_us: int
+
+
+@dataclass
+class StartupReport:
+    entry: str
+    settings: str
+    import_seconds: float
+    first_request_seconds: float
+    status: Optional[str]
+    rss_bytes: Optional[int]
+    modules: int
+    records: List[ImportRecord] = field(default_factory=list)
+
+    @property
+    def import_total_us(self) -> int:
+        return sum(r.cumulative_us for r in self.records if r.depth == 0)
+
+    def top(self, n: int, key: str = "cumulative_us", max_depth: Optional[int] = None) -> List[ImportRecord]:
+        records = [r for r in self.records if max_depth is None or r.depth <= max_depth]
+        return sorted(records, key=lambda r: getattr(r, key), reverse=True)[:n]
+
+    def by_package(self, depth: int = 2) -> List[Tuple[str, int]]:
+        """
+        Self time summed per package prefix (first `depth` dotted components).
+        """
+        totals: Dict[str, int] = defaultdict(int)
+        for r in self.records:
+            totals[".".join(r.name.split(".")[:depth])] += r.self_us
+        return sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "entry": self.entry,
+            "settings": self.settings,
+            "import_seconds": self.import_seconds,
+            "first_request_seconds": self.first_request_seconds,
+            "status": self.status,
+            "rss_bytes": self.rss_bytes,
+            "modules": self.modules,
+            "import_total_us": self.import_total_us,
+            "records": [r.__dict__ for r in self.records],
+        }
+
+
+def parse_importtime(stderr: str) -> List[ImportRecord]:
+    """
+    Parse `import time: <self> | <cumulative> | <indent><module>` lines.
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:") :].split("|", 2)
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        raw = parts[2][1:]
+        name = raw.lstrip()
+        records.append(ImportRecord(name, (len(raw) - len(name)) // 2, int(parts[0]), int(parts[1])))
+    return records
+
+
+def measure(entry: str, settings_module: str = "sleweb.settings") -> StartupReport:
+    # The probe request is synthetic: keep it out of the audit log.
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, PYTHONDONTWRITEBYTECODE="1", AUDIT_ENABLED="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD, entry],
+        cwd=str(settings.BASE_DIR),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    result_line = proc.stdout.strip().splitlines()[-1:] if proc.returncode == 0 else []
+    if not result_line:
+        tail = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))[-2000:]
+        raise RuntimeError(f"Importing {entry} failed (exit {proc.returncode}):\n{tail}")
+    data = json.loads(result_line[0])
+    return StartupReport(
+        entry=entry,
+        settings=data["settings"],
+        import_seconds=data["import_seconds"],
+        first_request_seconds=data["first_request_seconds"],
+        status=data["status"],
+        rss_bytes=data["rss_bytes"],
+        modules=data["modules"],
+        records=parse_importtime(proc.stderr),
+    )
+
+
+def best_of(entry: str, runs: int, settings_module: str = "sleweb.settings") -> StartupReport:
+    """
+    Fastest of `runs` cold starts (least disturbed by the rest of the machine).
+    """
+    reports = [measure(entry, settings_module) for _ in range(max(1, runs))]
+    return min(reports, key=lambda r: r.import_seconds + r.first_request_seconds)
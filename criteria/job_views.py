@@ -0,0 +1,108 @@
+"""
+HTTP endpoints of the background job queue (criteria/jobs.py).
+
+POST /api/jobs                 {"kind": "rescore", "payload": {...}} -> 202 + Location
+                               (an Idempotency-Key header makes retries return the same job)
+GET  /api/jobs/<id>            status and progress
+GET  /api/jobs/<id>/result     JSON result or the artifact download (409 until finished)
+POST /api/jobs/<id>/cancel     cancel (immediately if queued, at the next progress report if running)
+
+The API is stateless, so a job is not tied to a session: <id> is the job's
+random token (Job.token), returned only to the submitter, and works as the
+capability to read or cancel it. Sequential primary keys are never exposed.
+"""
+
+import json
+
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from . import jobs
+from .idempotency import idempotent
+from .models import Job
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def job_status_dict(job: Job) -> dict:
+    return {
+        "id": job.token,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "progress_note": job.progress_note,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "cancel_requested": job.cancel_requested,
+        "error": job.error or None,
+        "created_at": _iso(job.created_at),
+        "started_at": _iso(job.started_at),
+        "finished_at": _iso(job.finished_at),
+        "result_url": reverse("criteria:job_result", args=[job.token]) if job.status == Job.SUCCEEDED else None,
+    }
+
+
+def _get_job(token: str):
+    # The artifact can be large; only job_result needs it.
+    return Job.objects.defer("artifact", "result").filter(token=token).first()
+
+
+def _not_found() -> JsonResponse:
+    return JsonResponse({"error": "Job not found"}, status=404)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@idempotent("job_submit")
+def job_submit(request: HttpRequest):
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({"error": "Body must be a JSON object"}, status=400)
+    try:
+        job = jobs.submit(body.get("kind"), body.get("payload") or {}, body.get("max_attempts"))
+    except (jobs.JobError, TypeError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    response = JsonResponse(job_status_dict(job), status=202)
+    response["Location"] = reverse("criteria:job_status", args=[job.token])
+    return response
+
+
+@require_http_methods(["GET"])
+def job_status(request: HttpRequest, token: str):
+    job = _get_job(token)
+    if job is None:
+        return _not_found()
+    return JsonResponse(job_status_dict(job))
+
+
+@require_http_methods(["GET"])
+def job_result(request: HttpRequest, token: str):
+    job = Job.objects.filter(token=token).first()
+    if job is None:
+        return _not_found()
+    if job.status != Job.SUCCEEDED:
+        status = 409 if not job.finished else 410
+        return JsonResponse({"error": f"Job is {job.status}", "job": job_status_dict(job)}, status=status)
+    if job.artifact is not None and request.GET.get("format") != "json":
+        response = HttpResponse(bytes(job.artifact), content_type=job.artifact_type or "application/octet-stream")
+        response["Content-Disposition"] = f'attachment; filename="{job.artifact_name}"'
+        return response
+    return JsonResponse({"id": job.token, "kind": job.kind, "result": job.result})
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def job_cancel(request: HttpRequest, token: str):
+    job = _get_job(token)
+    if job is None:
+        return _not_found()
+    job = jobs.cancel(job)
+    return JsonResponse(job_status_dict(job), status=200 if job.cancel_requested else 409)
@@ -0,0 +1,356 @@
+"""
+Database-backed background jobs (no broker).
+
+submit() stores a Job row; `manage.py jobworker` processes claim queued jobs
+with a conditional UPDATE (safe with several workers on any database),
+run the handler registered for the job's kind and store its result.
+Handlers report progress through JobContext.progress(), which also
+heartbeats the row and raises Cancelled once cancellation was requested.
+Failed attempts are retried with exponential backoff up to max_attempts;
+jobs whose worker stopped heartbeating are requeued (or failed once they
+used up their attempts). Finished jobs, artifacts included, are deleted
+JOBS_RETENTION seconds after they finished.
+
+Kinds:
+- rescore: score many inputs (api.parse_score_input forms) -> score payloads
+- pdf_batch: render pdf_result.html reports to PDFs -> zip artifact
+- test_suite: run docs/test_cases.json (or a subset) -> summary + results
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import socket
+import time
+import zipfile
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger("criteria.jobs")
+
+HANDLERS: Dict[str, Callable[["JobContext", Dict[str, Any]], Any]] = {}
+
+# Minimum seconds between progress writes (the last item is always written).
+PROGRESS_INTERVAL = 0.5
+# Minimum seconds between two prune_finished() runs of a worker.
+PRUNE_INTERVAL = 60.0
+
+
+def job_kind(name: str):
+    """
+    Register a handler: handler(ctx, payload) -> JSON result (or None when it
+    only produced an artifact via ctx.set_artifact()).
+    """
+
+    def register(func):
+        HANDLERS[name] = func
+        return func
+
+    return register
+
+
+class Cancelled(Exception):
+    pass
+
+
+class JobError(Exception):
+    """
+    Invalid job input; fails the job without retrying.
+    """
+
+
+class JobContext:
+    def __init__(self, job: Job):
+        self.job = job
+        self.artifact: Optional[bytes] = None
+        self.artifact_name = ""
+        self.artifact_type = ""
+        self._last_write = 0.0
+
+    def progress(self, done: int, total: int, note: str = "") -> None:
+        """
+        Record progress (throttled to PROGRESS_INTERVAL) and stop if cancelled.
+        """
+        now = time.monotonic()
+        if done < total and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+        pct = round(100.0 * done / total, 1) if total else 100.0
+        Job.objects.filter(pk=self.job.pk).update(progress=pct, progress_note=note[:200], heartbeat_at=timezone.now())
+        if Job.objects.filter(pk=self.job.pk, cancel_requested=True).exists():
+            raise Cancelled()
+
+    def set_artifact(self, data: bytes, name: str, content_type: str) -> None:
+        self.artifact, self.artifact_name, self.artifact_type = data, name, content_type
+
+
+# -- API --------------------------------------------------------------------
+
+
+def submit(kind: str, payload: Dict[str, Any], max_attempts: Optional[int] = None) -> Job:
+    if kind not in HANDLERS:
+        raise JobError(f"Unknown job kind {kind!r}. Allowed: {', '.join(sorted(HANDLERS))}")
+    if not isinstance(payload, dict):
+        raise JobError("payload must be an object/dict")
+    if max_attempts is None:
+        max_attempts = int(getattr(settings, "JOBS_MAX_ATTEMPTS", 3))
+    # Clients may ask for retries, but not for unbounded ones.
+    max_attempts = min(max(1, int(max_attempts)), int(getattr(settings, "JOBS_MAX_ATTEMPTS_LIMIT", 10)))
+    return Job.objects.create(kind=kind, payload=payload, max_attempts=max_attempts)
+
+
+def cancel(job: Job) -> Job:
+    """
+    Queued jobs are cancelled at once; running jobs stop at their next progress report.
+    """
+    now = timezone.now()
+    queued = Job.objects.filter(pk=job.pk, status=Job.QUEUED)
+    if not queued.update(status=Job.CANCELLED, cancel_requested=True, finished_at=now):
+        Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+# -- worker -----------------------------------------------------------------
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def requeue_stale(now: Optional[datetime] = None) -> int:
+    """
+    Put back running jobs whose worker stopped heartbeating (crashed or killed);
+    those that already used all their attempts fail instead. Returns the
+    number requeued.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=float(getattr(settings, "JOBS_STALE_AFTER", 300)))
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, worker="", error="Worker lost on the last attempt", finished_at=now
+    )
+    if failed:
+        logger.warning("Failed %s stale job(s) without attempts left", failed)
+    return stale.update(status=Job.QUEUED, worker="", error="Worker lost; requeued", run_after=now)
+
+
+def prune_finished(now: Optional[datetime] = None) -> int:
+    """
+    Delete finished jobs (with their artifacts) older than JOBS_RETENTION
+    seconds; 0 keeps them forever. Returns the number deleted.
+    """
+    retention = float(getattr(settings, "JOBS_RETENTION", 7 * 86400))
+    if retention <= 0:
+        return 0
+    cutoff = (now or timezone.now()) - timedelta(seconds=retention)
+    deleted, _ = Job.objects.filter(status__in=Job.FINISHED, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def claim(worker: str) -> Optional[Job]:
+    """
+    Atomically take the oldest runnable queued job, or None.
+    """
+    now = timezone.now()
+    runnable = Job.objects.filter(status=Job.QUEUED).filter(Q(run_after__isnull=True) | Q(run_after__lte=now))
+    for pk in runnable.order_by("id").values_list("pk", flat=True)[:10]:
+        taken = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            worker=worker,
+            attempts=F("attempts") + 1,
+            started_at=now,
+            heartbeat_at=now,
+            progress=0.0,
+        )
+        if taken:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def _finish(job: Job, **fields) -> None:
+    # Only the worker that owns the job may finish it (a requeued job may have a new owner).
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(finished_at=timezone.now(), **fields)
+
+
+def run_job(job: Job) -> str:
+    """
+    Run a claimed job and store its outcome; returns the new status.
+    """
+    handler = HANDLERS.get(job.kind)
+    ctx = JobContext(job)
+    try:
+        if handler is None:
+            raise JobError(f"Unknown job kind {job.kind!r}")
+        result = handler(ctx, job.payload or {})
+    except Cancelled:
+        _finish(job, status=Job.CANCELLED, progress_note="cancelled")
+        return Job.CANCELLED
+    except JobError as e:
+        _finish(job, status=Job.FAILED, error=str(e))
+        return Job.FAILED
+    except Exception as e:
+        logger.exception("Job %s (%s) attempt %s failed", job.pk, job.kind, job.attempts)
+        error = f"{type(e).__name__}: {e}"
+        if job.attempts < job.max_attempts:
+            backoff = float(getattr(settings, "JOBS_RETRY_BACKOFF", 5.0)) * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+                status=Job.QUEUED, error=error, worker="", run_after=timezone.now() + timedelta(seconds=backoff)
+            )
+            return Job.QUEUED
+        _finish(job, status=Job.FAILED, error=error)
+        return Job.FAILED
+
+    _finish(
+        job,
+        status=Job.SUCCEEDED,
+        progress=100.0,
+        result=result,
+        artifact=ctx.artifact,
+        artifact_name=ctx.artifact_name,
+        artifact_type=ctx.artifact_type,
+        error="",
+    )
+    return Job.SUCCEEDED
+
+
+def work(
+    once: bool = False,
+    poll_interval: float = 1.0,
+    should_stop: Callable[[], bool] = lambda: False,
+    log: Callable[[str], None] = lambda msg: None,
+) -> int:
+    """
+    Worker loop: claim and run jobs until should_stop() (or, with once=True,
+    until the queue has no runnable job). Returns the number of jobs run.
+    """
+    name = worker_name()
+    count = 0
+    pruned_at = float("-inf")
+    while not should_stop():
+        requeue_stale()
+        if time.monotonic() - pruned_at >= PRUNE_INTERVAL:
+            pruned_at = time.monotonic()
+            if prune_finished():
+                log("pruned finished jobs past JOBS_RETENTION")
+        job = claim(name)
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        t0 = time.perf_counter()
+        status = run_job(job)
+        count += 1
+        log(f"job {job.pk} {job.kind} attempt {job.attempts}: {status} in {time.perf_counter() - t0:.2f}s")
+    return count
+
+
+# -- kinds ------------------------------------------------------------------
+
+
+@job_kind("rescore")
+def _rescore(ctx: JobContext, payload: Dict[str, Any]):
+    """
+    payload: {"items": [{"id": ..., "ana_positive": ..., "selections"|"mask": ...}, ...],
+              "fields": "total_score,risk_tier"}
+    """
+    from .api import ApiError, parse_fields, parse_score_input, score_payload
+    from .scoring import compute_score
+
+    items = payload.get("items")
+    if not isinstance(items, list):
+        raise JobError("items must be a list")
+    try:
+        fields = parse_fields(payload.get("fields"))
+    except ApiError as e:
+        raise JobError(e.message)
+
+    results = []
+    errors = 0
+    for i, item in enumerate(items):
+        row: Dict[str, Any] = {"id": item.get("id", i) if isinstance(item, dict) else i}
+        try:
+            ana_positive, selections = parse_score_input(item)
+        except ApiError as e:
+            row["error"] = e.message
+            errors += 1
+        else:
+            row["score"] = score_payload(compute_score(ana_positive=ana_positive, selections=selections), fields)
+        results.append(row)
+        ctx.progress(i + 1, len(items), f"{i + 1}/{len(items)}")
+    return {"count": len(results), "errors": errors, "results": results}
+
+
+@job_kind("pdf_batch")
+def _pdf_batch(ctx: JobContext, payload: Dict[str, Any]):
+    """
+    payload: {"items": [{"patient_info": {...}, "ana_positive": ..., "selections"|"mask": ...}, ...]}
+    Produces a zip of PDFs named like the single export.
+    """
+    from .api import ApiError, parse_score_input
+    from .pdf import PdfUnavailable, html_to_pdf, load_weasyprint, pdf_filename, render_report_html
+    from .scoring import compute_score
+    from .views import _radar_payload, _result_to_dict
+
+    items = payload.get("items")
+    if not isinstance(items, list) or not items:
+        raise JobError("items must be a non-empty list")
+    try:
+        load_weasyprint()
+    except PdfUnavailable as e:
+        raise JobError(str(e))
+
+    buf = io.BytesIO()
+    names: Dict[str, int] = {}
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i, item in enumerate(items):
+            try:
+                ana_positive, selections = parse_score_input(item)
+            except ApiError as e:
+                raise JobError(f"items[{i}]: {e.message}")
+            result = compute_score(ana_positive=ana_positive, selections=selections)
+            report = {
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "patient_info": item.get("patient_info") or {},
+                "result": _result_to_dict(result),
+                "radar_axes": _radar_payload(result),
+            }
+            name = pdf_filename(report)
+            n = names[name] = names.get(name, 0) + 1
+            if n > 1:
+                name = name.replace(".pdf", f"-{n}.pdf")
+            zf.writestr(name, html_to_pdf(render_report_html(report)))
+            ctx.progress(i + 1, len(items), name)
+    ctx.set_artifact(buf.getvalue(), f"sle-reports-job-{ctx.job.pk}.zip", "application/zip")
+    return {"count": len(items)}
+
+
+@job_kind("test_suite")
+def _test_suite(ctx: JobContext, payload: Dict[str, Any]):
+    """
+    payload: {"mode": "all"} or {"mode": "one", "id": "TC-09"}, like /test-cases/run.
+    """
+    import json
+
+    from .run_cache import default_cache
+    from .testcase_runner import iter_run_cases
+    from .views import TEST_CASES_PATH, _run_result_to_dict, _run_summary, _run_workers, _selected_cases
+
+    suite = json.loads(TEST_CASES_PATH.read_text(encoding="utf-8"))
+    cases = _selected_cases(suite, payload.get("mode", "all"), payload.get("id"))
+    order = {tc.get("id"): i for i, tc in enumerate(cases)}
+    results = []
+    for r in iter_run_cases(cases, max_workers=_run_workers(), cache=default_cache()):
+        results.append(_run_result_to_dict(r))
+        ctx.progress(len(results), len(cases), r.id or "")
+    results.sort(key=lambda row: order.get(row["id"], len(order)))
+    return {"summary": _run_summary(results), "results": results}
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import re
+import unicodedata
+from typing import Dict, FrozenSet, Hashable, Iterable, Set, Tuple
+
+
+def _fold(s: str) -> str:
+    return unicodedata.normalize("NFC", s).lower()
+
+
+class KeywordMatcher:
+    """
+    Single-pass multi-pattern matcher over a fixed (pattern -> targets) table.
+
+    `find(text)` returns every target whose pattern occurs anywhere in the
+    text, overlapping matches included — the same answer as running
+    `pattern in text` for every pattern, but with one regex scan.
+    Matching is case-insensitive and Unicode-NFC normalized.
+
+    All patterns are compiled into one zero-width lookahead alternation
+    (longest first), so the scan reports the longest pattern starting at each
+    position. Shorter patterns hidden inside a reported match (e.g. "class ii"
+    inside "class iii") are recovered from a precomputed containment closure.
+    """
+
+    def __init__(self, table: Iterable[Tuple[str, Iterable[Hashable]]]):
+        direct: Dict[str, Set[Hashable]] = {}
+        for pattern, targets in table:
+            direct.setdefault(_fold(pattern), set()).update(targets)
+
+        patterns = sorted(direct, key=len, reverse=True)
+        self._closure: Dict[str, FrozenSet[Hashable]] = {
+            p: frozenset(t for q in patterns if q in p for t in direct[q]) for p in patterns
+        }
+        self._regex = re.compile("(?=(" + "|".join(re.escape(p) for p in patterns) + "))") if patterns else None
+
+    def find(self, text: str) -> Set[Hashable]:
+        found: Set[Hashable] = set()
+        if self._regex is None:
+            return found
+        closure = self._closure
+        for m in set(self._regex.findall(_fold(text))):
+            found |= closure[m]
+        return found
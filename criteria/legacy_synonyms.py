@@ -0,0 +1,99 @@
+"""
+Synonym table used to map legacy free-text criteria (docs/test_cases.json,
+clinic notes) to internal criterion IDs.
+
+Each entry is (pattern, targets). A pattern matches when it occurs anywhere in
+the normalized text (case-insensitive substring, overlaps included), so
+"class iii" also triggers "class ii" exactly as the original keyword checks
+did; max-in-domain scoring makes that harmless.
+
+Targets are criterion IDs from scoring.get_domains(), or one of the
+pseudo-targets below that are combined after matching:
+  - LOW_C3 / LOW_C4: both -> low_c3_and_c4, either -> low_c3_or_c4
+
+Add new synonyms here; no code changes are needed.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple
+
+LOW_C3 = "@low_c3"
+LOW_C4 = "@low_c4"
+
+LEGACY_SYNONYMS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    # Renal
+    ("proteinuria", ("proteinuria",)),
+    ("protein niệu", ("proteinuria",)),
+    ("class iii", ("renal_biopsy_class_iii_or_iv",)),
+    ("class iv", ("renal_biopsy_class_iii_or_iv",)),
+    ("thận loại iii", ("renal_biopsy_class_iii_or_iv",)),
+    ("thận loại iv", ("renal_biopsy_class_iii_or_iv",)),
+    ("class ii", ("renal_biopsy_class_ii_or_v",)),
+    ("class v", ("renal_biopsy_class_ii_or_v",)),
+    ("thận loại ii", ("renal_biopsy_class_ii_or_v",)),
+    ("thận loại v", ("renal_biopsy_class_ii_or_v",)),
+    # Serosal
+    ("acute pericarditis", ("acute_pericarditis",)),
+    ("viêm màng ngoài tim", ("acute_pericarditis",)),
+    ("effusion", ("pleural_or_pericardial_effusion",)),
+    ("tràn dịch", ("pleural_or_pericardial_effusion",)),
+    # Constitutional
+    ("fever", ("fever",)),
+    ("sốt", ("fever",)),
+    # Hematologic
+    ("leukopenia", ("leukopenia",)),
+    ("giảm bạch cầu", ("leukopenia",)),
+    ("thrombocytopenia", ("thrombocytopenia",)),
+    ("giảm tiểu cầu", ("thrombocytopenia",)),
+    ("hemolysis", ("autoimmune_hemolysis",)),
+    ("tan máu", ("autoimmune_hemolysis",)),
+    # Neuropsychiatric
+    ("delirium", ("delirium",)),
+    ("mê sảng", ("delirium",)),
+    ("psychosis", ("psychosis",)),
+    ("loạn thần", ("psychosis",)),
+    ("seizure", ("seizure",)),
+    ("co giật", ("seizure",)),
+    # Musculoskeletal
+    ("arthritis", ("joint_involvement",)),
+    ("joint", ("joint_involvement",)),
+    ("viêm khớp", ("joint_involvement",)),
+    ("đau khớp", ("joint_involvement",)),
+    # Mucocutaneous
+    ("acute cutaneous", ("acute_cutaneous",)),
+    ("lupus da cấp", ("acute_cutaneous",)),
+    ("discoid", ("subacute_cutaneous_or_discoid",)),
+    ("subacute cutaneous", ("subacute_cutaneous_or_discoid",)),
+    ("dạng đĩa", ("subacute_cutaneous_or_discoid",)),
+    ("lupus da bán cấp", ("subacute_cutaneous_or_discoid",)),
+    ("oral ulcer", ("oral_ulcers",)),
+    ("mouth ulcer", ("oral_ulcers",)),
+    ("loét miệng", ("oral_ulcers",)),
+    ("alopecia", ("nonscarring_alopecia",)),
+    ("rụng tóc", ("nonscarring_alopecia",)),
+    # Complement (legacy notes express Low C3 and Low C4 separately)
+    ("low c3", (LOW_C3,)),
+    ("low c4", (LOW_C4,)),
+    ("giảm c3", (LOW_C3,)),
+    ("giảm c4", (LOW_C4,)),
+    # Both markers named together only count with the "low" qualifier
+    # ("C3 và C4 bình thường" is a normal result).
+    ("giảm c3 và c4", (LOW_C3, LOW_C4)),
+    ("giảm c3, c4", (LOW_C3, LOW_C4)),
+    ("c3 và c4 giảm", (LOW_C3, LOW_C4)),
+    ("c3, c4 giảm", (LOW_C3, LOW_C4)),
+    ("low c3 and c4", (LOW_C3, LOW_C4)),
+    # Antiphospholipid (any positive => 2 points)
+    ("anti-cardiolipin", ("antiphospholipid_any",)),
+    ("kháng cardiolipin", ("antiphospholipid_any",)),
+    ("lupus anticoagulant", ("antiphospholipid_any",)),
+    ("kháng đông lupus", ("antiphospholipid_any",)),
+    ("β2", ("antiphospholipid_any",)),
+    ("b2gp1", ("antiphospholipid_any",)),
+    # SLE-specific antibodies
+    ("anti-dsdna", ("anti_dsdna_or_anti_sm",)),
+    ("anti-sm", ("anti_dsdna_or_anti_sm",)),
+    ("anti sm", ("anti_dsdna_or_anti_sm",)),
+    ("kháng dsdna", ("anti_dsdna_or_anti_sm",)),
+)
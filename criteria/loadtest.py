@@ -0,0 +1,325 @@
+"""
+Stdlib asyncio HTTP load generator that replays scripted clinic scenarios
+against a running server (runserver, gunicorn, uvicorn, ...).
+
+A scenario (criteria/loadtest_scenarios/*.json) is a weighted set of flows;
+each flow is a list of steps a virtual user performs on one keep-alive
+connection with its own cookie jar (so session-backed steps such as PDF
+export work after a scoring POST). Two load models are supported:
+
+- closed: `concurrency` virtual users loop over flows back to back;
+- open: flows arrive as a Poisson process at `rate` per second and are
+  served by at most `concurrency` virtual users. The first request of a flow
+  is timed from its scheduled arrival, so time spent waiting for a free
+  virtual user counts as latency (no coordinated omission).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from http.cookies import SimpleCookie
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+SCENARIO_DIR = Path(__file__).resolve().parent / "loadtest_scenarios"
+
+
+def list_scenarios() -> List[str]:
+    return sorted(p.stem for p in SCENARIO_DIR.glob("*.json"))
+
+
+def load_scenario(name_or_path: str) -> Dict[str, Any]:
+    path = Path(name_or_path)
+    if not path.suffix:
+        path = SCENARIO_DIR / f"{name_or_path}.json"
+    scenario = json.loads(path.read_text(encoding="utf-8"))
+    if not scenario.get("flows"):
+        raise ValueError(f"Scenario {path} has no flows")
+    for flow in scenario["flows"]:
+        if not flow.get("steps"):
+            raise ValueError(f"Flow {flow.get('name')!r} in {path} has no steps")
+    return scenario
+
+
+class _Connection:
+    """
+    One HTTP/1.1 keep-alive connection plus a cookie jar.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies: Dict[str, str] = {}
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+        self._reader = self._writer = None
+
+    async def request(self, method: str, path: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        try:
+            return await asyncio.wait_for(self._request(method, path, body, headers or {}), self.timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _read_head(self) -> Tuple[int, List[Tuple[str, str]]]:
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed the connection")
+        status = int(status_line.split()[1])
+
+        resp_headers: List[Tuple[str, str]] = []
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            resp_headers.append((k.strip().lower(), v.strip()))
+        return status, resp_headers
+
+    async def _request(self, method: str, path: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        for k, v in headers.items():
+            lines.append(f"{k}: {v}")
+        if body or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body)}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self._writer.drain()
+
+        while True:
+            status, resp_headers = await self._read_head()
+            if not 100 <= status < 200:
+                break  # interim 1xx responses have no body; the final response follows
+
+        for k, v in resp_headers:
+            if k == "set-cookie":
+                jar = SimpleCookie()
+                jar.load(v)
+                for name, morsel in jar.items():
+                    self.cookies[name] = morsel.value
+
+        hdr = dict(resp_headers)
+        if method == "HEAD" or status in (204, 304):
+            data = b""
+        elif "content-length" in hdr:
+            data = await self._reader.readexactly(int(hdr["content-length"]))
+        elif "chunked" in hdr.get("transfer-encoding", "").lower():
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                chunks.append(await self._reader.readexactly(size))
+                await self._reader.readline()
+            data = b"".join(chunks)
+        else:
+            data = await self._reader.read()
+            await self.close()
+            return status, data
+
+        if hdr.get("connection", "").lower() == "close":
+            await self.close()
+        return status, data
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, latency_ms: float, status: Optional[int], ok: bool) -> None:
+        self.latencies_ms.append(latency_ms)
+        key = str(status) if status is not None else "exception"
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if not ok:
+            self.errors += 1
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+class LoadTest:
+    def __init__(
+        self,
+        base_url: str,
+        scenario: Dict[str, Any],
+        concurrency: int = 10,
+        rate: Optional[float] = None,
+        duration: Optional[float] = 30.0,
+        max_flows: Optional[int] = None,
+        timeout: float = 30.0,
+        seed: int = 0,
+    ):
+        parts = urlsplit(base_url)
+        if parts.scheme != "http":
+            raise ValueError("Only plain http:// targets are supported")
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/")
+        self.scenario = scenario
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.duration = duration
+        self.max_flows = max_flows
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, EndpointStats] = {}
+        self.flows_started = 0
+        self.flows_completed = 0
+        self._flows = scenario["flows"]
+        self._weights = [float(f.get("weight", 1)) for f in self._flows]
+
+    def _pick_flow(self) -> Dict[str, Any]:
+        return self.rng.choices(self._flows, weights=self._weights, k=1)[0]
+
+    def _claim_flow(self, deadline: Optional[float]) -> bool:
+        if self.max_flows is not None and self.flows_started >= self.max_flows:
+            return False
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        self.flows_started += 1
+        return True
+
+    async def _ensure_csrf(self, conn: _Connection) -> None:
+        if "csrftoken" not in conn.cookies:
+            await conn.request("GET", self.prefix + self.scenario.get("csrf_bootstrap_path", "/"))
+
+    async def _run_step(self, conn: _Connection, step: Dict[str, Any], t0: Optional[float] = None) -> None:
+        method = step.get("method", "GET").upper()
+        path = self.prefix + step["path"]
+        headers = dict(step.get("headers") or {})
+        body = b""
+        if "json" in step:
+            body = json.dumps(step["json"]).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        elif "form" in step:
+            body = urlencode(step["form"], doseq=True).encode("utf-8")
+            headers.setdefault("Content-Type", "application/x-www-form-urlencoded")
+        if method not in ("GET", "HEAD", "OPTIONS"):
+            await self._ensure_csrf(conn)
+            if "csrftoken" in conn.cookies:
+                headers.setdefault("X-CSRFToken", conn.cookies["csrftoken"])
+
+        expect = step.get("expect_status", [200])
+        expect = expect if isinstance(expect, list) else [expect]
+        endpoint = step.get("endpoint") or f"{method} {step['path']}"
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+
+        if t0 is None:
+            t0 = time.perf_counter()
+        status: Optional[int] = None
+        try:
+            status, _ = await conn.request(method, path, body, headers)
+        except Exception:
+            pass
+        stats.record((time.perf_counter() - t0) * 1e3, status, status in expect)
+
+    async def _run_flow(self, conn: _Connection, flow: Dict[str, Any], scheduled: Optional[float] = None) -> None:
+        """
+        scheduled: perf_counter() time the flow was due to arrive (open model).
+        """
+        for i, step in enumerate(flow["steps"]):
+            await self._run_step(conn, step, scheduled if i == 0 else None)
+        self.flows_completed += 1
+
+    async def _closed_user(self, deadline: Optional[float]) -> None:
+        conn = _Connection(self.host, self.port, self.timeout)
+        try:
+            while self._claim_flow(deadline):
+                await self._run_flow(conn, self._pick_flow())
+        finally:
+            await conn.close()
+
+    async def _open_model(self, deadline: Optional[float]) -> None:
+        idle: asyncio.Queue = asyncio.Queue()
+        for _ in range(self.concurrency):
+            idle.put_nowait(_Connection(self.host, self.port, self.timeout))
+        tasks = set()
+
+        async def serve(flow, scheduled):
+            conn = await idle.get()
+            try:
+                await self._run_flow(conn, flow, scheduled)
+            finally:
+                idle.put_nowait(conn)
+
+        next_at = time.perf_counter()
+        while self._claim_flow(deadline):
+            task = asyncio.ensure_future(serve(self._pick_flow(), next_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_at += self.rng.expovariate(self.rate)
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if tasks:
+            await asyncio.gather(*tasks)
+        while not idle.empty():
+            await idle.get_nowait().close()
+
+    async def run_async(self) -> Dict[str, Any]:
+        started = time.monotonic()
+        deadline = started + self.duration if self.duration else None
+        if self.rate:
+            await self._open_model(deadline)
+        else:
+            await asyncio.gather(*(self._closed_user(deadline) for _ in range(self.concurrency)))
+        return self.report(time.monotonic() - started)
+
+    def run(self) -> Dict[str, Any]:
+        return asyncio.run(self.run_async())
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        endpoints = {}
+        for name, st in sorted(self.stats.items()):
+            lat = sorted(st.latencies_ms)
+            n = len(lat)
+            endpoints[name] = {
+                "requests": n,
+                "errors": st.errors,
+                "error_rate": st.errors / n if n else 0.0,
+                "throughput_rps": n / elapsed if elapsed else 0.0,
+                "p50_ms": _percentile(lat, 50),
+                "p95_ms": _percentile(lat, 95),
+                "p99_ms": _percentile(lat, 99),
+                "max_ms": lat[-1] if lat else 0.0,
+                "statuses": st.statuses,
+            }
+        total = sum(e["requests"] for e in endpoints.values())
+        errors = sum(e["errors"] for e in endpoints.values())
+        return {
+            "scenario": self.scenario.get("name"),
+            "model": "open" if self.rate else "closed",
+            "concurrency": self.concurrency,
+            "rate": self.rate,
+            "elapsed_s": elapsed,
+            "flows_completed": self.flows_completed,
+            "requests": total,
+            "errors": errors,
+            "throughput_rps": total / elapsed if elapsed else 0.0,
+            "endpoints": endpoints,
+        }
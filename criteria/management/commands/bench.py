@@ -0,0 +1,80 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from criteria import bench
+
+
+class Command(BaseCommand):
+    help = (
+        "Run microbenchmarks for scoring, forms, serialization and views; report ops/sec, "
+        "latency percentiles and allocations, optionally comparing against a saved baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("names", nargs="*", help="Benchmarks to run (default: all).")
+        parser.add_argument("--list", action="store_true", help="List available benchmarks and exit.")
+        parser.add_argument("--iterations", type=int, default=2000, help="Max timed calls per benchmark.")
+        parser.add_argument("--max-time", type=float, default=2.0, help="Max seconds per benchmark.")
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("-o", "--output", help="Save results as JSON to this path.")
+        parser.add_argument("--baseline", help="Compare against results previously saved with --output.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.10,
+            help="Fail when ops/sec drops by more than this fraction vs. the baseline (default 0.10).",
+        )
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for name in bench.BENCHMARKS:
+                self.stdout.write(name)
+            return
+
+        baseline = None
+        if options.get("baseline"):
+            try:
+                baseline = json.loads(Path(options["baseline"]).read_text(encoding="utf-8"))
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Không đọc được baseline {options['baseline']}: {e}") from e
+
+        # View benchmarks go through the test client; keep sessions in memory so the
+        # suite runs without a migrated database, and keep the fake requests out of
+        # the audit log and the shared test-case run cache (as tests.py does), so
+        # baselines measure the views rather than audit or cache I/O.
+        with override_settings(
+            SESSION_ENGINE="django.contrib.sessions.backends.cache",
+            ALLOWED_HOSTS=["*"],
+            AUDIT_ENABLED=False,
+            TEST_CASES_CACHE=False,
+        ):
+            try:
+                report = bench.run(
+                    names=options["names"],
+                    iterations=options["iterations"],
+                    max_time=options["max_time"],
+                    warmup=options["warmup"],
+                    log=self.stdout.write,
+                )
+            except KeyError as e:
+                raise CommandError(f"Unknown benchmark(s): {e.args[0]}") from e
+
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps(report, indent=2), encoding="utf-8")
+            self.stdout.write(f"Saved results to {options['output']}")
+
+        if baseline is not None:
+            rows = bench.compare(report, baseline, options["threshold"])
+            regressions = [r for r in rows if r["regression"]]
+            for r in rows:
+                line = f"{r['name']:<22} {r['baseline_ops_per_sec']:>12,.0f} -> {r['ops_per_sec']:>12,.0f} ops/s ({r['change']:+.1%})"
+                self.stdout.write(self.style.ERROR(line) if r["regression"] else line)
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} benchmark(s) regressed by more than {options['threshold']:.0%}: "
+                    + ", ".join(r["name"] for r in regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
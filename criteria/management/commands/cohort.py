@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from criteria import cohort
+
+
+class Command(BaseCommand):
+    help = (
+        "Pack a patient CSV into the binary cohort format (.sleco) once, then rescore it "
+        "in place via mmap (see criteria/cohort.py)."
+    )
+
+    def add_arguments(self, parser):
+        sub = parser.add_subparsers(dest="action", required=True)
+
+        pack = sub.add_parser("pack", help="Convert a CSV to a cohort file.")
+        pack.add_argument("csv")
+        pack.add_argument("output")
+        pack.add_argument("--key-column", default="id")
+        pack.add_argument("--ana-column", default="ana_positive")
+        pack.add_argument("--key-width", type=int, default=cohort.DEFAULT_KEY_WIDTH, help="Bytes per key (rounded up to 4).")
+
+        score = sub.add_parser("score", help="Score a cohort file and print a summary.")
+        score.add_argument("cohort")
+        score.add_argument("--scores-out", help="Also write one score byte per record (record order).")
+        score.add_argument("-o", "--output", help="Save the summary as JSON.")
+
+        info = sub.add_parser("info", help="Show a cohort file's header.")
+        info.add_argument("cohort")
+
+    def handle(self, *args, **options):
+        try:
+            getattr(self, f"_{options['action']}")(options)
+        except (OSError, cohort.CohortError) as e:
+            raise CommandError(str(e)) from e
+
+    def _pack(self, options):
+        count = cohort.pack_csv(
+            options["csv"],
+            options["output"],
+            key_column=options["key_column"],
+            ana_column=options["ana_column"],
+            key_width=options["key_width"],
+        )
+        self.stdout.write(f"Packed {count:,} records into {options['output']}")
+
+    def _score(self, options):
+        summary = cohort.score_cohort(options["cohort"], scores_out=options.get("scores_out"))
+        if summary.file_ruleset_version != summary.ruleset_version:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Packed under ruleset {summary.file_ruleset_version}; scored with {summary.ruleset_version}"
+                )
+            )
+        self.stdout.write(
+            f"{summary.records:,} records ({summary.distinct_words:,} distinct inputs) in {summary.seconds:.2f}s: "
+            f"{summary.eligible:,} ANA+, {summary.classified:,} classified (score >= 10)"
+        )
+        for tier, n in sorted(summary.tiers.items(), key=lambda kv: -kv[1]):
+            self.stdout.write(f"  {n:>12,}  {tier}")
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps(summary.to_dict(), indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(f"Saved summary to {options['output']}")
+
+    def _info(self, options):
+        with cohort.Cohort(options["cohort"]) as c:
+            h = c.header
+            self.stdout.write(f"records: {len(c):,}")
+            self.stdout.write(f"ruleset_version: {h.ruleset_version}")
+            self.stdout.write(f"key_width: {h.key_width}")
+            self.stdout.write(f"criteria: {', '.join(h.ids)}")
@@ -0,0 +1,67 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from criteria import differential
+
+
+class Command(BaseCommand):
+    help = (
+        "Differentially check compute_score against an independent table-driven reference "
+        "over every (ANA, criterion-mask) combination, or a random sample of them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=None,
+            help="Check this many random inputs instead of the exhaustive sweep.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--batch-size", type=int, default=1 << 14)
+        parser.add_argument("--max-failures", type=int, default=10)
+
+    def handle(self, *args, **options):
+        space = 2 << differential.N_BITS
+        target = options["samples"] or space
+        mode = f"{options['samples']} samples" if options["samples"] else f"exhaustive ({space} inputs)"
+        self.stdout.write(f"Fuzzing compute_score: {mode}, {differential.N_BITS} criteria, {options['workers']} worker(s)")
+
+        started = time.perf_counter()
+        last = [0.0]
+
+        def progress(done, total):
+            now = time.perf_counter()
+            if now - last[0] >= 5 or done == total:
+                last[0] = now
+                self.stdout.write(f"  {done}/{total} ({done / (now - started):,.0f} inputs/s)")
+
+        report = differential.run(
+            samples=options["samples"],
+            seed=options["seed"],
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            max_failures=options["max_failures"],
+            progress=progress,
+        )
+        elapsed = time.perf_counter() - started
+
+        for line in report.drift:
+            self.stdout.write(self.style.WARNING(f"Ruleset drift: {line}"))
+        for d in report.disagreements:
+            self.stdout.write(self.style.ERROR(f"DISAGREE ana_positive={d.ana_positive} mask={d.mask:#x} {differential.describe_mask(d.mask)}"))
+            for diff in d.diffs:
+                self.stdout.write(f"    {diff}")
+            self.stdout.write(f"  minimal reproducer: {d.reproducer()}")
+            for diff in d.minimal_diffs:
+                self.stdout.write(f"    {diff}")
+
+        self.stdout.write(f"Checked {report.checked}/{target} inputs in {elapsed:.1f}s")
+        if not report.ok:
+            raise CommandError(
+                f"{len(report.disagreements)} disagreement(s), {len(report.drift)} ruleset drift(s) found"
+            )
+        self.stdout.write(self.style.SUCCESS("compute_score agrees with the reference"))
@@ -0,0 +1,56 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from criteria.importtime import best_of
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure cold start of WSGI entry points in fresh interpreters (python -X importtime): "
+        "import time, first /api/score request, RSS and the slowest imports."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "entries",
+            nargs="*",
+            default=["sleweb.wsgi", "sleweb.wsgi_api"],
+            help="Modules exposing `application` (default: the full and the API-only profile).",
+        )
+        parser.add_argument("--runs", type=int, default=3, help="Cold starts per entry; the fastest is reported.")
+        parser.add_argument("--top", type=int, default=15, help="Number of slowest imports / packages to show.")
+        parser.add_argument("--depth", type=int, default=2, help="Dotted components used to group packages.")
+        parser.add_argument("-o", "--output", help="Save full reports (every import record) as JSON.")
+
+    def handle(self, *args, **options):
+        reports = []
+        for entry in options["entries"]:
+            try:
+                reports.append(best_of(entry, options["runs"]))
+            except RuntimeError as e:
+                raise CommandError(str(e)) from e
+
+        self.stdout.write(
+            f"{'entry':<20} {'settings':<22} {'import ms':>10} {'1st req ms':>11} {'modules':>8} {'RSS MiB':>8}"
+        )
+        for r in reports:
+            self.stdout.write(
+                f"{r.entry:<20} {r.settings:<22} {r.import_seconds * 1000:>10.1f} "
+                f"{r.first_request_seconds * 1000:>11.1f} {r.modules:>8} {(r.rss_bytes or 0) / 2**20:>8.1f}"
+            )
+
+        for r in reports:
+            self.stdout.write("")
+            self.stdout.write(f"== {r.entry}: -X importtime total {r.import_total_us / 1000:.1f} ms")
+            self.stdout.write(f"{'self ms':>9} {'cumul ms':>9}  module")
+            for rec in r.top(options["top"]):
+                self.stdout.write(f"{rec.self_us / 1000:>9.1f} {rec.cumulative_us / 1000:>9.1f}  {'  ' * rec.depth}{rec.name}")
+            self.stdout.write(f"{'self ms':>9}  package")
+            for name, us in r.by_package(options["depth"])[: options["top"]]:
+                self.stdout.write(f"{us / 1000:>9.1f}  {name}")
+
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps([r.to_dict() for r in reports], indent=2), encoding="utf-8")
+            self.stdout.write(f"Saved results to {options['output']}")
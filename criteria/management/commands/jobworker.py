@@ -0,0 +1,64 @@
+import signal
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from criteria import jobs
+
+
+class Command(BaseCommand):
+    help = "Run background jobs queued through /api/jobs (see criteria/jobs.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run runnable jobs, then exit when the queue is empty.")
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=None,
+            help="Seconds between queue polls when idle (default: JOBS_POLL_INTERVAL).",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Start this many worker processes (each runs one job at a time).",
+        )
+
+    def handle(self, *args, **options):
+        poll = options["poll"] if options["poll"] is not None else getattr(settings, "JOBS_POLL_INTERVAL", 1.0)
+        if options["processes"] > 1:
+            return self._supervise(options["processes"], options["once"], poll)
+
+        stopping = []
+
+        def stop(signum, frame):
+            # Finish the current job, then exit.
+            stopping.append(signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        count = jobs.work(
+            once=options["once"],
+            poll_interval=poll,
+            should_stop=lambda: bool(stopping),
+            log=self.stdout.write,
+        )
+        self.stdout.write(f"{jobs.worker_name()}: {count} job(s) run")
+
+    def _supervise(self, processes: int, once: bool, poll: float):
+        cmd = [sys.executable, str(settings.BASE_DIR / "manage.py"), "jobworker", "--poll", str(poll)]
+        if once:
+            cmd.append("--once")
+        children = [subprocess.Popen(cmd) for _ in range(processes)]
+
+        def forward(signum, frame):
+            for child in children:
+                if child.poll() is None:
+                    child.send_signal(signum)
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.wait()
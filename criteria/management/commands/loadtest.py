@@ -0,0 +1,78 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from criteria.loadtest import LoadTest, list_scenarios, load_scenario
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a scripted clinic scenario against a running server and report throughput, "
+        "p50/p95/p99 latency and error rate per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", nargs="?", default="clinic_mix", help="Scenario name or path to a JSON file.")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+        parser.add_argument("-c", "--concurrency", type=int, default=10, help="Virtual users / connections.")
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=None,
+            help="Open model: flow arrivals per second (Poisson). Default: closed model.",
+        )
+        parser.add_argument("-d", "--duration", type=float, default=30.0, help="Seconds to run (0 = until --flows).")
+        parser.add_argument("-n", "--flows", type=int, default=None, help="Stop after this many flows.")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("-o", "--output", help="Save the JSON report to this path.")
+        parser.add_argument("--list", action="store_true", help="List bundled scenarios and exit.")
+
+    def handle(self, *args, **options):
+        if options["list"]:
+            for name in list_scenarios():
+                self.stdout.write(name)
+            return
+
+        if not options["duration"] and not options["flows"]:
+            raise CommandError("Set --duration or --flows so the run terminates.")
+
+        try:
+            scenario = load_scenario(options["scenario"])
+            test = LoadTest(
+                options["base_url"],
+                scenario,
+                concurrency=options["concurrency"],
+                rate=options["rate"],
+                duration=options["duration"] or None,
+                max_flows=options["flows"],
+                timeout=options["timeout"],
+                seed=options["seed"],
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e)) from e
+
+        model = f"open @ {options['rate']}/s" if options["rate"] else "closed"
+        self.stdout.write(
+            f"Scenario {scenario.get('name')} -> {options['base_url']} ({model}, concurrency {options['concurrency']})"
+        )
+        report = test.run()
+
+        self.stdout.write(
+            f"{'endpoint':<18} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err %':>7}"
+        )
+        for name, e in report["endpoints"].items():
+            line = (
+                f"{name:<18} {e['requests']:>7} {e['throughput_rps']:>8.1f} {e['p50_ms']:>9.1f} "
+                f"{e['p95_ms']:>9.1f} {e['p99_ms']:>9.1f} {e['error_rate'] * 100:>6.1f}%"
+            )
+            self.stdout.write(self.style.ERROR(line) if e["errors"] else line)
+        self.stdout.write(
+            f"Total: {report['requests']} requests, {report['throughput_rps']:.1f} req/s, "
+            f"{report['errors']} errors in {report['elapsed_s']:.1f}s"
+        )
+
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps(report, indent=2), encoding="utf-8")
+            self.stdout.write(f"Saved report to {options['output']}")
@@ -0,0 +1,53 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from criteria.memory import diff_snapshots, snapshot_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Inspect tracemalloc snapshots written by /debug/memory/snapshot: "
+        "`list`, `show <snap>` or `diff <old> <new>` (default: the two most recent)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=("list", "show", "diff"))
+        parser.add_argument("snapshots", nargs="*")
+        parser.add_argument("--dir", help="Snapshot directory (default: settings.MEMORY_SNAPSHOT_DIR).")
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--group-by", choices=("lineno", "filename", "traceback"), default="lineno")
+
+    def handle(self, *args, **options):
+        directory = Path(options["dir"]) if options.get("dir") else snapshot_dir()
+        available = sorted(directory.glob("*.snap")) if directory.is_dir() else []
+
+        if options["action"] == "list":
+            for p in available:
+                self.stdout.write(f"{p.name}  {p.stat().st_size / 1024:.0f} KiB")
+            return
+
+        paths = [Path(p) for p in options["snapshots"]]
+        needed = 1 if options["action"] == "show" else 2
+        if not paths:
+            paths = available[-needed:]
+        if len(paths) != needed:
+            raise CommandError(f"`{options['action']}` cần {needed} snapshot (tìm thấy {len(paths)} trong {directory})")
+
+        import tracemalloc
+
+        try:
+            if options["action"] == "show":
+                stats = tracemalloc.Snapshot.load(str(paths[0])).statistics(options["group_by"])
+                total = sum(s.size for s in stats)
+                self.stdout.write(f"{paths[0].name}: {total / 1024:.1f} KiB traced")
+                for st in stats[: options["limit"]]:
+                    self.stdout.write(f"  {st}")
+            else:
+                stats = diff_snapshots(paths[0], paths[1], options["group_by"])
+                growth = sum(s.size_diff for s in stats)
+                self.stdout.write(f"{paths[0].name} -> {paths[1].name}: {growth / 1024:+.1f} KiB")
+                for st in stats[: options["limit"]]:
+                    self.stdout.write(f"  {st}")
+        except (OSError, ValueError, EOFError) as e:
+            raise CommandError(f"Không đọc được snapshot: {e}") from e
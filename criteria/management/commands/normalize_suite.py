@@ -0,0 +1,41 @@
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from criteria.suite_stream import write_normalized_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert a legacy test suite (docs/test_cases.json format) to schema internal_ids_v2, "
+        "streaming case by case so memory stays bounded for very large suites."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "source",
+            nargs="?",
+            default=str(Path(settings.BASE_DIR) / "docs" / "test_cases.json"),
+            help="Legacy suite JSON (default: docs/test_cases.json).",
+        )
+        parser.add_argument("-o", "--output", help="Write to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        source = Path(options["source"])
+        if not source.exists():
+            raise CommandError(f"Không tìm thấy file: {source}")
+
+        try:
+            with source.open("r", encoding="utf-8") as src:
+                if options.get("output"):
+                    out_path = Path(options["output"])
+                    tmp = out_path.with_name(out_path.name + ".tmp")
+                    with tmp.open("w", encoding="utf-8", newline="") as out:
+                        write_normalized_suite(src, out)
+                    tmp.replace(out_path)
+                else:
+                    write_normalized_suite(src, sys.stdout)
+        except ValueError as e:
+            raise CommandError(f"Không parse được {source}: {e}") from e
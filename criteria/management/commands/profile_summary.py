@@ -0,0 +1,56 @@
+import io
+import pstats
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from criteria.profiling import list_profiles, make_token, parse_profile_name, profile_dir
+
+
+class Command(BaseCommand):
+    help = "Summarize cProfile captures written by ProfilingMiddleware (top functions across profiles)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", help="Profile directory (default: settings.PROFILING_DIR).")
+        parser.add_argument("--view", help="Only include captures whose view name contains this string.")
+        parser.add_argument("--limit", type=int, default=25, help="Number of functions to show.")
+        parser.add_argument("--sort", choices=("cumulative", "tottime", "ncalls"), default="cumulative")
+        parser.add_argument("--slowest", type=int, default=0, help="Only the N slowest captures.")
+        parser.add_argument(
+            "--make-token",
+            action="store_true",
+            help="Print a signed X-Profile header value to profile one request on demand.",
+        )
+
+    def handle(self, *args, **options):
+        if options["make_token"]:
+            self.stdout.write(make_token())
+            return
+
+        directory = Path(options["dir"]) if options.get("dir") else profile_dir()
+        files = []
+        for p in list_profiles(directory):
+            _, _, view, ms = parse_profile_name(p.name)
+            if options.get("view") and options["view"] not in view:
+                continue
+            files.append((ms, view, p))
+        if not files:
+            raise CommandError(f"Không có profile nào trong {directory}")
+        if options["slowest"]:
+            files = sorted(files, reverse=True)[: options["slowest"]]
+
+        by_view = defaultdict(list)
+        for ms, view, _ in files:
+            by_view[view].append(ms)
+        self.stdout.write(f"{len(files)} capture(s) in {directory}")
+        self.stdout.write(f"{'view':<40} {'n':>5} {'avg ms':>9} {'max ms':>9}")
+        for view, durations in sorted(by_view.items(), key=lambda kv: -sum(kv[1])):
+            self.stdout.write(f"{view:<40} {len(durations):>5} {sum(durations) / len(durations):>9.1f} {max(durations):>9}")
+
+        out = io.StringIO()
+        stats = pstats.Stats(str(files[0][2]), stream=out)
+        for _, _, p in files[1:]:
+            stats.add(str(p))
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(options["limit"])
+        self.stdout.write(out.getvalue())
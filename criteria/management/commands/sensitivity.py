@@ -0,0 +1,62 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from criteria import sensitivity
+
+
+class Command(BaseCommand):
+    help = (
+        "Count classification flips and tier transitions of rule variants (weights, threshold, "
+        "high-risk cut point) over a packed cohort file (see criteria/sensitivity.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("cohort", help="Cohort file written by `manage.py cohort pack`.")
+        parser.add_argument(
+            "--variants",
+            help='JSON file: a list of {"name", "points": {id: points}, "threshold", "high_risk"}.',
+        )
+        parser.add_argument(
+            "--grid",
+            action="append",
+            default=[],
+            help="Variant axis, e.g. proteinuria=3..6, threshold=9..11 or seizure=4,6 (repeat for a product).",
+        )
+        parser.add_argument("--top", type=int, default=20, help="Show the N variants with the most flips.")
+        parser.add_argument("-o", "--output", help="Save the full report as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            variants = self._variants(options)
+            report = sensitivity.sweep_cohort(options["cohort"], variants)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e)) from e
+
+        self.stdout.write(
+            f"{report.patients:,} patients ({report.distinct_inputs:,} distinct ANA+ inputs, "
+            f"{report.ineligible:,} ANA-), baseline classified: {report.baseline_classified:,}"
+        )
+        self.stdout.write(f"{'variant':<40} {'classified':>12} {'gained':>9} {'lost':>9} {'tier moves':>11}")
+        for v in sorted(report.variants, key=lambda v: (-v.flips, -v.tier_changes))[: options["top"]]:
+            self.stdout.write(f"{v.name[:40]:<40} {v.classified:>12,} {v.gained:>9,} {v.lost:>9,} {v.tier_changes:>11,}")
+
+        if options.get("output"):
+            Path(options["output"]).write_text(json.dumps(report.to_dict(), indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(f"Saved report to {options['output']}")
+
+    def _variants(self, options):
+        variants = []
+        if options.get("variants"):
+            data = json.loads(Path(options["variants"]).read_text(encoding="utf-8"))
+            if isinstance(data, dict):
+                data = data.get("variants", [])
+            if not isinstance(data, list):
+                raise CommandError("variants file must contain a list")
+            variants.extend(sensitivity.parse_variant(spec, i) for i, spec in enumerate(data))
+        if options["grid"]:
+            variants.extend(sensitivity.grid_variants(options["grid"]))
+        if not variants:
+            raise CommandError("Give --variants and/or --grid")
+        return variants
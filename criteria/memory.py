@@ -0,0 +1,154 @@
+"""
+Opt-in per-request memory accounting.
+
+When settings.MEMORY_PROFILING_ENABLED is true, MemoryAccountingMiddleware
+records for every request the change in current RSS and in peak RSS
+(ru_maxrss, which is what grows a worker towards its memory limit). With
+MEMORY_TRACEMALLOC also set it traces Python allocations: the traced peak
+of the request, and, for a MEMORY_SNAPSHOT_SAMPLE_RATE fraction of requests
+above MEMORY_LOG_THRESHOLD_KB, the top allocation sites still alive after the
+request (what it left behind). Full tracemalloc snapshots are expensive, so
+only sampled requests take the "before" one and only heavy sampled requests
+the "after" one. The traced peak is process-wide: it is reset only when no
+other request is in flight, so with overlapping requests it covers all of
+them since the earliest started. Heavy requests are logged on the
+`criteria.memory` logger.
+
+Snapshots for offline diffing are written by the /debug/memory/snapshot
+endpoint and compared with `manage.py memory_snapshot diff`.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics
+
+logger = logging.getLogger("criteria.memory")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+# ru_maxrss is KiB on Linux, bytes on macOS.
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def current_rss() -> Optional[int]:
+    """
+    Resident set size in bytes, or None where /proc is unavailable.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+def snapshot_dir() -> Path:
+    return Path(getattr(settings, "MEMORY_SNAPSHOT_DIR", None) or Path(settings.BASE_DIR) / "memory_snapshots")
+
+
+def format_stats(stats: List[tracemalloc.StatisticDiff], limit: int) -> List[str]:
+    lines = []
+    for st in stats[:limit]:
+        frame = st.traceback[0]
+        lines.append(f"{frame.filename}:{frame.lineno} {st.size_diff / 1024:+.1f} KiB ({st.count_diff:+d} blocks)")
+    return lines
+
+
+def dump_snapshot(directory: Optional[Path] = None) -> Path:
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not tracing; set MEMORY_TRACEMALLOC=1")
+    directory = directory or snapshot_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{int(time.time() * 1000)}-{os.getpid()}.snap"
+    tracemalloc.take_snapshot().dump(str(path))
+    return path
+
+
+def diff_snapshots(old_path: Path, new_path: Path, key_type: str = "lineno") -> List[tracemalloc.StatisticDiff]:
+    old = tracemalloc.Snapshot.load(str(old_path))
+    new = tracemalloc.Snapshot.load(str(new_path))
+    return new.compare_to(old, key_type)
+
+
+class MemoryAccountingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "MEMORY_PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = int(getattr(settings, "MEMORY_LOG_THRESHOLD_KB", 1024)) * 1024
+        self.top_n = int(getattr(settings, "MEMORY_TOP_N", 10))
+        self.trace = bool(getattr(settings, "MEMORY_TRACEMALLOC", False))
+        self.sample_rate = float(getattr(settings, "MEMORY_SNAPSHOT_SAMPLE_RATE", 0.01))
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(int(getattr(settings, "MEMORY_TRACEMALLOC_FRAMES", 1)))
+
+    def __call__(self, request):
+        global _in_flight
+        rss0 = current_rss()
+        maxrss0 = peak_rss()
+        tracing = self.trace and tracemalloc.is_tracing()
+        before = None
+        traced0 = 0
+        if tracing:
+            if random.random() < self.sample_rate:
+                before = tracemalloc.take_snapshot()
+            with _in_flight_lock:
+                if _in_flight == 0:
+                    tracemalloc.reset_peak()
+                _in_flight += 1
+            traced0 = tracemalloc.get_traced_memory()[0]
+
+        try:
+            response = self.get_response(request)
+        finally:
+            if tracing:
+                traced_peak = max(0, tracemalloc.get_traced_memory()[1] - traced0)
+                with _in_flight_lock:
+                    _in_flight -= 1
+
+        rss1 = current_rss()
+        rss_delta = (rss1 - rss0) if rss0 is not None and rss1 is not None else 0
+        maxrss_delta = peak_rss() - maxrss0
+        if not tracing:
+            traced_peak = 0
+
+        response["X-Memory-Delta"] = f"rss={rss_delta}; peak_rss={maxrss_delta}; traced_peak={traced_peak}"
+
+        if max(rss_delta, maxrss_delta, traced_peak) >= self.threshold:
+            match = getattr(request, "resolver_match", None)
+            view = match.view_name if match is not None else "<unresolved>"
+            metrics.REGISTRY.inc("sle_memory_heavy_requests_total", view=view)
+            top: List[str] = []
+            if before is not None:
+                after = tracemalloc.take_snapshot()
+                top = format_stats(after.compare_to(before, "lineno"), self.top_n)
+            logger.warning(
+                "Heavy request %s %s (%s): rss %+d KiB, peak rss %+d KiB, traced peak %d KiB%s",
+                request.method,
+                request.path,
+                view,
+                rss_delta // 1024,
+                maxrss_delta // 1024,
+                traced_peak // 1024,
+                "".join("\n  " + line for line in top),
+            )
+        return response
@@ -0,0 +1,415 @@
+"""
+Prometheus-format metrics without external dependencies.
+
+Each process keeps counters, gauges and histograms in memory. When
+settings.METRICS_DIR is set (one directory shared by all gunicorn workers on
+a host), every process also snapshots its values to
+`<METRICS_DIR>/metrics_<pid>_<start>.json` after requests (at most every
+METRICS_FLUSH_INTERVAL seconds), from a timer thread every
+METRICS_FLUSH_INTERVAL seconds (so idle workers report too) and at exit;
+`/metrics` then sums counters and histograms over all files and gauges over
+live processes only. Snapshots of exited workers, and of earlier processes
+that had the same pid, are folded into metrics_tombstone.json, so totals never
+go down and files do not pile up.
+"""
+
+from __future__ import annotations
+
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "sle_http_requests_total": ("counter", "HTTP requests by view, method and status."),
+    "sle_http_request_duration_seconds": ("histogram", "HTTP request latency by view."),
+    "sle_http_requests_in_flight": ("gauge", "Requests currently being processed."),
+    "sle_stage_duration_seconds": ("histogram", "Latency of stages inside requests."),
+    "sle_memory_heavy_requests_total": ("counter", "Requests above MEMORY_LOG_THRESHOLD_KB by view."),
+    "sle_admission_in_use": ("gauge", "Admission slots held, by endpoint."),
+    "sle_admission_queue_depth": ("gauge", "Requests waiting for an admission slot, by endpoint."),
+    "sle_admission_rejected_total": ("counter", "Requests rejected by admission control, by endpoint and reason."),
+    "sle_admission_wait_seconds": ("histogram", "Time spent waiting for an admission slot, by endpoint."),
+    "sle_idempotency_requests_total": ("counter", "Idempotency-Key requests by view and outcome."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Registry:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.gauges: Dict[Tuple[str, Labels], float] = {}
+        # [count per bucket (non-cumulative, last = +Inf), sum, count]
+        self.histograms: Dict[Tuple[str, Labels], list] = {}
+        self._last_flush = 0.0
+        self._owner: Optional[Tuple[int, int]] = None  # (pid, start) of the process owning the file
+        self._timer: Optional[threading.Thread] = None
+        self._stop_timer = threading.Event()
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + amount
+
+    def gauge_add(self, name: str, delta: float, **labels) -> None:
+        key = (name, _labels(labels))
+        with self._lock:
+            self.gauges[key] = self.gauges.get(key, 0.0) + delta
+
+    def gauge_set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, _labels(labels))
+        i = 0
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                break
+        else:
+            i = len(self.buckets)
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    def _file_owner(self) -> Tuple[int, int]:
+        pid = os.getpid()
+        if self._owner is None or self._owner[0] != pid:
+            # New process (or forked child): new file, and the timer thread did not survive a fork.
+            self._owner = (pid, time.time_ns())
+            self._stop_timer = threading.Event()
+            self._timer = threading.Thread(
+                target=self._flush_periodically, args=(self._stop_timer,), name="metrics-flush", daemon=True
+            )
+            self._timer.start()
+        return self._owner
+
+    def _flush_periodically(self, stop: threading.Event) -> None:
+        while not stop.wait(float(getattr(settings, "METRICS_FLUSH_INTERVAL", 1.0))):
+            try:
+                self.flush(force=True)
+            except Exception:
+                pass
+
+    def stop_timer(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop this process' periodic flush thread (later flushes run only on requests).
+        """
+        timer, self._timer = self._timer, None
+        self._stop_timer.set()
+        if timer is not None and timer.is_alive():
+            timer.join(timeout)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "start": self._owner[1] if self._owner and self._owner[0] == os.getpid() else 0,
+                "counters": [[n, list(map(list, l)), v] for (n, l), v in self.counters.items()],
+                "gauges": [[n, list(map(list, l)), v] for (n, l), v in self.gauges.items()],
+                "histograms": [[n, list(map(list, l)), list(h[0]), h[1], h[2]] for (n, l), h in self.histograms.items()],
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    # -- multi-process ------------------------------------------------------
+
+    def flush(self, directory: Optional[str] = None, force: bool = False) -> None:
+        directory = directory or getattr(settings, "METRICS_DIR", None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < float(getattr(settings, "METRICS_FLUSH_INTERVAL", 1.0)):
+            return
+        self._last_flush = now
+        pid, start = self._file_owner()
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        _write_json(path / f"metrics_{pid}_{start}.json", self.snapshot())
+
+
+REGISTRY = Registry()
+
+TOMBSTONE = "metrics_tombstone.json"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _write_json(target: Path, data: dict) -> None:
+    tmp = target.with_name(f".{target.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, target)
+
+
+def _read_snapshots(directory: Path) -> List[Tuple[Path, dict]]:
+    snapshots = []
+    for f in directory.glob("metrics_*.json"):
+        try:
+            snapshots.append((f, json.loads(f.read_text(encoding="utf-8"))))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _live(snapshots: List[Tuple[Path, dict]]) -> set:
+    """
+    Files of running processes: the pid is alive and no newer process had the same pid.
+    """
+    latest: Dict[int, int] = {}
+    for _, snap in snapshots:
+        if "pid" in snap:
+            latest[snap["pid"]] = max(latest.get(snap["pid"], 0), snap.get("start", 0))
+    me, mine = os.getpid(), REGISTRY._owner[1] if REGISTRY._owner and REGISTRY._owner[0] == os.getpid() else 0
+    return {
+        f
+        for f, snap in snapshots
+        if "pid" in snap
+        and snap.get("start", 0) == (mine if snap["pid"] == me else latest[snap["pid"]])
+        and _pid_alive(int(snap["pid"]))
+    }
+
+
+def _merge(snapshots: List[dict], gauges_of=lambda snap: True) -> dict:
+    counters: Dict[Tuple[str, Labels], float] = {}
+    gauges: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], list] = {}
+    for snap in snapshots:
+        for name, labels, value in snap.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0.0) + value
+        if gauges_of(snap):
+            for name, labels, value in snap.get("gauges", []):
+                key = (name, tuple(map(tuple, labels)))
+                gauges[key] = gauges.get(key, 0.0) + value
+        for name, labels, buckets, total, count in snap.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            h = histograms.get(key)
+            if h is None or len(h[0]) != len(buckets):
+                h = histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, c in enumerate(buckets):
+                h[0][i] += c
+            h[1] += total
+            h[2] += count
+    return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+def _compact(directory: Path) -> None:
+    """
+    Fold the files of exited processes into metrics_tombstone.json (counters
+    and histograms only) and delete them. Runs under a flock so concurrent
+    /metrics requests never count a file twice.
+    """
+    snapshots = _read_snapshots(directory)
+    live = _live(snapshots)
+    dead = [f for f, snap in snapshots if f not in live and f.name != TOMBSTONE]
+    if not dead:
+        return
+    fd = os.open(directory / ".metrics.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        tombstone = directory / TOMBSTONE
+        merged = [json.loads(tombstone.read_text(encoding="utf-8"))] if tombstone.exists() else []
+        folded = []
+        for f in dead:
+            try:
+                merged.append(json.loads(f.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue  # already folded by another process
+            folded.append(f)
+        if not folded:
+            return
+        data = _merge(merged, gauges_of=lambda snap: False)
+        _write_json(
+            tombstone,
+            {
+                "counters": [[n, list(map(list, l)), v] for (n, l), v in data["counters"].items()],
+                "histograms": [[n, list(map(list, l)), *h] for (n, l), h in data["histograms"].items()],
+            },
+        )
+        for f in folded:
+            f.unlink(missing_ok=True)
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def collect(directory: Optional[str] = None) -> dict:
+    """
+    Merge this process' live values with every other process' snapshot file.
+    """
+    directory = directory or getattr(settings, "METRICS_DIR", None)
+    snapshots = [REGISTRY.snapshot()]
+    live = {id(snapshots[0])}
+    if directory and Path(directory).is_dir():
+        _compact(Path(directory))
+        files = _read_snapshots(Path(directory))
+        alive = _live(files)
+        me = (os.getpid(), snapshots[0]["start"])
+        for f, snap in files:
+            if (snap.get("pid"), snap.get("start", 0)) == me:
+                continue
+            if f in alive:
+                live.add(id(snap))
+            snapshots.append(snap)
+    return _merge(snapshots, gauges_of=lambda snap: id(snap) in live)
+
+
+def _fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    items = tuple(labels) + extra
+    if not items:
+        return ""
+
+    def esc(v: str) -> str:
+        return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def render(data: Optional[dict] = None) -> str:
+    data = data or collect()
+    lines: List[str] = []
+    names = sorted({n for n, _ in data["counters"]} | {n for n, _ in data["gauges"]} | {n for n, _ in data["histograms"]})
+    for name in names:
+        kind, help_text = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (n, labels), v in sorted(data["counters"].items()):
+            if n == name:
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+        for (n, labels), v in sorted(data["gauges"].items()):
+            if n == name:
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(v)}")
+        for (n, labels), (buckets, total, count) in sorted(data["histograms"].items()):
+            if n != name:
+                continue
+            cumulative = 0
+            bounds = [repr(b) for b in REGISTRY.buckets] + ["+Inf"]
+            for bound, c in zip(bounds, buckets):
+                cumulative += c
+                lines.append(f"{name}_bucket{_fmt_labels(labels, (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(total)}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a stage inside a request (form validation, compute_score, render, ...).
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe("sle_stage_duration_seconds", time.perf_counter() - t0, stage=name)
+
+
+def _view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "<unresolved>"
+
+
+class MetricsMiddleware:
+    """
+    Request counts by view/method/status, latency histograms by view, and an
+    in-flight gauge. Put it first in MIDDLEWARE so it covers everything else.
+    For streaming responses the latency covers time to first byte.
+    Works in both sync and async middleware chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        REGISTRY.gauge_add("sle_http_requests_in_flight", 1)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self._record(request, status, t0)
+
+    async def __acall__(self, request):
+        REGISTRY.gauge_add("sle_http_requests_in_flight", 1)
+        t0 = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            self._record(request, status, t0)
+
+    @staticmethod
+    def _record(request, status, t0) -> None:
+        view = _view_name(request)
+        REGISTRY.observe("sle_http_request_duration_seconds", time.perf_counter() - t0, view=view)
+        REGISTRY.inc("sle_http_requests_total", view=view, method=request.method, status=status)
+        REGISTRY.gauge_add("sle_http_requests_in_flight", -1)
+        REGISTRY.flush()
+
+
+class TimedSessionMiddleware(SessionMiddleware):
+    """
+    SessionMiddleware that records the session save as the `session_write` stage.
+    """
+
+    def process_response(self, request, response):
+        with stage("session_write"):
+            return super().process_response(request, response)
+
+
+@atexit.register
+def flush_at_exit() -> None:
+    try:
+        REGISTRY.gauge_set("sle_http_requests_in_flight", 0)
+        REGISTRY.flush(force=True)
+    except Exception:
+        pass
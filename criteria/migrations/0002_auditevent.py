@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('criteria', '0001_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('source', models.CharField(max_length=32)),
+                ('actor', models.CharField(blank=True, default='', max_length=150)),
+                ('remote_addr', models.CharField(blank=True, default='', max_length=45)),
+                ('ana_positive', models.BooleanField()),
+                ('selections', models.JSONField(default=list)),
+                ('total_score', models.IntegerField()),
+                ('meets_classification', models.BooleanField()),
+                ('risk_tier', models.CharField(max_length=64)),
+                ('ruleset_version', models.CharField(max_length=32)),
+            ],
+            options={
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+import criteria.models
+
+
+def fill_tokens(apps, schema_editor):
+    Job = apps.get_model("criteria", "Job")
+    for job in Job.objects.filter(token__isnull=True).only("pk"):
+        job.token = criteria.models.new_job_token()
+        job.save(update_fields=["token"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('criteria', '0002_auditevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='token',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(fill_tokens, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='job',
+            name='token',
+            field=models.CharField(default=criteria.models.new_job_token, editable=False, max_length=64, unique=True),
+        ),
+    ]
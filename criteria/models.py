@@ -1,3 +1,87 @@
+import secrets
+
 from django.db import models
 
-# Create your models here.
+
+def new_job_token() -> str:
+    return secrets.token_urlsafe(24)
+
+
+class Job(models.Model):
+    """
+    Background job run by `manage.py jobworker` (see criteria/jobs.py).
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    STATUS_CHOICES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+        (CANCELLED, "Cancelled"),
+    )
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+    # Public, unguessable ID used in /api/jobs URLs (the sequential pk stays internal).
+    token = models.CharField(max_length=64, unique=True, default=new_job_token, editable=False)
+    kind = models.CharField(max_length=32)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    payload = models.JSONField(default=dict)
+
+    progress = models.FloatField(default=0.0)
+    progress_note = models.CharField(max_length=200, blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    cancel_requested = models.BooleanField(default=False)
+    error = models.TextField(blank=True, default="")
+
+    result = models.JSONField(null=True, blank=True)
+    artifact = models.BinaryField(null=True, blank=True)
+    artifact_name = models.CharField(max_length=200, blank=True, default="")
+    artifact_type = models.CharField(max_length=100, blank=True, default="")
+
+    worker = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ("id",)
+        indexes = [models.Index(fields=("status", "run_after"), name="criteria_job_status_idx")]
+
+    def __str__(self):
+        return f"Job {self.pk} ({self.kind}, {self.status})"
+
+    @property
+    def finished(self) -> bool:
+        return self.status in self.FINISHED
+
+
+class AuditEvent(models.Model):
+    """
+    One scoring event (who, when, inputs, result), written in batches by criteria/audit.py.
+    """
+
+    created_at = models.DateTimeField(db_index=True)
+    source = models.CharField(max_length=32)
+    actor = models.CharField(max_length=150, blank=True, default="")
+    remote_addr = models.CharField(max_length=45, blank=True, default="")
+
+    ana_positive = models.BooleanField()
+    selections = models.JSONField(default=list)  # selected criterion IDs
+    total_score = models.IntegerField()
+    meets_classification = models.BooleanField()
+    risk_tier = models.CharField(max_length=64)
+    ruleset_version = models.CharField(max_length=32)
+
+    class Meta:
+        ordering = ("id",)
+
+    def __str__(self):
+        return f"AuditEvent {self.pk} ({self.source}, {self.created_at:%Y-%m-%d %H:%M:%S})"
@@ -0,0 +1,58 @@
+"""
+Bounded executors for blocking work called from async views.
+
+Each pool has a fixed number of threads (ASYNC_PDF_WORKERS for WeasyPrint
+renders, ASYNC_IO_WORKERS for file reads and the test-case runner), so a burst
+of slow PDF exports queues on its own pool instead of occupying the event
+loop or the threads other requests need. Pools are created lazily per process
+(after a server forks its workers) and shut down at exit.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, TypeVar
+
+from django.conf import settings
+
+T = TypeVar("T")
+
+POOL_SETTINGS = {
+    "pdf": ("ASYNC_PDF_WORKERS", 2),
+    "io": ("ASYNC_IO_WORKERS", 4),
+}
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def executor(pool: str) -> ThreadPoolExecutor:
+    ex = _pools.get(pool)
+    if ex is None:
+        with _lock:
+            ex = _pools.get(pool)
+            if ex is None:
+                name, default = POOL_SETTINGS[pool]
+                workers = max(1, int(getattr(settings, name, default)))
+                ex = _pools[pool] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"offload-{pool}")
+    return ex
+
+
+async def run(pool: str, func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run func(*args, **kwargs) on the named pool and await its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor(pool), functools.partial(func, *args, **kwargs))
+
+
+@atexit.register
+def shutdown() -> None:
+    with _lock:
+        for ex in _pools.values():
+            ex.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
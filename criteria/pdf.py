@@ -0,0 +1,42 @@
+"""
+PDF export of a stored report (the `last_report` session entry).
+
+Split into HTML rendering, the WeasyPrint render and the download filename so
+the sync view and the async view (async_views.py, which runs the WeasyPrint
+part on a bounded executor) share the same code.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict
+
+from django.template.loader import render_to_string
+
+BASE_URL = str(Path(__file__).resolve().parent)
+
+
+class PdfUnavailable(Exception):
+    pass
+
+
+def load_weasyprint():
+    try:
+        from weasyprint import HTML  # type: ignore
+    except Exception as e:
+        raise PdfUnavailable(f"Thiếu weasyprint để xuất PDF: {type(e).__name__}")
+    return HTML
+
+
+def render_report_html(report: Dict[str, Any]) -> str:
+    return render_to_string("criteria/pdf_result.html", {"report": report})
+
+
+def html_to_pdf(html: str) -> bytes:
+    return load_weasyprint()(string=html, base_url=BASE_URL).write_pdf()
+
+
+def pdf_filename(report: Dict[str, Any]) -> str:
+    code = (report.get("patient_info", {}) or {}).get("patient_code") or "sle"
+    safe = "".join(ch for ch in str(code) if ch.isalnum() or ch in ("-", "_")).strip() or "sle"
+    return f"{safe}-eular-acr-2019.pdf"
@@ -0,0 +1,118 @@
+"""
+Opt-in per-request CPU profiling.
+
+When settings.PROFILING_ENABLED is true, ProfilingMiddleware runs a request
+under cProfile if it carries a valid signed `X-Profile` header (see
+make_token()) or is picked by PROFILING_SAMPLE_RATE. Each profile is written
+to PROFILING_DIR as `<epoch-ms>-<pid>-<view>-<duration>ms.prof`; the oldest
+files beyond PROFILING_MAX_FILES are removed. Summarize captures with
+`manage.py profile_summary`.
+
+cProfile only sees the request thread, so work fanned out to pools (e.g. the
+test-case runner's threads) shows up as time spent waiting on futures.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import os
+import random
+import re
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+_SALT = "criteria.profiling"
+_NAME_RE = re.compile(r"^(?P<ts>\d+)-(?P<pid>\d+)-(?P<view>.+)-(?P<ms>\d+)ms\.prof$")
+
+
+def profile_dir() -> Path:
+    return Path(getattr(settings, "PROFILING_DIR", None) or Path(settings.BASE_DIR) / "profiles")
+
+
+def make_token() -> str:
+    """
+    Value for the `X-Profile` request header; valid for PROFILING_TOKEN_MAX_AGE seconds.
+    """
+    return signing.TimestampSigner(salt=_SALT).sign("profile")
+
+
+def token_valid(value: Optional[str]) -> bool:
+    if not value:
+        return False
+    try:
+        signing.TimestampSigner(salt=_SALT).unsign(
+            value, max_age=int(getattr(settings, "PROFILING_TOKEN_MAX_AGE", 3600))
+        )
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def parse_profile_name(name: str) -> Optional[Tuple[int, int, str, int]]:
+    """
+    (epoch_ms, pid, view, duration_ms) from a capture filename, or None.
+    """
+    m = _NAME_RE.match(name)
+    if not m:
+        return None
+    return int(m["ts"]), int(m["pid"]), m["view"], int(m["ms"])
+
+
+def list_profiles(directory: Optional[Path] = None) -> List[Path]:
+    directory = directory or profile_dir()
+    if not directory.is_dir():
+        return []
+    return sorted(p for p in directory.glob("*.prof") if parse_profile_name(p.name))
+
+
+def _rotate(directory: Path, keep: int) -> None:
+    files = list_profiles(directory)
+    for stale in files[: max(0, len(files) - keep)]:
+        try:
+            stale.unlink()
+        except OSError:
+            pass
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, "PROFILING_SAMPLE_RATE", 0.0))
+        self.max_files = int(getattr(settings, "PROFILING_MAX_FILES", 200))
+
+    def _wanted(self, request) -> bool:
+        if token_valid(request.headers.get("X-Profile")):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self._wanted(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        t0 = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration_ms = int((time.perf_counter() - t0) * 1000)
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None else "unresolved"
+        safe_view = re.sub(r"[^A-Za-z0-9_.]+", ".", view)
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{int(time.time() * 1000)}-{os.getpid()}-{safe_view}-{duration_ms}ms.prof"
+        profiler.dump_stats(str(directory / name))
+        _rotate(directory, self.max_files)
+
+        response["X-Profile-Id"] = name
+        return response
@@ -0,0 +1,141 @@
+"""
+Which additional criteria would reach the classification / high-risk thresholds.
+
+The index is derived once from the ruleset: for every domain and every
+combination of its criteria, the domain's award and the gain of adding each
+unmet criterion (scoring._domain_award, so max-in-domain applies). Because only
+the best criterion of a domain counts, a smallest set never uses two criteria
+of the same domain; reach() therefore only combines one upgrade per domain:
+the needed set size k is read off the domains' best gains, then every k-domain
+combination that can close the gap is expanded. Answers are cached per
+(mask, threshold).
+
+ANA is an entry criterion, so ANA-negative results have nothing to reach.
+"""
+
+from __future__ import annotations
+
+import itertools
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from .scoring import (
+    CLASSIFICATION_THRESHOLD,
+    HIGH_RISK_THRESHOLD,
+    Criterion,
+    ScoreResult,
+    _domain_award,
+    criterion_ids,
+    get_domains,
+)
+
+THRESHOLDS = (CLASSIFICATION_THRESHOLD, HIGH_RISK_THRESHOLD)
+DEFAULT_LIMIT = 5
+
+
+@dataclass(frozen=True)
+class DomainIndex:
+    offset: int
+    width: int
+    awards: Tuple[int, ...]  # local state (bit i = domain.criteria[i]) -> awarded points
+    upgrades: Tuple[Tuple[Tuple[int, Criterion], ...], ...]  # local state -> ((gain, criterion), ...), best first
+
+
+@dataclass(frozen=True)
+class Reach:
+    threshold: int
+    current: int
+    points_needed: int  # 0 when already reached
+    size: Optional[int]  # fewest extra criteria; 0 when reached, None when unreachable
+    sets: Tuple[Tuple[Tuple[int, Criterion], ...], ...]  # up to `limit` smallest sets of (gain, criterion)
+    total_sets: int
+
+    @property
+    def reached(self) -> bool:
+        return self.points_needed == 0
+
+
+@lru_cache(maxsize=1)
+def index() -> Tuple[DomainIndex, ...]:
+    domains = []
+    offset = 0
+    for dom in get_domains():
+        width = len(dom.criteria)
+        awards = tuple(
+            _domain_award(dom, [c for i, c in enumerate(dom.criteria) if local >> i & 1])[0]
+            for local in range(1 << width)
+        )
+        upgrades = tuple(
+            tuple(
+                sorted(
+                    (
+                        (awards[local | 1 << i] - awards[local], c)
+                        for i, c in enumerate(dom.criteria)
+                        if not local >> i & 1 and awards[local | 1 << i] > awards[local]
+                    ),
+                    key=lambda option: -option[0],
+                )
+            )
+            for local in range(1 << width)
+        )
+        domains.append(DomainIndex(offset, width, awards, upgrades))
+        offset += width
+    return tuple(domains)
+
+
+@lru_cache(maxsize=8192)
+def reach(mask: int, threshold: int, limit: int = DEFAULT_LIMIT) -> Reach:
+    """
+    Smallest sets of unmet criteria that bring an ANA-positive `mask` to `threshold`.
+    """
+    current = 0
+    options = []
+    for d in index():
+        local = mask >> d.offset & ((1 << d.width) - 1)
+        current += d.awards[local]
+        if d.upgrades[local]:
+            options.append(d.upgrades[local])
+    needed = threshold - current
+    if needed <= 0:
+        return Reach(threshold, current, 0, 0, (), 0)
+
+    best = sorted((opts[0][0] for opts in options), reverse=True)
+    size, gained = 0, 0
+    for gain in best:
+        if gained >= needed:
+            break
+        size, gained = size + 1, gained + gain
+    if gained < needed:
+        return Reach(threshold, current, needed, None, (), 0)
+
+    found = []
+    for combo in itertools.combinations(options, size):
+        if sum(opts[0][0] for opts in combo) < needed:
+            continue
+        found.extend(choice for choice in itertools.product(*combo) if sum(g for g, _ in choice) >= needed)
+    found.sort(key=lambda choice: -sum(g for g, _ in choice))
+    return Reach(threshold, current, needed, size, tuple(found[:limit]), len(found))
+
+
+def result_mask(result: ScoreResult) -> int:
+    bits = {cid: 1 << i for i, cid in enumerate(criterion_ids())}
+    return sum(bits[c.id] for ds in result.domain_scores for c in ds.selected_criteria)
+
+
+def reach_for_result(result: ScoreResult, limit: int = DEFAULT_LIMIT) -> Tuple[Reach, ...]:
+    if not result.eligible:
+        return ()
+    mask = result_mask(result)
+    return tuple(reach(mask, threshold, limit) for threshold in THRESHOLDS)
+
+
+def reach_payload(r: Reach) -> dict:
+    return {
+        "threshold": r.threshold,
+        "reached": r.reached,
+        "points_needed": r.points_needed,
+        "criteria_needed": r.size,
+        "sets": [{"criteria": [c.id for _, c in choice], "gain": sum(g for g, _ in choice)} for choice in r.sets],
+        "total_sets": r.total_sets,
+    }
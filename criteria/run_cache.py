@@ -0,0 +1,194 @@
+"""
+Memo of test-case RunResults, so reruns only evaluate changed or new cases.
+
+A case's key is the SHA-256 of the case's content together with
+scoring.ruleset_version() and a digest of the code that normalizes and
+compares cases (testcase_runner, legacy_synonyms, keyword_matcher and
+scoring sources). Any edit to the case, the ruleset or that code therefore
+misses the cache; nothing needs to be invalidated by hand. Each ruleset and
+code version gets its own file, so deployments of different versions can
+share one directory; opening the cache deletes sibling files nobody has
+written to for TEST_CASES_CACHE_MAX_AGE days. Only PASS, FAIL and SKIP
+results are stored (an ERROR may be transient).
+
+Evaluating a case takes tens of microseconds, so a hit has to be cheaper
+still: the key hashes the marshal (format 2) encoding of the case (cases come
+from JSON and always marshal), and results are kept as flat marshal tuples in one SQLite
+file (TEST_CASES_CACHE_DIR/runs-v3-<version>.sqlite3, looked up and written in batches,
+safe across threads and worker processes) behind a bounded in-process LRU.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import marshal
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+from .scoring import ruleset_version
+from .testcase_runner import NormalizedExpected, NormalizedTestInput, RunResult
+
+SOURCES = ("scoring.py", "testcase_runner.py", "legacy_synonyms.py", "keyword_matcher.py")
+FILENAME = "runs-v3-{}.sqlite3"
+FILE_PATTERN = "runs-*.sqlite3"
+CACHEABLE = frozenset({"PASS", "FAIL", "SKIP"})
+BATCH = 500
+
+
+@lru_cache(maxsize=1)
+def code_version() -> str:
+    digest = hashlib.sha256()
+    for name in SOURCES:
+        digest.update((Path(__file__).resolve().parent / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _encode(r: RunResult) -> bytes:
+    inp, exp = r.normalized_input, r.expected
+    return marshal.dumps(
+        (
+            r.id,
+            r.description,
+            r.status,
+            r.reason,
+            (inp.ana_positive, inp.selections) if inp else None,
+            (exp.total_score, exp.meets_classification, exp.risk_tier, exp.domain_id, exp.domain_score) if exp else None,
+            r.actual,
+            r.diffs,
+        )
+    )
+
+
+def _decode(data: bytes) -> RunResult:
+    tc_id, description, status, reason, inp, exp, actual, diffs = marshal.loads(data)
+    return RunResult(
+        tc_id,
+        description,
+        status,
+        reason,
+        NormalizedTestInput(*inp) if inp else None,
+        NormalizedExpected(*exp) if exp else None,
+        actual,
+        diffs,
+        True,
+    )
+
+
+class RunCache:
+    def __init__(self, directory: Path, memory_entries: int = 10_000, max_age: float = 7 * 86400):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.memory_entries = memory_entries
+        self._memory: "OrderedDict[str, RunResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = f"{ruleset_version()}:{code_version()}"
+        self._salt = f"{self.version}:".encode("ascii")
+        self.path = directory / FILENAME.format(hashlib.sha256(self._salt).hexdigest()[:16])
+        db = self._connect()
+        db.close()
+        self.path.touch()
+        self._prune(directory, max_age)
+
+    def _prune(self, directory: Path, max_age: float) -> None:
+        # Files of other versions may belong to another deployment sharing the
+        # directory, so only drop the ones that have gone unused for a while.
+        cutoff = time.time() - max_age
+        for path in directory.glob(FILE_PATTERN):
+            try:
+                if path != self.path and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=10)
+        # Cheap when the table exists; recreates it if the file was pruned under a long-lived process.
+        db.execute("CREATE TABLE IF NOT EXISTS runs (key TEXT PRIMARY KEY, result BLOB NOT NULL)")
+        return db
+
+    def key(self, tc: dict) -> str:
+        # Format 2: no back-references, whose flags depend on refcounts and would make the bytes unstable.
+        return hashlib.sha256(self._salt + marshal.dumps(tc, 2)).hexdigest()
+
+    def _remember(self, items: Iterable[Tuple[str, RunResult]]) -> None:
+        with self._lock:
+            for key, r in items:
+                self._memory[key] = r
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, RunResult]:
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            found = {k: self._memory[k] for k in keys if k in self._memory}
+        missing = [k for k in keys if k not in found]
+        if not missing:
+            return found
+        loaded: List[Tuple[str, RunResult]] = []
+        db = self._connect()
+        try:
+            for i in range(0, len(missing), BATCH):
+                chunk = missing[i : i + BATCH]
+                rows = db.execute(f"SELECT key, result FROM runs WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                loaded.extend((key, _decode(result)) for key, result in rows)
+        finally:
+            db.close()
+        self._remember(loaded)
+        found.update(loaded)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, RunResult]]) -> int:
+        items = [(key, r) for key, r in items if r.status in CACHEABLE]
+        rows = [(key, _encode(r)) for key, r in items]
+        if rows:
+            db = self._connect()
+            try:
+                with db:
+                    db.executemany("INSERT OR REPLACE INTO runs (key, result) VALUES (?, ?)", rows)
+            finally:
+                db.close()
+            self._remember(
+                (key, RunResult(r.id, r.description, r.status, r.reason, r.normalized_input, r.expected, r.actual, r.diffs, True))
+                for key, r in items
+            )
+        return len(rows)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        db = self._connect()
+        try:
+            with db:
+                db.execute("DELETE FROM runs")
+        finally:
+            db.close()
+
+
+def cache_dir() -> Path:
+    return Path(getattr(settings, "TEST_CASES_CACHE_DIR", None) or Path(tempfile.gettempdir()) / "sleweb-testcase-cache")
+
+
+def default_cache() -> Optional[RunCache]:
+    """
+    The cache configured in settings, or None when TEST_CASES_CACHE is off.
+    """
+    if not getattr(settings, "TEST_CASES_CACHE", True):
+        return None
+    return _cache_for(
+        str(cache_dir()),
+        int(getattr(settings, "TEST_CASES_CACHE_MEMORY", 10_000)),
+        float(getattr(settings, "TEST_CASES_CACHE_MAX_AGE", 7)) * 86400,
+    )
+
+
+@lru_cache(maxsize=8)
+def _cache_for(directory: str, memory_entries: int, max_age: float) -> RunCache:
+    return RunCache(Path(directory), memory_entries, max_age)
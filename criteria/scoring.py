@@ -1,17 +1,25 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+# Total score from which a patient is classified as SLE (and enters the "SLE Tiêu chuẩn" tier).
+CLASSIFICATION_THRESHOLD = 10
+# Total score from which the high-risk tier applies.
+HIGH_RISK_THRESHOLD = 20
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Criterion:
     id: str
     label: str
     points: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Domain:
     id: str
     label: str
@@ -20,7 +28,7 @@ class Domain:
     note: Optional[str] = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DomainScore:
     domain_id: str
     domain_label: str
@@ -30,7 +38,7 @@ class DomainScore:
     note: Optional[str] = None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ScoreResult:
     ana_positive: bool
     eligible: bool
@@ -42,6 +50,7 @@ class ScoreResult:
     ineligible_reason: Optional[str] = None
 
 
+@lru_cache(maxsize=1)
 def get_domains() -> Tuple[Domain, ...]:
     """
     EULAR/ACR 2019 config as described in main_doc.pdf (Bảng 1) including:
@@ -144,8 +153,39 @@ def get_domains() -> Tuple[Domain, ...]:
     )
 
 
-def _selected_criteria(dom: Domain, selections: Dict[str, bool]) -> List[Criterion]:
-    return [c for c in dom.criteria if bool(selections.get(c.id))]
+@lru_cache(maxsize=1)
+def criterion_ids() -> Tuple[str, ...]:
+    """
+    All criterion IDs in domain order; bit i of a criterion mask is criterion_ids()[i].
+    """
+    return tuple(c.id for d in get_domains() for c in d.criteria)
+
+
+def mask_from_selections(selections: Dict[str, bool]) -> int:
+    return sum(1 << i for i, cid in enumerate(criterion_ids()) if selections.get(cid))
+
+
+def selections_from_mask(mask: int) -> Dict[str, bool]:
+    return {cid: True for i, cid in enumerate(criterion_ids()) if mask >> i & 1}
+
+
+@lru_cache(maxsize=1)
+def ruleset_version() -> str:
+    """
+    Short digest of everything that determines a score payload (domains,
+    criteria, points, notes, thresholds and tier texts). Changes whenever the
+    ruleset does, so it can key HTTP caches and persisted results.
+    """
+    tiers = [_risk_tier(t, e) for t, e in ((0, False), (0, True), (9, True), (10, True), (19, True), (20, True))]
+    data = {
+        "domains": [
+            [d.id, d.label, d.max_in_domain, d.note, [[c.id, c.label, c.points] for c in d.criteria]]
+            for d in get_domains()
+        ],
+        "tiers": tiers,
+        "ineligible": compute_score(ana_positive=False, selections={}).ineligible_reason,
+    }
+    return hashlib.sha256(json.dumps(data, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
 
 
 def _domain_award(dom: Domain, selected: List[Criterion]) -> Tuple[int, Optional[Criterion]]:
@@ -165,12 +205,12 @@ def _risk_tier(total_score: int, eligible: bool) -> Tuple[str, str]:
             "Không đủ điều kiện tính điểm",
             "Chưa thể phân loại vì không đạt tiêu chuẩn đầu vào (ANA).",
         )
-    if total_score < 10:
+    if total_score < CLASSIFICATION_THRESHOLD:
         return (
             "Chưa đủ tiêu chuẩn",
             "Score < 10: theo dõi thêm, chưa phân loại SLE theo EULAR/ACR 2019.",
         )
-    if total_score < 20:
+    if total_score < HIGH_RISK_THRESHOLD:
         return (
             "SLE Tiêu chuẩn",
             "10 ≤ Score < 20: đáp ứng tiêu chuẩn phân loại, cần đánh giá/điều trị theo phác đồ chuẩn.",
@@ -181,46 +221,68 @@ def _risk_tier(total_score: int, eligible: bool) -> Tuple[str, str]:
     )
 
 
-def compute_score(*, ana_positive: bool, selections: Dict[str, bool]) -> ScoreResult:
-    if not ana_positive:
-        tier, note = _risk_tier(0, False)
-        return ScoreResult(
-            ana_positive=False,
-            eligible=False,
-            total_score=0,
-            meets_classification=False,
-            risk_tier=tier,
-            risk_note=note,
-            domain_scores=tuple(),
-            ineligible_reason="ANA âm tính: không đạt tiêu chuẩn đầu vào nên không tính điểm.",
-        )
-
-    domain_scores: List[DomainScore] = []
-    total = 0
+@lru_cache(maxsize=1)
+def _domain_score_table() -> Tuple[Tuple[int, int, Tuple[DomainScore, ...]], ...]:
+    """
+    Per domain: (bit offset, criterion count, the DomainScore of every subset of
+    its criteria indexed by the subset's local bits). Each distinct DomainScore
+    (and its selected_criteria tuple) therefore exists once per process.
+    """
+    table = []
+    offset = 0
     for dom in get_domains():
-        selected = _selected_criteria(dom, selections)
-        awarded_points, awarded_criterion = _domain_award(dom, selected)
-        total += awarded_points
-        domain_scores.append(
-            DomainScore(
-                domain_id=dom.id,
-                domain_label=dom.label,
-                awarded_points=awarded_points,
-                awarded_criterion=awarded_criterion,
-                selected_criteria=tuple(selected),
-                note=dom.note,
+        states = []
+        for local in range(1 << len(dom.criteria)):
+            selected = [c for i, c in enumerate(dom.criteria) if local >> i & 1]
+            awarded_points, awarded_criterion = _domain_award(dom, selected)
+            states.append(
+                DomainScore(
+                    domain_id=dom.id,
+                    domain_label=dom.label,
+                    awarded_points=awarded_points,
+                    awarded_criterion=awarded_criterion,
+                    selected_criteria=tuple(selected),
+                    note=dom.note,
+                )
             )
-        )
+        table.append((offset, len(dom.criteria), tuple(states)))
+        offset += len(dom.criteria)
+    return tuple(table)
 
+
+@lru_cache(maxsize=1)
+def _ineligible_result() -> ScoreResult:
+    tier, note = _risk_tier(0, False)
+    return ScoreResult(
+        ana_positive=False,
+        eligible=False,
+        total_score=0,
+        meets_classification=False,
+        risk_tier=tier,
+        risk_note=note,
+        domain_scores=tuple(),
+        ineligible_reason="ANA âm tính: không đạt tiêu chuẩn đầu vào nên không tính điểm.",
+    )
+
+
+# Results are immutable, so repeated inputs share one ScoreResult (and its domain_scores tuple).
+@lru_cache(maxsize=4096)
+def _eligible_result(mask: int) -> ScoreResult:
+    domain_scores = tuple(states[mask >> offset & ((1 << width) - 1)] for offset, width, states in _domain_score_table())
+    total = sum(ds.awarded_points for ds in domain_scores)
     tier, note = _risk_tier(total, True)
     return ScoreResult(
         ana_positive=True,
         eligible=True,
         total_score=total,
-        meets_classification=total >= 10,
+        meets_classification=total >= CLASSIFICATION_THRESHOLD,
         risk_tier=tier,
         risk_note=note,
-        domain_scores=tuple(domain_scores),
+        domain_scores=domain_scores,
     )
 
 
+def compute_score(*, ana_positive: bool, selections: Dict[str, bool]) -> ScoreResult:
+    if not ana_positive:
+        return _ineligible_result()
+    return _eligible_result(mask_from_selections(selections))
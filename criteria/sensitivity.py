@@ -0,0 +1,298 @@
+"""
+Rule-variant sensitivity sweep over a cohort.
+
+A variant changes criterion weights, the classification threshold (which is
+also where the "SLE Tiêu chuẩn" tier starts) and/or the high-risk cut point:
+
+    {"name": "proteinuria=5", "points": {"proteinuria": 5}, "threshold": 10, "high_risk": 20}
+
+sweep() evaluates every patient under the current ruleset and under each
+variant and reports, per variant, how many classifications flip and the
+baseline-tier -> variant-tier transition counts.
+
+The N x M matrix is never built row by row: patients are first collapsed to
+their distinct (ANA, mask) inputs with counts (criteria/cohort.py does this
+straight from the memory-mapped file), ANA-negative inputs are set aside
+(ineligible under every variant), and each variant is evaluated over the
+distinct inputs with two lookup tables built from per-domain award tables
+(each domain's award depends only on its own bits), using C-level map()
+loops. scoring._domain_award decides every award, so the max-in-domain rule
+is the same as in compute_score.
+"""
+
+from __future__ import annotations
+
+import itertools
+from array import array
+from collections import Counter
+from dataclasses import dataclass, field, replace
+from operator import add
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .cohort import ANA_BIT, Cohort, _bit_remap, check_words, split_bit
+from .scoring import (
+    CLASSIFICATION_THRESHOLD,
+    HIGH_RISK_THRESHOLD,
+    Domain,
+    _domain_award,
+    _risk_tier,
+    criterion_ids,
+    get_domains,
+)
+
+# Tier codes used in transition tables (ANA-negative patients never change tier).
+TIERS = tuple(_risk_tier(score, True)[0] for score in (0, CLASSIFICATION_THRESHOLD, HIGH_RISK_THRESHOLD))
+
+
+class VariantError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Variant:
+    name: str
+    points: Tuple[Tuple[str, int], ...] = ()
+    threshold: int = CLASSIFICATION_THRESHOLD
+    high_risk: int = HIGH_RISK_THRESHOLD
+
+    def domains(self) -> Tuple[Domain, ...]:
+        points = dict(self.points)
+        return tuple(
+            replace(dom, criteria=tuple(replace(c, points=points.get(c.id, c.points)) for c in dom.criteria))
+            for dom in get_domains()
+        )
+
+
+BASELINE = Variant("baseline")
+
+
+def parse_variant(spec: Mapping[str, Any], index: int = 0) -> Variant:
+    if not isinstance(spec, Mapping):
+        raise VariantError(f"variants[{index}] must be an object")
+    points = spec.get("points") or {}
+    if not isinstance(points, Mapping):
+        raise VariantError(f"variants[{index}].points must be an object")
+    known = set(criterion_ids())
+    unknown = sorted(set(points) - known)
+    if unknown:
+        raise VariantError(f"variants[{index}].points: unknown criterion id(s) {', '.join(unknown)}")
+    for key, value in (*points.items(), ("threshold", spec.get("threshold", 0)), ("high_risk", spec.get("high_risk", 0))):
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise VariantError(f"variants[{index}]: {key} must be a non-negative integer")
+    threshold = spec.get("threshold", CLASSIFICATION_THRESHOLD)
+    high_risk = spec.get("high_risk", HIGH_RISK_THRESHOLD)
+    if high_risk < threshold:
+        raise VariantError(f"variants[{index}]: high_risk must be >= threshold")
+    name = spec.get("name") or _default_name(points, threshold, high_risk)
+    return Variant(str(name), tuple(sorted(points.items())), threshold, high_risk)
+
+
+def _default_name(points: Mapping[str, int], threshold: int, high_risk: int) -> str:
+    parts = [f"{cid}={p}" for cid, p in sorted(points.items())]
+    if threshold != CLASSIFICATION_THRESHOLD:
+        parts.append(f"threshold={threshold}")
+    if high_risk != HIGH_RISK_THRESHOLD:
+        parts.append(f"high_risk={high_risk}")
+    return ",".join(parts) or "baseline"
+
+
+def grid_variants(axes: Sequence[str]) -> List[Variant]:
+    """
+    Cartesian product of axes like "proteinuria=3..6", "threshold=9..11" or
+    "seizure=4,6" (criterion IDs, threshold, high_risk).
+    """
+    names, values = [], []
+    for axis in axes:
+        key, sep, spec = axis.partition("=")
+        if not sep:
+            raise VariantError(f"grid axis {axis!r} must look like name=lo..hi or name=a,b")
+        try:
+            if ".." in spec:
+                lo, hi = spec.split("..", 1)
+                options = list(range(int(lo), int(hi) + 1))
+            else:
+                options = [int(v) for v in spec.split(",")]
+        except ValueError:
+            raise VariantError(f"grid axis {axis!r}: values must be integers")
+        names.append(key.strip())
+        values.append(options)
+
+    variants = []
+    for combo in itertools.product(*values):
+        spec: Dict[str, Any] = {"points": {}}
+        for key, value in zip(names, combo):
+            if key in ("threshold", "high_risk"):
+                spec[key] = value
+            else:
+                spec["points"][key] = value
+        variants.append(parse_variant(spec, len(variants)))
+    return variants
+
+
+# -- evaluation -------------------------------------------------------------
+
+
+def _domain_table(dom: Domain) -> List[int]:
+    """
+    Award of the domain for every combination of its criteria (bit i = dom.criteria[i]).
+    """
+    return [
+        _domain_award(dom, [c for i, c in enumerate(dom.criteria) if local >> i & 1])[0]
+        for local in range(1 << len(dom.criteria))
+    ]
+
+
+def _half_tables(domains: Tuple[Domain, ...], split: int) -> Tuple[List[int], List[int]]:
+    low, high = [0], [0]
+    bit = 0
+    for dom in domains:
+        table = _domain_table(dom)
+        # Prepending this domain's bits above the ones already combined.
+        if bit < split:
+            low = [award + rest for award in table for rest in low]
+        else:
+            high = [award + rest for award in table for rest in high]
+        bit += len(dom.criteria)
+    return low, high
+
+
+@dataclass
+class VariantReport:
+    name: str
+    variant: Dict[str, Any]
+    classified: int
+    gained: int  # unclassified under the current ruleset, classified under the variant
+    lost: int
+    tier_changes: int
+    transitions: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    @property
+    def flips(self) -> int:
+        return self.gained + self.lost
+
+
+@dataclass
+class SweepReport:
+    patients: int
+    distinct_inputs: int
+    ineligible: int
+    baseline_classified: int
+    baseline_tiers: Dict[str, int]
+    variants: List[VariantReport]
+
+    def to_dict(self) -> dict:
+        data = dict(self.__dict__)
+        data["variants"] = [dict(v.__dict__, flips=v.flips) for v in self.variants]
+        return data
+
+
+class _Inputs:
+    """
+    ANA-positive distinct inputs split into low/high table indexes, with counts.
+    """
+
+    def __init__(self, counts: Mapping[int, int], remap=None, n_ids: Optional[int] = None):
+        check_words(counts, len(criterion_ids()) if n_ids is None else n_ids)
+        self.split = split_bit()
+        low_mask = (1 << self.split) - 1
+        merged: Counter = Counter()
+        self.ineligible = 0
+        for word, n in counts.items():
+            if not word & ANA_BIT:
+                self.ineligible += n
+                continue
+            mask = word & ~ANA_BIT
+            if remap is not None:
+                mask = sum(new for old, new in remap if mask & old)
+            merged[mask] += n
+        self.distinct = len(merged)
+        self.low = array("I", (m & low_mask for m in merged))
+        self.high = array("I", (m >> self.split for m in merged))
+        self.counts = list(merged.values())
+
+    def totals(self, variant: Variant) -> Iterable[int]:
+        low, high = _half_tables(variant.domains(), self.split)
+        return map(add, map(low.__getitem__, self.low), map(high.__getitem__, self.high))
+
+
+def _outcome_table(variant: Variant, max_total: int) -> List[int]:
+    """
+    total score -> tier code * 2 + classified.
+    """
+    return [
+        (0 if t < variant.threshold else 1 if t < variant.high_risk else 2) * 2 + (t >= variant.threshold)
+        for t in range(max_total + 1)
+    ]
+
+
+def _max_total(variant: Variant) -> int:
+    return sum(max(c.points for c in dom.criteria) for dom in variant.domains())
+
+
+def sweep(counts: Mapping[int, int], variants: Sequence[Variant], ids: Optional[Tuple[str, ...]] = None) -> SweepReport:
+    """
+    counts: cohort word (ANA bit 31 + criterion mask) -> number of patients,
+    with masks in the bit order `ids` (default: the current criterion order).
+    """
+    inputs = _Inputs(counts, _bit_remap(ids) if ids is not None else None, len(ids) if ids is not None else None)
+    base_outcomes = _outcome_table(BASELINE, _max_total(BASELINE))
+    # 6 outcomes (tier x classified) per side -> key = base * 6 + variant.
+    base_keys = [base_outcomes[t] * 6 for t in inputs.totals(BASELINE)]
+
+    baseline_tiers = Counter()
+    baseline_classified = 0
+    for key, n in zip(base_keys, inputs.counts):
+        baseline_tiers[TIERS[key // 12]] += n
+        baseline_classified += n if key // 6 % 2 else 0
+
+    reports = []
+    for variant in variants:
+        outcomes = _outcome_table(variant, _max_total(variant))
+        acc = [0] * 36
+        for key, n in zip(map(add, base_keys, map(outcomes.__getitem__, inputs.totals(variant))), inputs.counts):
+            acc[key] += n
+        report = VariantReport(
+            name=variant.name,
+            variant={"points": dict(variant.points), "threshold": variant.threshold, "high_risk": variant.high_risk},
+            classified=0,
+            gained=0,
+            lost=0,
+            tier_changes=0,
+        )
+        for key, n in enumerate(acc):
+            if not n:
+                continue
+            base, new = divmod(key, 6)
+            base_tier, base_cls = divmod(base, 2)
+            new_tier, new_cls = divmod(new, 2)
+            report.classified += n if new_cls else 0
+            report.gained += n if new_cls and not base_cls else 0
+            report.lost += n if base_cls and not new_cls else 0
+            if base_tier != new_tier:
+                report.tier_changes += n
+                row = report.transitions.setdefault(TIERS[base_tier], {})
+                row[TIERS[new_tier]] = row.get(TIERS[new_tier], 0) + n
+        reports.append(report)
+
+    return SweepReport(
+        patients=inputs.ineligible + sum(inputs.counts),
+        distinct_inputs=inputs.distinct,
+        ineligible=inputs.ineligible,
+        baseline_classified=baseline_classified,
+        baseline_tiers={tier: baseline_tiers.get(tier, 0) for tier in TIERS},
+        variants=reports,
+    )
+
+
+def sweep_cohort(path, variants: Sequence[Variant]) -> SweepReport:
+    """
+    Sweep a packed cohort file (criteria/cohort.py).
+    """
+    with Cohort(path) as cohort:
+        words = cohort.words()
+        try:
+            counts = Counter(words)
+        finally:
+            words.release()
+        ids = cohort.header.ids
+    return sweep(counts, variants, ids)
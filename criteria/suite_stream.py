@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import json
+import shutil
+import tempfile
+from typing import IO, Any, Iterator, Optional
+
+from .testcase_runner import SCHEMA_V2, normalize_case_v2
+
+_WS = " \t\n\r"
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+_SPOOL_MAX = 1 << 20
+
+
+class JsonStream:
+    """
+    Minimal pull parser over a text stream.
+
+    Containers are walked with iter_object()/iter_array(); leaf values (and
+    whole sub-documents such as one test case) are decoded with value(). Only
+    the current chunk plus the value being decoded is kept in memory.
+    """
+
+    def __init__(self, fp: IO[str], chunk_size: int = 1 << 16):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        data = self._fp.read(self._chunk_size)
+        if not data:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + data
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WS:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, ch: str) -> None:
+        got = self.peek()
+        if got != ch:
+            raise ValueError(f"Expected {ch!r} but found {got or 'EOF'!r} in JSON stream")
+        self._pos += 1
+
+    def value(self) -> Any:
+        if not self.peek():
+            raise ValueError("Unexpected end of JSON stream")
+        while True:
+            try:
+                val, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A value ending at the buffer edge may continue in the next chunk. For
+            # a number the decoder also stops early at a dangling "." or "e"
+            # ("1.|5e3"), so check that only number characters follow it.
+            if self._at_edge(end, val) and self._fill():
+                continue
+            self._pos = end
+            return val
+
+    def _at_edge(self, end: int, val: Any) -> bool:
+        if isinstance(val, (int, float)) and not isinstance(val, bool):
+            while end < len(self._buf) and self._buf[end] in _NUMBER_CHARS:
+                end += 1
+        return end == len(self._buf)
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Yield each key; the caller must consume the value before resuming.
+        """
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError("Object key must be a string")
+            self._expect(":")
+            yield key
+            nxt = self.peek()
+            self._pos += 1
+            if nxt == "}":
+                return
+            if nxt != ",":
+                raise ValueError(f"Expected ',' or '}}' but found {nxt or 'EOF'!r} in JSON stream")
+
+    def iter_array(self) -> Iterator[None]:
+        """
+        Yield once per element; the caller must consume it before resuming.
+        """
+        self._expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+        while True:
+            yield None
+            nxt = self.peek()
+            self._pos += 1
+            if nxt == "]":
+                return
+            if nxt != ",":
+                raise ValueError(f"Expected ',' or ']' but found {nxt or 'EOF'!r} in JSON stream")
+
+
+def _dump(value: Any, indent: int) -> str:
+    # Same formatting as JsonResponse(..., json_dumps_params={"ensure_ascii": False, "indent": 2})
+    # for a value nested `indent` spaces deep. JSON strings never contain raw newlines.
+    return json.dumps(value, ensure_ascii=False, indent=2).replace("\n", "\n" + " " * indent)
+
+
+def _write_cases(stream: JsonStream, out: IO[str]) -> None:
+    out.write("[")
+    n = 0
+    for _ in stream.iter_array():
+        tc = stream.value()
+        out.write(",\n" if n else "\n")
+        out.write(" " * 8 + _dump(normalize_case_v2(tc), 8))
+        n += 1
+    out.write("\n      ]" if n else "]")
+
+
+def _write_group(stream: JsonStream, out: IO[str]) -> None:
+    if stream.peek() != "{":
+        raise ValueError("Each test_cases entry must be an object")
+
+    category: Any = None
+    have_category = False
+    have_cases = False
+    written = False
+    spool: Optional[IO[str]] = None
+    head = " " * 6 + '"cases": '
+
+    for key in stream.iter_object():
+        if key == "cases" and not have_cases:
+            have_cases = True
+            if stream.peek() != "[":
+                stream.value()
+                continue
+            if have_category:
+                out.write("{\n" + " " * 6 + '"category": ' + _dump(category, 6) + ",\n" + head)
+                _write_cases(stream, out)
+                written = True
+            else:
+                # "category" may still follow; park the cases until the group ends.
+                spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX, mode="w+", encoding="utf-8")
+                _write_cases(stream, spool)
+        elif key == "category":
+            category = stream.value()
+            have_category = True
+        else:
+            stream.value()
+
+    if written:
+        out.write("\n    }")
+        return
+
+    out.write("{\n" + " " * 6 + '"category": ' + _dump(category, 6) + ",\n" + head)
+    if spool is not None:
+        spool.seek(0)
+        shutil.copyfileobj(spool, out)
+        spool.close()
+    else:
+        out.write("[]")
+    out.write("\n    }")
+
+
+def _write_groups(stream: JsonStream, out: IO[str]) -> None:
+    out.write("[")
+    n = 0
+    for _ in stream.iter_array():
+        out.write(",\n" if n else "\n")
+        out.write(" " * 4)
+        _write_group(stream, out)
+        n += 1
+    out.write("\n  ]" if n else "]")
+
+
+def write_normalized_suite(src: IO[str], out: IO[str], chunk_size: int = 1 << 16) -> None:
+    """
+    Stream a legacy (or v2) suite from `src` to schema-v2 JSON on `out`, case by
+    case. The output is byte-identical to the /test-cases/normalized.json
+    endpoint (normalize_suite() + JsonResponse with indent=2), but memory stays
+    bounded by the largest single case rather than the whole suite.
+    """
+    stream = JsonStream(src, chunk_size=chunk_size)
+    if stream.peek() != "{":
+        raise ValueError("Test suite must be a JSON object")
+
+    meta = {"test_suite": None, "version": None}
+    seen = set()
+    body: Optional[IO[str]] = None
+    direct = False
+
+    def header() -> str:
+        return (
+            "{\n"
+            + '  "schema_version": '
+            + _dump(SCHEMA_V2, 2)
+            + ",\n"
+            + '  "test_suite": '
+            + _dump(meta["test_suite"], 2)
+            + ",\n"
+            + '  "version": '
+            + _dump(meta["version"], 2)
+            + ",\n"
+            + '  "test_cases": '
+        )
+
+    for key in stream.iter_object():
+        if key in meta:
+            meta[key] = stream.value()
+            seen.add(key)
+        elif key == "test_cases" and body is None and not direct:
+            if stream.peek() != "[":
+                stream.value()
+                continue
+            if seen == set(meta):
+                out.write(header())
+                _write_groups(stream, out)
+                direct = True
+            else:
+                # Metadata may still follow; park the converted cases until the end.
+                body = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX, mode="w+", encoding="utf-8")
+                _write_groups(stream, body)
+        else:
+            stream.value()
+
+    if not direct:
+        out.write(header())
+        if body is not None:
+            body.seek(0)
+            shutil.copyfileobj(body, out)
+            body.close()
+        else:
+            out.write("[]")
+    out.write("\n}")
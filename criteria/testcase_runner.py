@@ -1,12 +1,19 @@
 from __future__ import annotations
 
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 
+from .keyword_matcher import KeywordMatcher
+from .legacy_synonyms import LEGACY_SYNONYMS, LOW_C3, LOW_C4
 from .scoring import ScoreResult, compute_score, get_domains
 
 
+SCHEMA_V2 = "internal_ids_v2"
+
+
 @dataclass(frozen=True)
 class NormalizedTestInput:
     ana_positive: bool
@@ -32,95 +39,48 @@ class RunResult:
     expected: Optional[NormalizedExpected]
     actual: Optional[Dict[str, Any]]
     diffs: List[str]
+    cached: bool = False  # served from run_cache.RunCache instead of being re-evaluated
 
 
 def _norm(s: str) -> str:
     return re.sub(r"\s+", " ", s).strip().lower()
 
 
+_LEGACY_MATCHER = KeywordMatcher(LEGACY_SYNONYMS)
+_CRITERION_ORDER = {c.id: i for i, c in enumerate(c for d in get_domains() for c in d.criteria)}
+
+
+@lru_cache(maxsize=4096)
+def _match_legacy(token: str) -> FrozenSet[str]:
+    # Legacy notes repeat the same phrases constantly; cache per distinct string.
+    return frozenset(_LEGACY_MATCHER.find(token))
+
+
 def _map_selected_criteria_to_ids(selected: List[str]) -> Tuple[Dict[str, bool], List[str]]:
     """
     Map legacy human strings in docs/test_cases.json to internal criterion IDs.
     Returns (selections, warnings).
+
+    Each string is scanned once against the compiled synonym table
+    (legacy_synonyms.LEGACY_SYNONYMS); combination rules are applied after.
     """
     warnings: List[str] = []
-    tokens = [_norm(x) for x in selected]
-
-    selections: Dict[str, bool] = {}
-
-    def add(cid: str):
-        selections[cid] = True
-
-    # Renal
-    for t in tokens:
-        if "proteinuria" in t:
-            add("proteinuria")
-        if "class iii" in t or "class iv" in t:
-            add("renal_biopsy_class_iii_or_iv")
-        if "class ii" in t or "class v" in t:
-            add("renal_biopsy_class_ii_or_v")
-
-    # Serosal
-    for t in tokens:
-        if "acute pericarditis" in t:
-            add("acute_pericarditis")
-        if "effusion" in t:
-            add("pleural_or_pericardial_effusion")
-
-    # Constitutional
-    for t in tokens:
-        if "fever" in t or "sốt" in t:
-            add("fever")
-
-    # Hematologic
-    for t in tokens:
-        if "leukopenia" in t:
-            add("leukopenia")
-        if "thrombocytopenia" in t:
-            add("thrombocytopenia")
-        if "hemolysis" in t:
-            add("autoimmune_hemolysis")
-
-    # Neuropsychiatric
-    for t in tokens:
-        if "delirium" in t:
-            add("delirium")
-        if "psychosis" in t:
-            add("psychosis")
-        if "seizure" in t:
-            add("seizure")
-
-    # Musculoskeletal
-    for t in tokens:
-        if "arthritis" in t or "joint" in t:
-            add("joint_involvement")
-
-    # Mucocutaneous
-    for t in tokens:
-        if "acute cutaneous" in t:
-            add("acute_cutaneous")
-        if "discoid" in t or "subacute cutaneous" in t:
-            add("subacute_cutaneous_or_discoid")
-        if "oral ulcer" in t or "mouth ulcer" in t:
-            add("oral_ulcers")
-        if "alopecia" in t:
-            add("nonscarring_alopecia")
+
+    found = set()
+    for x in selected:
+        found |= _match_legacy(_norm(x))
 
     # Complement (legacy file expresses Low C3 and Low C4 separately)
-    low_c3 = any("low c3" in t for t in tokens)
-    low_c4 = any("low c4" in t for t in tokens)
+    low_c3 = LOW_C3 in found
+    low_c4 = LOW_C4 in found
+    found -= {LOW_C3, LOW_C4}
     if low_c3 and low_c4:
-        add("low_c3_and_c4")
+        found.add("low_c3_and_c4")
     elif low_c3 or low_c4:
-        add("low_c3_or_c4")
+        found.add("low_c3_or_c4")
 
-    # Antiphospholipid (any positive => 2 points)
-    if any("anti-cardiolipin" in t for t in tokens) or any("lupus anticoagulant" in t for t in tokens) or any("β2" in t or "b2gp1" in t for t in tokens):
-        add("antiphospholipid_any")
-
-    # SLE-specific antibodies
-    if any("anti-dsdna" in t for t in tokens) or any("anti-sm" in t for t in tokens) or any("anti sm" in t for t in tokens):
-        add("anti_dsdna_or_anti_sm")
+    ordered = sorted(found, key=lambda cid: _CRITERION_ORDER[cid])
+    selections: Dict[str, bool] = {cid: True for cid in ordered}
 
     if not selections and selected:
         warnings.append("Không map được selected_criteria -> criterion IDs (cần chuẩn hóa JSON).")
@@ -327,6 +287,135 @@ def run_case(tc: Dict[str, Any]) -> RunResult:
         )
 
 
+def run_result_to_dict(r: RunResult) -> Dict[str, Any]:
+    return {
+        "id": r.id,
+        "description": r.description,
+        "status": r.status,
+        "reason": r.reason,
+        "normalized_input": (
+            {
+                "ana_positive": r.normalized_input.ana_positive,
+                "selections": r.normalized_input.selections,
+            }
+            if r.normalized_input
+            else None
+        ),
+        "expected": (
+            {
+                "total_score": r.expected.total_score,
+                "meets_classification": r.expected.meets_classification,
+                "risk_tier": r.expected.risk_tier,
+                "domain_id": r.expected.domain_id,
+                "domain_score": r.expected.domain_score,
+            }
+            if r.expected
+            else None
+        ),
+        "actual": r.actual,
+        "diffs": r.diffs,
+    }
+
+
+def _lookup(cases: List[Dict[str, Any]], cache) -> Tuple[List[Optional[RunResult]], List[Optional[str]]]:
+    """
+    (cached result or None, cache key) per case.
+    """
+    if cache is None:
+        return [None] * len(cases), [None] * len(cases)
+    keys = [cache.key(tc) for tc in cases]
+    hits = cache.get_many(keys)
+    return [hits.get(k) for k in keys], keys
+
+
+def iter_run_cases(cases: Iterable[Dict[str, Any]], max_workers: int = 4, cache=None) -> Iterator[RunResult]:
+    """
+    Run independent cases concurrently and yield each RunResult as soon as it
+    completes (completion order, not input order).
+
+    With a run_cache.RunCache, unchanged cases are answered from the cache
+    first (RunResult.cached) and only the others are evaluated and stored.
+    """
+    cases = list(cases)
+    found, keys = _lookup(cases, cache)
+    yield from (r for r in found if r is not None)
+    pending = [(k, tc) for k, tc, r in zip(keys, cases, found) if r is None]
+    fresh: List[Tuple[str, RunResult]] = []
+    try:
+        if max_workers <= 1 or len(pending) <= 1:
+            for key, tc in pending:
+                r = run_case(tc)
+                fresh.append((key, r))
+                yield r
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+                futures = {pool.submit(run_case, tc): key for key, tc in pending}
+                for fut in as_completed(futures):
+                    r = fut.result()
+                    fresh.append((futures[fut], r))
+                    yield r
+    finally:
+        if cache is not None and fresh:
+            cache.put_many(fresh)
+
+
+def run_cases(cases: Iterable[Dict[str, Any]], max_workers: int = 4, cache=None) -> List[RunResult]:
+    """
+    Same as iter_run_cases(), but returns results in input order.
+    """
+    cases = list(cases)
+    results, keys = _lookup(cases, cache)
+    pending = [i for i, r in enumerate(results) if r is None]
+    if max_workers <= 1 or len(pending) <= 1:
+        fresh = [run_case(cases[i]) for i in pending]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            fresh = list(pool.map(run_case, [cases[i] for i in pending]))
+    for i, r in zip(pending, fresh):
+        results[i] = r
+    if cache is not None and fresh:
+        cache.put_many([(keys[i], r) for i, r in zip(pending, fresh)])
+    return results
+
+
+def normalize_case_v2(tc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert one test case (legacy or v2) into its schema-v2 dict.
+    """
+    n_inp, n_exp, warnings, kind = normalize_case(tc)
+    new_tc: Dict[str, Any] = {
+        "id": tc.get("id"),
+        "description": tc.get("description"),
+        "kind": kind,
+    }
+    if "medical_rationale" in tc:
+        new_tc["medical_rationale"] = tc.get("medical_rationale")
+    if "technical_logic" in tc:
+        new_tc["technical_logic"] = tc.get("technical_logic")
+    if "action" in tc:
+        new_tc["action"] = tc.get("action")
+    if warnings:
+        new_tc["warnings"] = warnings
+    if n_inp is not None:
+        new_tc["input"] = {
+            "ana_positive": n_inp.ana_positive,
+            "selections": sorted([k for k, v in n_inp.selections.items() if v]),
+        }
+    if n_exp is not None:
+        new_tc["expected"] = {
+            k: v
+            for k, v in {
+                "total_score": n_exp.total_score,
+                "meets_classification": n_exp.meets_classification,
+                "risk_tier": n_exp.risk_tier,
+                "domain_id": n_exp.domain_id,
+                "domain_score": n_exp.domain_score,
+            }.items()
+            if v is not None
+        }
+    return new_tc
+
+
 def normalize_suite(data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Produce a schema-v2 JSON that is easy to run/load:
@@ -334,9 +423,11 @@ def normalize_suite(data: Dict[str, Any]) -> Dict[str, Any]:
       - input.selections (list of criterion_ids)
       - expected: total_score/meets_classification/risk_tier/domain_id/domain_score
       - kind: auto/manual
+
+    For suites too large to load at once, see suite_stream.write_normalized_suite().
     """
     out: Dict[str, Any] = {
-        "schema_version": "internal_ids_v2",
+        "schema_version": SCHEMA_V2,
         "test_suite": data.get("test_suite"),
         "version": data.get("version"),
         "test_cases": [],
@@ -345,40 +436,7 @@ def normalize_suite(data: Dict[str, Any]) -> Dict[str, Any]:
     for group in data.get("test_cases", []) if isinstance(data.get("test_cases"), list) else []:
         new_group = {"category": group.get("category"), "cases": []}
         for tc in group.get("cases", []) if isinstance(group.get("cases"), list) else []:
-            n_inp, n_exp, warnings, kind = normalize_case(tc)
-            new_tc: Dict[str, Any] = {
-                "id": tc.get("id"),
-                "description": tc.get("description"),
-                "kind": kind,
-            }
-            if "medical_rationale" in tc:
-                new_tc["medical_rationale"] = tc.get("medical_rationale")
-            if "technical_logic" in tc:
-                new_tc["technical_logic"] = tc.get("technical_logic")
-            if "action" in tc:
-                new_tc["action"] = tc.get("action")
-            if warnings:
-                new_tc["warnings"] = warnings
-            if n_inp is not None:
-                new_tc["input"] = {
-                    "ana_positive": n_inp.ana_positive,
-                    "selections": sorted([k for k, v in n_inp.selections.items() if v]),
-                }
-            if n_exp is not None:
-                new_tc["expected"] = {
-                    k: v
-                    for k, v in {
-                        "total_score": n_exp.total_score,
-                        "meets_classification": n_exp.meets_classification,
-                        "risk_tier": n_exp.risk_tier,
-                        "domain_id": n_exp.domain_id,
-                        "domain_score": n_exp.domain_score,
-                    }.items()
-                    if v is not None
-                }
-            new_group["cases"].append(new_tc)
+            new_group["cases"].append(normalize_case_v2(tc))
         out["test_cases"].append(new_group)
 
     return out
-
-
@@ -1,6 +1,48 @@
-from django.test import Client, TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from dataclasses import replace
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-from .scoring import compute_score
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.http import JsonResponse
+from django.test import AsyncClient, Client, LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from . import admission, async_views, audit, bench, cbor, cohort, differential, idempotency, jobs, metrics, offload, profiling, reachability, run_cache, sensitivity, warmup
+from .fastpath import ScoreFastPath
+from .idempotency import idempotent
+from .importtime import parse_importtime
+from .keyword_matcher import KeywordMatcher
+from .loadtest import LoadTest, _Connection, load_scenario
+from .models import AuditEvent, Job
+from .scoring import compute_score, criterion_ids, mask_from_selections, ruleset_version, selections_from_mask
+from .suite_stream import write_normalized_suite
+from .testcase_runner import _map_selected_criteria_to_ids, normalize_suite, run_cases
+
+
+def setUpModule():
+    # Views record audit events; keep the write-behind thread away from the
+    # test database (AuditTests flush their own buffers). Test-case runs would
+    # also fill the shared run cache (RunCacheTests use their own directory).
+    global _module_settings
+    _module_settings = override_settings(AUDIT_ENABLED=False, TEST_CASES_CACHE=False)
+    _module_settings.enable()
+
+
+def tearDownModule():
+    _module_settings.disable()
 
 
 class ScoringTests(TestCase):
@@ -118,6 +160,1088 @@ class ScoringTests(TestCase):
         self.assertGreaterEqual(r.total_score, 20)
         self.assertEqual(r.risk_tier, "SLE Nguy cơ cao / Ominous")
 
+    def test_results_are_slotted_and_domain_scores_interned(self):
+        a = compute_score(ana_positive=True, selections={"fever": True, "seizure": True})
+        b = compute_score(ana_positive=True, selections={"fever": True, "proteinuria": True})
+        self.assertFalse(hasattr(a, "__dict__"))
+        self.assertFalse(hasattr(a.domain_scores[0], "__dict__"))
+        self.assertIs(a.domain_scores[0], b.domain_scores[0])  # same constitutional state
+        self.assertIs(a, compute_score(ana_positive=True, selections={"seizure": 1, "fever": "on", "unknown": True}))
+        self.assertEqual(a.domain_scores[2].awarded_criterion.id, "seizure")
+        self.assertEqual(replace(a, total_score=0).total_score, 0)
+
+
+def _scorer_summing_hematologic(*, ana_positive, selections):
+    # Deliberately broken: sums the hematologic domain instead of taking the max.
+    r = compute_score(ana_positive=ana_positive, selections=selections)
+    extra = 3 if selections.get("leukopenia") and selections.get("thrombocytopenia") else 0
+    return replace(r, total_score=r.total_score + extra)
+
+
+class DifferentialTests(TestCase):
+    def test_reference_matches_ruleset(self):
+        self.assertEqual(differential.ruleset_drift(), [])
+
+    def test_sampled_sweep_agrees(self):
+        report = differential.run(samples=3000, seed=7, batch_size=500)
+        self.assertEqual(report.checked, 3000)
+        self.assertTrue(report.ok, [d.diffs for d in report.disagreements])
+
+    def test_disagreement_is_minimized(self):
+        mask = (1 << differential.N_BITS) - 1
+        self.assertTrue(differential.compare(True, mask, _scorer_summing_hematologic))
+        small = differential.minimize(True, mask, _scorer_summing_hematologic)
+        self.assertEqual(differential.describe_mask(small), ["leukopenia", "thrombocytopenia"])
+
+        report = differential.run(samples=2000, seed=1, max_failures=3, scorer=_scorer_summing_hematologic)
+        self.assertFalse(report.ok)
+        self.assertLessEqual(len(report.disagreements), 3)
+
+
+class BenchTests(TestCase):
+    def test_bench_command_saves_results_and_compares_baseline(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = Path(d) / "bench.json"
+            call_command("bench", "compute_score", "result_to_dict", "--iterations", "20", "-o", str(out), stdout=io.StringIO())
+            report = json.loads(out.read_text(encoding="utf-8"))
+            self.assertEqual(set(report["results"]), {"compute_score", "result_to_dict"})
+            r = report["results"]["compute_score"]
+            self.assertGreater(r["ops_per_sec"], 0)
+            self.assertLessEqual(r["p50_us"], r["p99_us"])
+
+            # A baseline 100x faster than reality must be flagged as a regression.
+            report["results"]["compute_score"]["ops_per_sec"] *= 100
+            out.write_text(json.dumps(report), encoding="utf-8")
+            with self.assertRaises(CommandError):
+                call_command("bench", "compute_score", "--iterations", "20", "--baseline", str(out), stdout=io.StringIO())
+
+    def test_bench_command_records_no_audit_events(self):
+        buffer = audit.AuditBuffer(background=False)
+        default, audit.BUFFER = audit.BUFFER, buffer
+        self.addCleanup(setattr, audit, "BUFFER", default)
+        with tempfile.TemporaryDirectory() as d, override_settings(AUDIT_ENABLED=True, AUDIT_SPOOL_DIR=d):
+            call_command("bench", "view_index_post", "view_api_score", "--iterations", "5", "--warmup", "1", stdout=io.StringIO())
+            self.assertEqual(list(Path(d).iterdir()), [])
+        self.assertEqual(buffer.pending, 0)
+
+    def test_view_test_cases_run_bypasses_the_run_cache(self):
+        with tempfile.TemporaryDirectory() as d, override_settings(TEST_CASES_CACHE=True, TEST_CASES_CACHE_DIR=d):
+            report = bench.run(["view_test_cases_run"], iterations=3, max_time=5.0, warmup=1)
+            self.assertEqual(list(report["results"]), ["view_test_cases_run"])
+            self.assertEqual(list(Path(d).iterdir()), [])
+
+
+class LoadTestTests(LiveServerTestCase):
+    def test_clinic_mix_against_live_server(self):
+        scenario = load_scenario("clinic_mix")
+        report = LoadTest(self.live_server_url, scenario, concurrency=2, duration=None, max_flows=12, seed=3).run()
+        self.assertEqual(report["flows_completed"], 12)
+        self.assertGreater(report["requests"], 0)
+        for name, e in report["endpoints"].items():
+            if name != "export_pdf":  # 500 when WeasyPrint is not installed
+                self.assertEqual(e["errors"], 0, (name, e["statuses"]))
+            self.assertLessEqual(e["p50_ms"], e["p99_ms"])
+
+    def test_open_model_respects_flow_limit(self):
+        scenario = load_scenario("api_only")
+        report = LoadTest(self.live_server_url, scenario, concurrency=2, rate=200, duration=None, max_flows=10).run()
+        self.assertEqual(report["model"], "open")
+        self.assertEqual(report["endpoints"]["api_score"]["requests"], 10)
+        self.assertEqual(report["errors"], 0)
+
+    def test_open_model_counts_queueing_from_scheduled_arrival(self):
+        async def slow_request(conn, method, path, body=b"", headers=None):
+            await asyncio.sleep(0.05)
+            return 200, b"{}"
+
+        scenario = load_scenario("api_only")
+        with mock.patch.object(_Connection, "request", slow_request):
+            report = LoadTest("http://127.0.0.1:9", scenario, concurrency=1, rate=1000, duration=None, max_flows=5).run()
+        # Five flows arrive almost at once and one virtual user serves them: the last waits for four others.
+        self.assertGreaterEqual(report["endpoints"]["api_score"]["max_ms"], 200)
+
+    def test_connection_reads_bodyless_responses(self):
+        async def requests():
+            conn = _Connection(self.server_thread.host, self.server_thread.port, timeout=2.0)
+            try:
+                status, body = await conn.request("GET", "/api/score/1/1")
+                head = await conn.request("HEAD", "/api/score/1/1")
+                not_modified = await conn.request("GET", "/api/score/1/1", headers={"If-None-Match": f'"{ruleset_version()}-1-1"'})
+            finally:
+                await conn.close()
+            return (status, bool(body)), head, not_modified
+
+        self.assertEqual(asyncio.run(requests()), ((200, True), (200, b""), (304, b"")))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.REGISTRY.reset()
+
+    def test_metrics_endpoint_reports_requests_and_stages(self):
+        c = Client()
+        c.post("/api/score", data={"ana_positive": True, "selections": {}}, content_type="application/json")
+        c.post("/", {"ana_positive": "true", "fever": "on"})
+        body = c.get("/metrics").content.decode("utf-8")
+        self.assertIn('sle_http_requests_total{method="POST",status="200",view="criteria:api_score"} 1', body)
+        self.assertIn('sle_http_request_duration_seconds_count{view="criteria:index"} 1', body)
+        for stage in ("form_validation", "compute_score", "template_render", "session_write"):
+            self.assertIn(f'sle_stage_duration_seconds_count{{stage="{stage}"}}', body)
+        self.assertIn("sle_http_requests_in_flight 1", body)  # the /metrics request itself
+
+    def test_collect_aggregates_worker_files(self):
+        with tempfile.TemporaryDirectory() as d:
+            other = metrics.Registry()
+            other.inc("sle_http_requests_total", view="criteria:index", method="GET", status=200)
+            other.observe("sle_stage_duration_seconds", 0.002, stage="compute_score")
+            other.gauge_add("sle_http_requests_in_flight", 3)
+            snap = other.snapshot()
+            snap["pid"] = 2**22 + 12345  # not a live process: its gauges are dropped
+            (Path(d) / "metrics_dead.json").write_text(json.dumps(snap), encoding="utf-8")
+
+            metrics.REGISTRY.inc("sle_http_requests_total", view="criteria:index", method="GET", status=200)
+            metrics.REGISTRY.observe("sle_stage_duration_seconds", 0.2, stage="compute_score")
+            data = metrics.collect(d)
+
+        key = ("sle_http_requests_total", (("method", "GET"), ("status", "200"), ("view", "criteria:index")))
+        self.assertEqual(data["counters"][key], 2)
+        buckets, total, count = data["histograms"][("sle_stage_duration_seconds", (("stage", "compute_score"),))]
+        self.assertEqual(count, 2)
+        self.assertAlmostEqual(total, 0.202)
+        self.assertNotIn(("sle_http_requests_in_flight", ()), data["gauges"])
+
+    def test_exited_and_reused_pid_files_fold_into_tombstone(self):
+        def write(d, name, pid, start, requests, in_flight):
+            r = metrics.Registry()
+            r.inc("sle_http_requests_total", requests, view="v", method="GET", status=200)
+            r.gauge_add("sle_http_requests_in_flight", in_flight)
+            (Path(d) / name).write_text(json.dumps(dict(r.snapshot(), pid=pid, start=start)), encoding="utf-8")
+
+        key = ("sle_http_requests_total", (("method", "GET"), ("status", "200"), ("view", "v")))
+        with tempfile.TemporaryDirectory() as d:
+            parent = os.getppid()
+            write(d, "metrics_dead_1.json", 2**22 + 12345, 1, 5, 1)
+            write(d, f"metrics_{parent}_1.json", parent, 1, 7, 2)  # earlier process with the same pid
+            write(d, f"metrics_{parent}_2.json", parent, 2, 1, 3)
+            first = metrics.collect(d)
+            self.assertEqual(sorted(f.name for f in Path(d).glob("metrics_*.json")), [f"metrics_{parent}_2.json", metrics.TOMBSTONE])
+            second = metrics.collect(d)
+        for data in (first, second):
+            self.assertEqual(data["counters"][key], 13)
+            self.assertEqual(data["gauges"][("sle_http_requests_in_flight", ())], 3)
+
+    def test_idle_worker_is_flushed_by_timer(self):
+        with tempfile.TemporaryDirectory() as d, override_settings(METRICS_DIR=d, METRICS_FLUSH_INTERVAL=0.05):
+            r = metrics.Registry()
+            r.flush()
+            self.addCleanup(r.stop_timer, 5.0)
+            r.inc("sle_http_requests_total", view="v", method="GET", status=200)
+            time.sleep(0.3)
+            (f,) = Path(d).glob("metrics_*.json")
+            self.assertEqual(json.loads(f.read_text(encoding="utf-8"))["counters"][0][2], 1)
+
+
+class ProfilingTests(TestCase):
+    def test_signed_header_captures_profile_and_summary_reads_it(self):
+        with tempfile.TemporaryDirectory() as d, override_settings(
+            PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_DIR=d, PROFILING_MAX_FILES=2
+        ):
+            c = Client()
+            resp = c.post("/api/score", data={"ana_positive": True}, content_type="application/json")
+            self.assertNotIn("X-Profile-Id", resp)
+
+            resp = c.get("/api/score", headers={"X-Profile": "forged"})
+            self.assertNotIn("X-Profile-Id", resp)
+
+            token = profiling.make_token()
+            for _ in range(3):
+                resp = c.post(
+                    "/api/score",
+                    data={"ana_positive": True},
+                    content_type="application/json",
+                    headers={"X-Profile": token},
+                )
+            self.assertIn("criteria.api_score", resp["X-Profile-Id"])
+            self.assertEqual(len(profiling.list_profiles(Path(d))), 2)  # rotated
+
+            out = io.StringIO()
+            call_command("profile_summary", "--dir", d, "--limit", "200", stdout=out)
+            self.assertIn("criteria.api_score", out.getvalue())
+            self.assertIn("(compute_score)", out.getvalue())
+
+
+class MemoryAccountingTests(TestCase):
+    def test_disabled_by_default(self):
+        resp = Client().get("/api/score")
+        self.assertNotIn("X-Memory-Delta", resp)
+        self.assertEqual(Client().post("/debug/memory/snapshot").status_code, 404)
+
+    def test_heavy_request_is_logged_and_snapshots_diff(self):
+        with tempfile.TemporaryDirectory() as d, override_settings(
+            MEMORY_PROFILING_ENABLED=True,
+            MEMORY_TRACEMALLOC=True,
+            MEMORY_LOG_THRESHOLD_KB=0,
+            MEMORY_SNAPSHOT_SAMPLE_RATE=1.0,
+            MEMORY_SNAPSHOT_DIR=d,
+            DEBUG=True,
+        ):
+            try:
+                c = Client()
+                with self.assertLogs("criteria.memory", level="WARNING") as logs:
+                    resp = c.post("/api/score", data={"ana_positive": True}, content_type="application/json")
+                self.assertIn("traced_peak=", resp["X-Memory-Delta"])
+                self.assertIn("criteria:api_score", logs.output[0])
+                self.assertIn("KiB (", logs.output[0])
+
+                with self.assertLogs("criteria.memory", level="WARNING"):
+                    first = c.post("/debug/memory/snapshot").json()["snapshot"]
+                with self.assertLogs("criteria.memory", level="WARNING"):
+                    second = c.post("/debug/memory/snapshot").json()["snapshot"]
+                self.assertNotEqual(first, second)
+                out = io.StringIO()
+                call_command("memory_snapshot", "diff", "--dir", d, stdout=out)
+                self.assertIn("KiB", out.getvalue())
+            finally:
+                tracemalloc.stop()
+
+    def test_unsampled_requests_take_no_snapshots(self):
+        with override_settings(
+            MEMORY_PROFILING_ENABLED=True,
+            MEMORY_TRACEMALLOC=True,
+            MEMORY_LOG_THRESHOLD_KB=0,
+            MEMORY_SNAPSHOT_SAMPLE_RATE=0.0,
+        ):
+            try:
+                with mock.patch("tracemalloc.take_snapshot") as take, self.assertLogs("criteria.memory", level="WARNING") as logs:
+                    resp = Client().post("/api/score", data={"ana_positive": True}, content_type="application/json")
+                self.assertEqual(resp.status_code, 200)
+                take.assert_not_called()
+                self.assertNotIn("KiB (", logs.output[0])
+            finally:
+                tracemalloc.stop()
+
+
+class FastPathTests(TestCase):
+    def _call(self, app, body, method="POST", path="/api/score", query="", accept=None):
+        captured = {}
+
+        def start_response(status, headers):
+            captured["status"] = status
+            captured["headers"] = list(headers)
+
+        environ = {
+            "REQUEST_METHOD": method,
+            "PATH_INFO": path,
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "HTTP_HOST": "testserver",
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.url_scheme": "http",
+            "wsgi.errors": io.StringIO(),
+            "QUERY_STRING": query,
+        }
+        if accept is not None:
+            environ["HTTP_ACCEPT"] = accept
+        content = b"".join(app(environ, start_response))
+        return captured["status"], captured["headers"], content
+
+    def test_responses_identical_to_django(self):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        django_app = WSGIHandler()
+        fast = ScoreFastPath(django_app)
+        self.assertTrue(fast.enabled)
+        bodies = [
+            json.dumps({"ana_positive": True, "selections": {"fever": True, "proteinuria": True, "bogus": True}}),
+            json.dumps({"ana_positive": False, "selections": {"fever": True}}),
+            json.dumps({"ana_positive": True, "selections": ["fever"]}),
+            json.dumps([1, 2]),
+            "{not json",
+            "",
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(self._call(fast, body.encode()), self._call(django_app, body.encode()))
+        variants = [
+            {"query": "fields=total_score,risk_tier"},
+            {"query": "fields=nope"},
+            {"accept": "application/cbor"},
+            {"accept": "text/html, application/cbor;q=0.5", "query": "fields=domains"},
+        ]
+        for kwargs in variants:
+            with self.subTest(**kwargs):
+                body = bodies[0].encode()
+                self.assertEqual(self._call(fast, body, **kwargs), self._call(django_app, body, **kwargs))
+
+    def test_other_requests_delegate(self):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        fast = ScoreFastPath(WSGIHandler())
+        status, _, _ = self._call(fast, b"", method="GET")
+        self.assertTrue(status.startswith("405"))
+        status, _, _ = self._call(fast, b"", method="GET", path="/about/")
+        self.assertTrue(status.startswith("200"))
+
+    def test_disabled_by_setting(self):
+        with override_settings(API_FAST_PATH=False):
+            self.assertFalse(ScoreFastPath(lambda environ, start_response: []).enabled)
+        with override_settings(SECURE_SSL_REDIRECT=True):
+            self.assertFalse(ScoreFastPath(lambda environ, start_response: []).enabled)
+
+
+class AsyncViewsTests(TestCase):
+    async def test_api_score_matches_sync_view(self):
+        body = json.dumps({"ana_positive": True, "selections": {"fever": True, "proteinuria": True}})
+        resp = await AsyncClient().post("/api/score", data=body, content_type="application/json")
+        self.assertIs(resp.resolver_match.func, async_views.api_score)
+        sync = Client().post("/api/score", data=body, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), sync.json())
+
+    async def test_test_cases_run(self):
+        resp = await AsyncClient().post("/test-cases/run", data={"mode": "all"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        sync = Client().post("/test-cases/run", data={"mode": "all"}, content_type="application/json")
+        self.assertEqual(resp.json(), sync.json())
+
+        resp = await AsyncClient().post(
+            "/test-cases/run", data={"mode": "all", "stream": True}, content_type="application/json"
+        )
+        body = b"".join([chunk async for chunk in resp.streaming_content]).decode("utf-8")
+        self.assertEqual(body.count("event: result"), sync.json()["summary"]["TOTAL"])
+        self.assertIn("event: summary", body)
+
+    async def test_export_pdf_without_report(self):
+        resp = await AsyncClient().get("/export/pdf")
+        self.assertIs(resp.resolver_match.func, async_views.export_pdf)
+        self.assertEqual(resp.status_code, 400)
+
+    async def test_export_pdf_loads_weasyprint_off_the_event_loop(self):
+        from .pdf import PdfUnavailable
+
+        threads = []
+
+        def unavailable():
+            threads.append(threading.current_thread().name)
+            raise PdfUnavailable("WeasyPrint missing")
+
+        c = AsyncClient()
+        await c.post("/", {"ana_positive": "true", "fever": "on"})
+        with mock.patch.object(async_views, "load_weasyprint", unavailable):
+            resp = await c.get("/export/pdf")
+        self.assertEqual(resp.status_code, 500)
+        self.assertTrue(threads[0].startswith("offload-pdf"), threads)
+
+    async def test_offload_runs_on_named_pool(self):
+        import threading
+
+        name = await offload.run("pdf", lambda: threading.current_thread().name)
+        self.assertTrue(name.startswith("offload-pdf"))
+
+
+class ScoreGetTests(TestCase):
+    def test_matches_post_payload(self):
+        selections = {"fever": True, "proteinuria": True, "anti_dsdna_or_anti_sm": True}
+        post = self.client.post(
+            "/api/score", data=json.dumps({"ana_positive": True, "selections": selections}), content_type="application/json"
+        )
+        resp = self.client.get(f"/api/score/1/{mask_from_selections(selections):x}")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), post.json())
+        self.assertTrue(resp["ETag"].startswith(f'"{ruleset_version()}-'))
+        self.assertIn("public", resp["Cache-Control"])
+        self.assertIn(f"max-age={settings.API_SCORE_CACHE_MAX_AGE}", resp["Cache-Control"])
+        self.assertIn("must-revalidate", resp["Cache-Control"])
+
+    def test_conditional_get(self):
+        resp = self.client.get("/api/score/1/41")
+        again = self.client.get("/api/score/1/41", HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], resp["ETag"])
+        self.assertIn("max-age=", again["Cache-Control"])
+
+    def test_canonical_redirects_and_errors(self):
+        self.assertRedirects(self.client.get("/api/score/1/0041"), "/api/score/1/41", status_code=301)
+        self.assertRedirects(self.client.get("/api/score/0/ff"), "/api/score/0/0", status_code=301)
+        self.assertEqual(self.client.get("/api/score/2/1").status_code, 400)
+        for mask in ("1_0", "+41", "f" * 10_000):
+            self.assertEqual(self.client.get(f"/api/score/1/{mask}").status_code, 400)
+        self.assertEqual(self.client.get("/api/score/1/zz").status_code, 400)
+        self.assertEqual(self.client.get(f"/api/score/1/{1 << 21:x}").status_code, 400)
+
+
+class WarmupTests(TestCase):
+    def test_readyz_reports_after_warm_up(self):
+        report = warmup.warm_up()
+        self.assertEqual(report["errors"], {})
+        self.assertEqual(set(report["steps"]), {name for name, _ in warmup.STEPS})
+        resp = self.client.get("/readyz")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.json()["ready"])
+        self.assertIn("no-store", resp["Cache-Control"])
+
+    def test_readyz_not_ready(self):
+        was_ready = warmup.is_ready()
+        warmup._done.clear()
+        thread, warmup._thread = warmup._thread, object()  # pretend a warm-up is in progress
+        try:
+            resp = self.client.get("/readyz")
+            self.assertEqual(resp.status_code, 503)
+            self.assertEqual(resp["Retry-After"], "1")
+        finally:
+            warmup._thread = thread
+            if was_ready:
+                warmup._done.set()
+
+
+class ApiProfileTests(TestCase):
+    def _responses(self):
+        c = Client()
+        body = {"ana_positive": True, "selections": ["fever", "seizure"]}
+        out = [
+            c.post("/api/score", data=body, content_type="application/json"),
+            c.post("/api/score?fields=total_score", data=body, content_type="application/json", HTTP_ACCEPT="application/cbor"),
+            c.post("/api/score", data="{bad", content_type="application/json"),
+            c.get("/api/score/1/41"),
+            c.get("/api/score/1/0041"),
+            c.get("/api/score/1/41", HTTP_IF_NONE_MATCH=c.get("/api/score/1/41")["ETag"]),
+        ]
+        return [(r.status_code, r.content, sorted((k, v) for k, v in r.items() if k != "Set-Cookie")) for r in out]
+
+    def test_scoring_endpoints_identical_under_api_profile(self):
+        from sleweb import settings_api
+
+        full = self._responses()
+        with override_settings(
+            ROOT_URLCONF=settings_api.ROOT_URLCONF, MIDDLEWARE=settings_api.MIDDLEWARE, TEMPLATES=settings_api.TEMPLATES
+        ):
+            api = self._responses()
+            self.assertEqual(self.client.get("/").status_code, 404)
+        self.assertEqual(api, full)
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     encodings.aliases\n"
+            "import time:       300 |        420 |   encodings\n"
+            "import time:        50 |        470 | django\n"
+        )
+        records = parse_importtime(stderr)
+        self.assertEqual([(r.name, r.depth, r.self_us, r.cumulative_us) for r in records], [
+            ("encodings.aliases", 2, 120, 120),
+            ("encodings", 1, 300, 420),
+            ("django", 0, 50, 470),
+        ])
+
+    def test_importtime_command(self):
+        out = io.StringIO()
+        call_command("importtime", "sleweb.wsgi_api", "--runs", "1", "--top", "3", stdout=out)
+        self.assertIn("sleweb.settings_api", out.getvalue())
+        self.assertIn("-X importtime total", out.getvalue())
+
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_limiter_slots_queue_and_timeout(self):
+        limiter = admission.Limiter("criteria:x", slots=1, queue=1, timeout=0.1, directory=Path(self.tmp.name))
+        fd = limiter.acquire()
+        with self.assertRaises(admission.Rejected) as ctx:
+            limiter.acquire()
+        self.assertEqual(ctx.exception.reason, "timeout")
+
+        # Another worker holding the only queue place: reject without waiting.
+        queue_fd = admission._try_lock(Path(self.tmp.name) / "criteria__x.queue0")
+        with self.assertRaises(admission.Rejected) as ctx:
+            limiter.acquire()
+        self.assertEqual(ctx.exception.reason, "queue_full")
+        admission._unlock(queue_fd)
+
+        limiter.release(fd)
+        limiter.release(limiter.acquire())
+
+    def test_middleware_rejects_and_releases_streaming_slot(self):
+        limits = {"criteria:test_cases_run": {"slots": 1, "queue": 0, "timeout": 0.1, "retry_after": 7}}
+        with override_settings(ADMISSION_LIMITS=limits, ADMISSION_DIR=self.tmp.name):
+            c = Client()
+            limiter = admission.Limiter("criteria:test_cases_run", slots=1, directory=Path(self.tmp.name))
+            fd = limiter.acquire()
+            resp = c.post("/test-cases/run", data={"mode": "all"}, content_type="application/json")
+            self.assertEqual(resp.status_code, 503)
+            self.assertEqual(resp["Retry-After"], "7")
+            self.assertEqual(c.post("/api/score", data={"mask": 1}, content_type="application/json").status_code, 200)
+            limiter.release(fd)
+
+            resp = c.post("/test-cases/run", data={"mode": "all", "stream": True}, content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+            b"".join(resp.streaming_content)
+            resp = c.post("/test-cases/run", data={"mode": "all"}, content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+
+    def test_sync_requests_do_not_queue_by_default(self):
+        limits = {"criteria:test_cases_run": {"slots": 1, "queue": 2, "timeout": 5.0}}
+        limiter = admission.Limiter("criteria:test_cases_run", slots=1, directory=Path(self.tmp.name))
+        fd = limiter.acquire()
+        self.addCleanup(limiter.release, fd)
+        with override_settings(ADMISSION_LIMITS=limits, ADMISSION_DIR=self.tmp.name):
+            t0 = time.monotonic()
+            resp = Client().post("/test-cases/run", data={"mode": "all"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 503)
+        self.assertLess(time.monotonic() - t0, 1.0)
+
+
+class JobTests(TestCase):
+    def test_submit_run_status_and_result(self):
+        c = Client()
+        items = [{"id": "p1", "ana_positive": True, "mask": 1}, {"id": "p2", "selections": ["nope"]}]
+        resp = c.post("/api/jobs", data={"kind": "rescore", "payload": {"items": items}}, content_type="application/json")
+        self.assertEqual(resp.status_code, 202)
+        status_url = resp["Location"]
+        self.assertEqual(c.get(status_url).json()["status"], "queued")
+        self.assertEqual(c.get(f"{status_url}/result").status_code, 409)
+
+        self.assertEqual(jobs.work(once=True), 1)
+        data = c.get(status_url).json()
+        self.assertEqual((data["status"], data["progress"], data["attempts"]), ("succeeded", 100.0, 1))
+        result = c.get(data["result_url"]).json()["result"]
+        self.assertEqual((result["count"], result["errors"]), (2, 1))
+        self.assertEqual(result["results"][0]["score"]["total_score"], 2)
+        self.assertIn("unknown criterion id", result["results"][1]["error"])
+
+        self.assertEqual(c.post("/api/jobs", data={"kind": "nope"}, content_type="application/json").status_code, 400)
+
+    def test_jobs_are_addressed_by_unguessable_token(self):
+        c = Client()
+        resp = c.post("/api/jobs", data={"kind": "rescore", "payload": {"items": []}, "max_attempts": 1000}, content_type="application/json")
+        job = Job.objects.get()
+        self.assertEqual(resp.json()["id"], job.token)
+        self.assertGreaterEqual(len(job.token), 32)
+        self.assertEqual(job.max_attempts, settings.JOBS_MAX_ATTEMPTS_LIMIT)
+        for path in (f"/api/jobs/{job.pk}", f"/api/jobs/{job.pk}/result"):
+            self.assertEqual(c.get(path).status_code, 404)
+        self.assertEqual(c.post(f"/api/jobs/{job.pk}/cancel").status_code, 404)
+        self.assertEqual(Job.objects.get().status, Job.QUEUED)
+
+    def test_cancel_queued_and_running(self):
+        job = jobs.submit("rescore", {"items": []})
+        self.assertEqual(jobs.cancel(job).status, Job.CANCELLED)
+        self.assertIsNone(jobs.claim("w"))
+
+        job = jobs.submit("rescore", {"items": [{"mask": 1}] * 3})
+        claimed = jobs.claim("w")
+        self.assertEqual(claimed.pk, job.pk)
+        resp = Client().post(f"/api/jobs/{job.token}/cancel")
+        self.assertTrue(resp.json()["cancel_requested"])
+        self.assertEqual(jobs.run_job(claimed), Job.CANCELLED)
+
+    def test_retry_with_backoff_then_fail(self):
+        calls = []
+
+        @jobs.job_kind("flaky")
+        def flaky(ctx, payload):
+            calls.append(1)
+            raise RuntimeError("boom")
+
+        self.addCleanup(jobs.HANDLERS.pop, "flaky")
+        job = jobs.submit("flaky", {}, max_attempts=2)
+        with override_settings(JOBS_RETRY_BACKOFF=0):
+            self.assertEqual(jobs.run_job(jobs.claim("w")), Job.QUEUED)
+            self.assertEqual(jobs.run_job(jobs.claim("w")), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, len(calls)), (Job.FAILED, 2, 2))
+        self.assertIn("RuntimeError: boom", job.error)
+
+    def test_stale_running_job_is_requeued(self):
+        job = jobs.submit("rescore", {"items": []})
+        jobs.claim("dead-worker")
+        with override_settings(JOBS_STALE_AFTER=0):
+            self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+    def test_stale_job_without_attempts_left_fails(self):
+        job = jobs.submit("rescore", {"items": []}, max_attempts=1)
+        jobs.claim("dead-worker")
+        with override_settings(JOBS_STALE_AFTER=0), self.assertLogs("criteria.jobs", level="WARNING"):
+            self.assertEqual(jobs.requeue_stale(), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_finished_jobs_are_pruned_after_retention(self):
+        old, recent, queued = (jobs.submit("rescore", {"items": []}) for _ in range(3))
+        now = timezone.now()
+        Job.objects.filter(pk=old.pk).update(status=Job.SUCCEEDED, artifact=b"zip", finished_at=now - timedelta(days=8))
+        Job.objects.filter(pk=recent.pk).update(status=Job.FAILED, finished_at=now - timedelta(days=1))
+        with override_settings(JOBS_RETENTION=7 * 86400):
+            self.assertEqual(jobs.prune_finished(now), 1)
+        with override_settings(JOBS_RETENTION=0):
+            self.assertEqual(jobs.prune_finished(now + timedelta(days=30)), 0)
+        self.assertEqual(set(Job.objects.values_list("pk", flat=True)), {recent.pk, queued.pk})
+
+
+class CohortTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def test_pack_csv_and_score_in_place(self):
+        src = self.dir / "cohort.csv"
+        src.write_text(
+            "id,ana_positive,fever,renal_biopsy_class_iii_or_iv,mask\n"
+            "P1,1,x,,\n"
+            "P2,yes,,1,0x2\n"
+            "P3,0,x,x,\n",
+            encoding="utf-8",
+        )
+        packed = self.dir / "cohort.sleco"
+        scores = self.dir / "cohort.scores"
+        call_command("cohort", "pack", str(src), str(packed), stdout=io.StringIO())
+
+        with cohort.Cohort(packed) as c:
+            self.assertEqual(c.header.ruleset_version, ruleset_version())
+            rows = list(c)
+        self.assertEqual(rows[1], ("P2", True, mask_from_selections({"leukopenia": True, "renal_biopsy_class_iii_or_iv": True})))
+
+        summary = cohort.score_cohort(packed, scores_out=scores)
+        self.assertEqual((summary.records, summary.eligible, summary.classified), (3, 2, 1))
+        self.assertEqual(list(scores.read_bytes()), [2, 13, 0])
+        self.assertEqual(summary.score_histogram, {2: 1, 13: 1})
+
+    def test_matches_compute_score_and_remaps_old_bit_order(self):
+        import random
+
+        rng = random.Random(7)
+        ids = criterion_ids()
+        old_order = tuple(reversed(ids))
+        records = [(f"K{i}", rng.random() < 0.8, rng.getrandbits(len(ids))) for i in range(300)]
+        packed = self.dir / "old.sleco"
+        with cohort.CohortWriter(packed, ids=old_order) as w:
+            for key, ana, old_mask in records:
+                w.add(key, ana, old_mask)
+
+        scores = self.dir / "old.scores"
+        summary = cohort.score_cohort(packed, scores_out=scores)
+        classified = 0
+        for (key, ana, old_mask), score in zip(records, scores.read_bytes()):
+            selections = {cid: True for i, cid in enumerate(old_order) if old_mask >> i & 1}
+            result = compute_score(ana_positive=ana, selections=selections)
+            self.assertEqual(score, result.total_score, key)
+            classified += result.meets_classification
+        self.assertEqual(summary.classified, classified)
+
+    def test_rejects_bad_input(self):
+        with self.assertRaises(cohort.CohortError):
+            cohort.write_records(self.dir / "x.sleco", [("a-very-long-patient-key", True, 0)], key_width=8)
+        (self.dir / "bad.sleco").write_bytes(b"not a cohort file at all....")
+        with self.assertRaises(CommandError):
+            call_command("cohort", "score", str(self.dir / "bad.sleco"), stdout=io.StringIO())
+
+    def test_rejects_words_with_bits_beyond_the_file_criteria(self):
+        packed = self.dir / "stray.sleco"
+        with cohort.CohortWriter(packed, ids=criterion_ids()[:5]) as w:
+            w.add("P1", True, 1)
+            w.add("P2", False, 0)
+        data = bytearray(packed.read_bytes())
+        header = cohort.read_header(bytes(data))
+        offset = header.data_offset + header.key_width
+        word = int.from_bytes(data[offset : offset + 4], "little") | 1 << 10
+        data[offset : offset + 4] = word.to_bytes(4, "little")
+        packed.write_bytes(bytes(data))
+        with self.assertRaisesMessage(cohort.CohortError, "outside the 5 criteria"):
+            cohort.score_cohort(packed)
+        with self.assertRaisesMessage(cohort.CohortError, "outside the 5 criteria"):
+            sensitivity.sweep_cohort(packed, [sensitivity.BASELINE])
+
+
+class SensitivityTests(TestCase):
+    def test_sweep_counts_flips_and_transitions(self):
+        proteinuria = mask_from_selections({"proteinuria": True})
+        leuko_proteinuria = mask_from_selections({"leukopenia": True, "proteinuria": True})
+        counts = {
+            cohort.ANA_BIT | proteinuria | mask_from_selections({"leukopenia": True, "fever": True}): 5,  # 9
+            cohort.ANA_BIT | leuko_proteinuria: 2,  # 7
+            cohort.ANA_BIT | mask_from_selections({"renal_biopsy_class_iii_or_iv": True, "seizure": True, "fever": True}): 1,  # 17
+            proteinuria: 4,  # ANA-
+        }
+        variants = sensitivity.grid_variants(["proteinuria=4..6"]) + [
+            sensitivity.parse_variant({"name": "strict", "threshold": 11, "high_risk": 17})
+        ]
+        report = sensitivity.sweep(counts, variants)
+        self.assertEqual((report.patients, report.ineligible, report.baseline_classified), (12, 4, 1))
+
+        same, plus_one, plus_two, strict = report.variants
+        self.assertEqual((same.flips, same.tier_changes), (0, 0))
+        self.assertEqual((plus_one.gained, plus_one.lost, plus_one.classified), (5, 0, 6))
+        self.assertEqual(plus_one.transitions, {sensitivity.TIERS[0]: {sensitivity.TIERS[1]: 5}})
+        self.assertEqual((plus_two.gained, plus_two.classified), (5, 6))
+        self.assertEqual((strict.gained, strict.lost, strict.tier_changes), (0, 0, 1))
+        self.assertEqual(strict.transitions, {sensitivity.TIERS[1]: {sensitivity.TIERS[2]: 1}})
+
+    def test_baseline_matches_compute_score_and_rejects_bad_variants(self):
+        import random
+
+        rng = random.Random(11)
+        counts = {cohort.ANA_BIT | rng.getrandbits(len(criterion_ids())): 1 for _ in range(400)}
+        report = sensitivity.sweep(counts, [sensitivity.BASELINE])
+        expected = sum(
+            compute_score(ana_positive=True, selections=selections_from_mask(word & ~cohort.ANA_BIT)).meets_classification
+            for word in counts
+        )
+        self.assertEqual(report.baseline_classified, expected)
+        self.assertEqual(report.variants[0].flips, 0)
+
+        for spec in ({"points": {"nope": 1}}, {"threshold": -1}, {"threshold": 12, "high_risk": 11}):
+            with self.assertRaises(sensitivity.VariantError):
+                sensitivity.parse_variant(spec)
+
+
+class ReachabilityTests(TestCase):
+    def test_smallest_sets_follow_max_in_domain(self):
+        # 3 (leukopenia) + 4 (proteinuria) = 7; one criterion worth >= 3 more closes the gap,
+        # but upgrading within a scored domain only counts the difference.
+        mask = mask_from_selections({"leukopenia": True, "proteinuria": True})
+        r = reachability.reach(mask, 10, limit=100)
+        self.assertEqual((r.current, r.points_needed, r.size), (7, 3, 1))
+        options = {choice[0][1].id: choice[0][0] for choice in r.sets}
+        self.assertEqual(options["renal_biopsy_class_iii_or_iv"], 6)
+        self.assertEqual(options["renal_biopsy_class_ii_or_v"], 4)
+        self.assertNotIn("thrombocytopenia", options)  # 4 - 3 = +1 only
+        self.assertNotIn("fever", options)
+        self.assertEqual(r.total_sets, len(r.sets))
+
+        self.assertTrue(reachability.reach(mask_from_selections({"renal_biopsy_class_iii_or_iv": True}), 10).reached)
+        everything = mask_from_selections({cid: True for cid in criterion_ids()})
+        self.assertEqual(reachability.reach(everything, 60).size, None)
+
+    def test_exposed_in_result_page_and_api_field(self):
+        c = Client()
+        resp = c.post("/", {"ana_positive": "true", "leukopenia": "on", "proteinuria": "on"})
+        self.assertContains(resp, "Cần thêm tiêu chí nào để đạt ngưỡng?")
+        self.assertContains(resp, "Sinh thiết thận loại III hoặc IV (+6)")
+
+        body = {"ana_positive": True, "selections": ["leukopenia", "proteinuria"]}
+        data = c.post("/api/score", data=body, content_type="application/json").json()
+        self.assertNotIn("reachability", data)
+        data = c.post("/api/score?fields=total_score,reachability", data=body, content_type="application/json").json()
+        self.assertEqual([r["threshold"] for r in data["reachability"]], [10, 20])
+        self.assertEqual(data["reachability"][0]["criteria_needed"], 1)
+        body["ana_positive"] = False
+        data = c.post("/api/score?fields=reachability", data=body, content_type="application/json").json()
+        self.assertIsNone(data["reachability"])
+
+
+class RunCacheTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = run_cache.RunCache(Path(self.tmp.name))
+
+    def test_reruns_only_changed_cases(self):
+        cases = [
+            {"id": "A", "input": {"ana_positive": True, "selections": ["fever"]}, "expected": {"total_score": 2}},
+            {"id": "B", "input": {"ana_positive": True, "selections": ["seizure"]}, "expected": {"total_score": 4}},
+            {"id": "C", "kind": "manual", "action": "Bấm nút"},
+        ]
+        first = run_cases(cases, max_workers=2, cache=self.cache)
+        self.assertEqual([r.cached for r in first], [False, False, False])
+
+        cases[1] = dict(cases[1], expected={"total_score": 5})
+        cases.append({"id": "D", "input": {"ana_positive": False, "selections": []}})
+        second = run_cases(cases, max_workers=2, cache=self.cache)
+        self.assertEqual([(r.id, r.status, r.cached) for r in second], [
+            ("A", "PASS", True), ("B", "PASS", False), ("C", "SKIP", True), ("D", "PASS", False),
+        ])
+        self.assertEqual(second[0].normalized_input, first[0].normalized_input)
+        self.assertEqual(second[0].expected, first[0].expected)
+        copy = json.loads(json.dumps(cases[0]))
+        key = self.cache.key(copy)
+        held = [copy["input"], copy["input"]["selections"][0]]  # extra references must not change the key
+        self.assertEqual(self.cache.key(copy), key)
+        self.assertEqual(self.cache.key(cases[0]), key)
+        del held
+
+    def test_view_reports_cached_results(self):
+        with override_settings(TEST_CASES_CACHE=True, TEST_CASES_CACHE_DIR=self.tmp.name):
+            c = Client()
+            cold = c.post("/test-cases/run", data={"mode": "all"}, content_type="application/json").json()
+            warm = c.post("/test-cases/run", data={"mode": "all"}, content_type="application/json").json()
+        errors = cold["summary"]["ERROR"]
+        self.assertEqual(cold["summary"]["CACHED"], 0)
+        self.assertEqual(warm["summary"]["CACHED"], warm["summary"]["TOTAL"] - errors)
+        strip = lambda rows: [{k: v for k, v in row.items() if k != "cached"} for row in rows]
+        self.assertEqual(strip(warm["results"]), strip(cold["results"]))
+
+    def test_versions_keep_separate_files_and_only_stale_ones_are_pruned(self):
+        case = {"id": "A", "input": {"ana_positive": True, "selections": ["fever"]}, "expected": {"total_score": 2}}
+        directory = Path(self.tmp.name)
+        run_cases([case], cache=self.cache)
+        stale = directory / "runs-v2.sqlite3"
+        stale.write_bytes(b"")
+        os.utime(stale, (time.time() - 8 * 86400,) * 2)
+        with mock.patch.object(run_cache, "code_version", return_value="changed"):
+            other = run_cache.RunCache(directory)
+            run_cases([case], cache=other)
+        self.assertNotEqual(other.path, self.cache.path)
+        # Another deployment opening its own version leaves this one's rows alone.
+        reopened = run_cache.RunCache(directory)
+        self.assertEqual(list(reopened.get_many([self.cache.key(case)])), [self.cache.key(case)])
+        self.assertEqual(sorted(p.name for p in directory.iterdir()), sorted([self.cache.path.name, other.path.name]))
+
+        os.utime(other.path, (time.time() - 8 * 86400,) * 2)
+        run_cache.RunCache(directory)
+        self.assertEqual([p.name for p in directory.iterdir()], [self.cache.path.name])
+
+
+class AuditTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.spool = Path(tmp.name)
+        override = override_settings(AUDIT_ENABLED=True, AUDIT_SPOOL_DIR=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.buffer = audit.AuditBuffer(background=False)
+        default, audit.BUFFER = audit.BUFFER, self.buffer
+        self.addCleanup(setattr, audit, "BUFFER", default)
+
+    def test_views_buffer_events_until_flush(self):
+        c = Client()
+        c.post("/", {"ana_positive": "true", "fever": "on"})
+        c.post("/api/score", data={"ana_positive": True, "selections": ["seizure"]}, content_type="application/json")
+        c.get("/api/score/1/1")
+        ScoreFastPath(lambda environ, start_response: []).handle(b'{"ana_positive": false}', "", "application/json", "10.0.0.1")
+        self.assertEqual((self.buffer.pending, AuditEvent.objects.count()), (4, 0))
+
+        self.assertEqual(self.buffer.flush(), 4)
+        rows = list(AuditEvent.objects.values_list("source", "selections", "total_score", "remote_addr"))
+        self.assertEqual(rows, [
+            ("index", ["fever"], 2, "127.0.0.1"),
+            ("api_score", ["seizure"], 5, "127.0.0.1"),
+            ("api_score_get", [criterion_ids()[0]], compute_score(ana_positive=True, selections=selections_from_mask(1)).total_score, "127.0.0.1"),
+            ("api_score", [], 0, "10.0.0.1"),
+        ])
+        self.assertEqual(AuditEvent.objects.first().ruleset_version, ruleset_version())
+
+    def test_views_record_the_logged_in_actor(self):
+        from asgiref.sync import async_to_sync
+        from django.contrib.auth.models import User
+
+        c = Client()
+        c.force_login(User.objects.create_user("dr-an"))
+        c.post("/api/score", data={"ana_positive": True}, content_type="application/json")
+        c.get("/api/score/1/2")
+        ac = AsyncClient()
+        ac.cookies = c.cookies
+        resp = async_to_sync(ac.post)("/api/score", data={"ana_positive": True}, content_type="application/json")
+        self.assertIs(resp.resolver_match.func, async_views.api_score)
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(list(AuditEvent.objects.values_list("source", "actor")), [
+            ("api_score", "dr-an"), ("api_score_get", "dr-an"), ("api_score", "dr-an"),
+        ])
+
+    def test_failed_write_is_spooled_and_replayed(self):
+        result = compute_score(ana_positive=True, selections={"fever": True})
+        event = lambda n: audit.record_score("api_score", True, {"fever": True}, result, actor=f"u{n}")
+        event(1)
+        event(2)
+
+        def unavailable(events):
+            raise RuntimeError("database is down")
+
+        write, audit._write = audit._write, unavailable
+        try:
+            with self.assertLogs("criteria.audit", "ERROR"):
+                self.assertEqual(self.buffer.flush(), 0)
+        finally:
+            audit._write = write
+        self.assertEqual(len((self.spool / f"audit-{os.getpid()}.jsonl").read_text().splitlines()), 2)
+
+        with override_settings(AUDIT_MAX_BUFFER=0):
+            event(3)  # buffer full -> straight to the spool
+        self.assertEqual(self.buffer.pending, 0)
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual(list(AuditEvent.objects.values_list("actor", flat=True)), ["u1", "u2", "u3"])
+        self.assertEqual(list(self.spool.iterdir()), [])
+
+        with mock.patch.object(self.buffer, "_replay") as replay:
+            event(4)
+            self.assertEqual(self.buffer.flush(), 1)
+        replay.assert_not_called()  # nothing spooled since the last replay
+
+        event(5)
+        self.assertEqual(self.buffer.drain(), 1)
+
+
+class _ThreadSharedStore(idempotency.CacheStore):
+    # Other threads cannot see the test transaction's cache rows; they share a LocMemCache instead.
+    cache = property(lambda self: caches["default"])
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        for alias in (settings.IDEMPOTENCY_CACHE, "default"):
+            caches[alias].clear()
+            self.addCleanup(caches[alias].clear)
+
+    def _score(self, client, body, key):
+        return client.post("/api/score", data=body, content_type="application/json", headers={"Idempotency-Key": key})
+
+    def test_retry_replays_first_response_without_rescoring(self):
+        buffer = audit.AuditBuffer(background=False)
+        default, audit.BUFFER = audit.BUFFER, buffer
+        self.addCleanup(setattr, audit, "BUFFER", default)
+        c = Client()
+        with override_settings(AUDIT_ENABLED=True):
+            first = self._score(c, {"ana_positive": True, "selections": ["fever"]}, "retry-1")
+            again = self._score(c, {"ana_positive": True, "selections": ["fever"]}, "retry-1")
+            other = self._score(c, {"ana_positive": True, "selections": ["seizure"]}, "retry-1")
+        self.assertEqual(buffer.pending, 1)
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual((again.status_code, again.content, again["Content-Type"]), (200, first.content, first["Content-Type"]))
+        self.assertEqual(other.status_code, 422)
+        self.assertEqual(self._score(c, {"ana_positive": True}, "").status_code, 400)
+
+    def test_job_submit_creates_one_job_per_key(self):
+        c = Client()
+        body = {"kind": "rescore", "payload": {"items": [{"mask": 1}]}}
+        first = c.post("/api/jobs", data=body, content_type="application/json", headers={"Idempotency-Key": "batch-7"})
+        again = c.post("/api/jobs", data=body, content_type="application/json", headers={"Idempotency-Key": "batch-7"})
+        self.assertEqual((first.status_code, again.status_code), (202, 202))
+        self.assertEqual(again["Location"], first["Location"])
+        self.assertEqual(Job.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_STORE="criteria.tests._ThreadSharedStore")
+    def test_concurrent_duplicates_wait_for_the_first(self):
+        calls = []
+
+        @idempotent("test")
+        def slow(request):
+            calls.append(request)
+            time.sleep(0.2)
+            return JsonResponse({"calls": len(calls)})
+
+        request = lambda: RequestFactory().post("/slow", data={}, content_type="application/json", headers={"Idempotency-Key": "k"})
+        responses = []
+        threads = [threading.Thread(target=lambda: responses.append(slow(request()))) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([json.loads(r.content) for r in responses], [{"calls": 1}] * 3)
+        self.assertEqual(sum(r.has_header("Idempotent-Replayed") for r in responses), 2)
+
+        with override_settings(IDEMPOTENCY_WAIT=0.05):
+            caches["default"].clear()
+            first = threading.Thread(target=slow, args=(request(),))
+            first.start()
+            time.sleep(0.05)
+            self.assertEqual(slow(request()).status_code, 409)
+            first.join()
+
+    @override_settings(IDEMPOTENCY_STORE="criteria.tests._ThreadSharedStore")
+    async def test_async_view_replays(self):
+        body = json.dumps({"ana_positive": True, "mask": 3})
+        c = AsyncClient()
+        first = await c.post("/api/score", data=body, content_type="application/json", headers={"Idempotency-Key": "a1"})
+        again = await c.post("/api/score", data=body, content_type="application/json", headers={"Idempotency-Key": "a1"})
+        self.assertEqual(again["Idempotent-Replayed"], "true")
+        self.assertEqual(again.content, first.content)
+
+    def test_per_process_cache_is_refused(self):
+        self.assertIsInstance(idempotency.get_store().cache, DatabaseCache)
+        with override_settings(IDEMPOTENCY_CACHE="default"), self.assertRaises(ImproperlyConfigured):
+            idempotency.get_store().cache
+
+
+class LegacyMappingTests(TestCase):
+    def test_keyword_matcher_reports_overlapping_patterns(self):
+        m = KeywordMatcher((("class iii", ("a",)), ("class ii", ("b",)), ("iii or", ("c",))))
+        self.assertEqual(m.find("Lupus Nephritis CLASS III or IV"), {"a", "b", "c"})
+        self.assertEqual(m.find("nothing here"), set())
+
+    def test_legacy_mapping_keeps_combination_rules(self):
+        sel, warnings = _map_selected_criteria_to_ids(["Low C3", "Low C4", "Lupus anticoagulant"])
+        self.assertEqual(set(sel), {"low_c3_and_c4", "antiphospholipid_any"})
+        self.assertEqual(warnings, [])
+
+        sel, _ = _map_selected_criteria_to_ids(["Low C4 only"])
+        self.assertEqual(set(sel), {"low_c3_or_c4"})
+
+    def test_legacy_mapping_vietnamese_terms(self):
+        sel, _ = _map_selected_criteria_to_ids(["Giảm C3 và C4", "Loét miệng", "Co giật"])
+        self.assertEqual(set(sel), {"low_c3_and_c4", "oral_ulcers", "seizure"})
+        for note in ("C3, C4 giảm", "Low C3 and C4"):
+            self.assertEqual(set(_map_selected_criteria_to_ids([note])[0]), {"low_c3_and_c4"}, note)
+
+    def test_legacy_mapping_ignores_normal_complement(self):
+        sel, _ = _map_selected_criteria_to_ids(["C3 và C4 bình thường"])
+        self.assertEqual(sel, {})
+
+    def test_legacy_mapping_warns_when_nothing_maps(self):
+        sel, warnings = _map_selected_criteria_to_ids(["unrelated"])
+        self.assertEqual(sel, {})
+        self.assertEqual(len(warnings), 1)
+
+
+class SuiteStreamTests(TestCase):
+    def _endpoint_bytes(self, data):
+        return JsonResponse(normalize_suite(data), json_dumps_params={"ensure_ascii": False, "indent": 2}).content
+
+    def _stream_bytes(self, data, chunk_size):
+        out = io.StringIO()
+        write_normalized_suite(io.StringIO(json.dumps(data, ensure_ascii=False, indent=4)), out, chunk_size=chunk_size)
+        return out.getvalue().encode("utf-8")
+
+    def test_matches_endpoint_on_docs_suite(self):
+        path = Path(settings.BASE_DIR) / "docs" / "test_cases.json"
+        data = json.loads(path.read_text(encoding="utf-8"))
+        expected = Client().get("/test-cases/normalized.json").content
+        for chunk_size in (7, 1 << 16):
+            self.assertEqual(self._stream_bytes(data, chunk_size), expected)
+
+    def test_matches_endpoint_with_reordered_and_empty_fields(self):
+        data = {
+            "test_cases": [
+                {"cases": [{"id": "A", "input": {"ana_status": True, "selected_criteria": ["Fever"]}}], "category": "late"},
+                {"category": "empty", "cases": []},
+                {"category": "no cases"},
+                {"cases": "not a list", "extra": [1, 2.5, None]},
+            ],
+            "version": 3,
+            "ignored": {"nested": [1]},
+        }
+        self.assertEqual(self._stream_bytes(data, 5), self._endpoint_bytes(data))
+        self.assertEqual(self._stream_bytes({"test_suite": "x"}, 3), self._endpoint_bytes({"test_suite": "x"}))
+
+    def test_numbers_split_across_chunks(self):
+        from .suite_stream import JsonStream
+
+        doc = '{"a": 1.5e3, "b": [1, -0.25, 2E-2, 10], "c": 12345.678e+1}'
+        for chunk_size in (1, 2, 3, 4, 5, 8, 10, 1 << 16):
+            with self.subTest(chunk_size=chunk_size):
+                stream = JsonStream(io.StringIO(doc), chunk_size=chunk_size)
+                got = {}
+                for key in stream.iter_object():
+                    if key == "b":
+                        got[key] = [stream.value() for _ in stream.iter_array()]
+                    else:
+                        got[key] = stream.value()
+                self.assertEqual(got, json.loads(doc))
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            out = Path(d) / "out.json"
+            call_command("normalize_suite", "-o", str(out))
+            self.assertEqual(out.read_bytes(), Client().get("/test-cases/normalized.json").content)
+
 
 class ApiTests(TestCase):
     def test_index_page_renders(self):
@@ -149,6 +1273,25 @@ class ApiTests(TestCase):
         self.assertIn("summary", payload)
         self.assertIn("results", payload)
 
+    def test_test_cases_run_stream_emits_events_then_summary(self):
+        c = Client()
+        resp = c.post(
+            "/test-cases/run",
+            data={"mode": "all", "stream": True},
+            content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/event-stream"))
+        body = b"".join(resp.streaming_content).decode("utf-8")
+        events = [e for e in body.split("\n\n") if e]
+        self.assertTrue(events[-1].startswith("event: summary"))
+        results = [e for e in events if e.startswith("event: result")]
+        summary = json.loads(events[-1].split("data: ", 1)[1])
+        self.assertEqual(summary["TOTAL"], len(results))
+
+        plain = c.post("/test-cases/run", data={"mode": "all"}, content_type="application/json").json()
+        self.assertEqual(plain["summary"], summary)
+
     def test_export_pdf_requires_prior_result(self):
         c = Client()
         resp = c.get("/export/pdf")
@@ -187,11 +1330,82 @@ class ApiTests(TestCase):
         c = Client()
         resp = c.post(
             "/api/score",
-            data={"ana_positive": True, "selections": ["renal_biopsy_class_iii_or_iv"]},
+            data={"ana_positive": True, "selections": "renal_biopsy_class_iii_or_iv"},
             content_type="application/json",
         )
         self.assertEqual(resp.status_code, 400)
 
+    def test_api_compact_inputs_match_object_form(self):
+        c = Client()
+        selections = {"fever": True, "seizure": True, "proteinuria": True}
+        expected = c.post(
+            "/api/score", data={"ana_positive": True, "selections": selections}, content_type="application/json"
+        ).json()
+        mask = mask_from_selections(selections)
+        for body in (
+            {"ana_positive": True, "selections": list(selections)},
+            {"ana_positive": True, "mask": mask},
+            {"ana_positive": True, "mask": f"{mask:x}"},
+            {"ana_positive": True, "mask": f"0x{mask:X}"},
+        ):
+            with self.subTest(body=body):
+                resp = c.post("/api/score", data=body, content_type="application/json")
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp.json(), expected)
+
+    def test_api_compact_inputs_reject_unknown(self):
+        c = Client()
+        cases = {
+            "selections[1]: unknown criterion id 'fevr'": {"selections": ["seizure", "fevr"]},
+            "selections[0]: expected a criterion id string": {"selections": [3]},
+            "mask: bit(s) 21 do not map to a criterion": {"mask": 1 << 21},
+            "mask: invalid hex string 'xyz'": {"mask": "xyz"},
+            "mask: invalid hex string '1_0'": {"mask": "1_0"},
+            "mask: invalid hex string ' 41'": {"mask": " 41"},
+            "mask: invalid hex string '-1'": {"mask": "-1"},
+            "mask: more than 6 hex digits": {"mask": "f" * 100_000},
+            "mask: bit(s) 22, 23 do not map": {"mask": "c00001"},
+            "mask: bit(s) 21, 22, 23, 24, 25, 26, 27, 28, ... do not map": {"mask": (1 << 64) - 1},
+            "mask out of range": {"mask": 1 << 64},
+            "mask must be >= 0": {"mask": -1},
+            "Give either selections or mask, not both": {"mask": 1, "selections": ["fever"]},
+        }
+        for message, body in cases.items():
+            with self.subTest(body=body):
+                resp = c.post("/api/score", data={"ana_positive": True, **body}, content_type="application/json")
+                self.assertEqual(resp.status_code, 400)
+                self.assertIn(message, resp.json()["error"])
+
+    def test_api_fields_selector(self):
+        c = Client()
+        body = {"ana_positive": True, "selections": ["renal_biopsy_class_iii_or_iv"]}
+        resp = c.post("/api/score?fields=risk_tier,total_score", data=body, content_type="application/json")
+        self.assertEqual(list(resp.json()), ["total_score", "risk_tier"])
+        self.assertEqual(resp.json()["total_score"], 10)
+        resp = c.post("/api/score?fields=total,domains", data=body, content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("Unknown field(s): total", resp.json()["error"])
+
+    def test_api_cbor_negotiation(self):
+        c = Client()
+        body = {"ana_positive": True, "selections": ["renal_biopsy_class_iii_or_iv", "fever"]}
+        as_json = c.post("/api/score", data=body, content_type="application/json")
+        as_cbor = c.post("/api/score", data=body, content_type="application/json", HTTP_ACCEPT="application/cbor")
+        self.assertEqual(as_cbor["Content-Type"], "application/cbor")
+        self.assertIn("Accept", as_cbor["Vary"])
+        self.assertEqual(cbor.loads(as_cbor.content), as_json.json())
+        self.assertLess(len(as_cbor.content), len(as_json.content))
+
+        get = c.get("/api/score/1/1", HTTP_ACCEPT="application/cbor")
+        self.assertNotEqual(get["ETag"], c.get("/api/score/1/1")["ETag"])
+
+    def test_cbor_round_trip(self):
+        value = {"a": [0, 23, 24, 255, 256, 65536, 2**32, -1, -500], "b": None, "c": (True, False), "d": 1.5, "é": b"x"}
+        decoded = cbor.loads(cbor.dumps(value))
+        self.assertEqual(decoded, {**value, "c": [True, False]})
+        self.assertEqual(cbor.dumps(100), bytes.fromhex("1864"))
+        self.assertEqual(cbor.dumps([1, [2, 3]]), bytes.fromhex("8201820203"))
+
     def test_api_score_rejects_bad_json(self):
         c = Client()
         resp = c.post("/api/score", data="{bad json", content_type="application/json")
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api_views, job_views, views
 
 app_name = "criteria"
 
@@ -12,7 +12,15 @@ urlpatterns = [
     path("test-cases/run", views.test_cases_run, name="test_cases_run"),
     path("test-cases/normalized.json", views.test_cases_normalized_json, name="test_cases_normalized_json"),
     path("export/pdf", views.export_pdf, name="export_pdf"),
-    path("api/score", views.api_score, name="api_score"),
+    path("api/score", api_views.api_score, name="api_score"),
+    path("api/score/<str:ana>/<str:mask>", api_views.api_score_get, name="api_score_get"),
+    path("api/jobs", job_views.job_submit, name="job_submit"),
+    path("api/jobs/<str:token>", job_views.job_status, name="job_status"),
+    path("api/jobs/<str:token>/result", job_views.job_result, name="job_result"),
+    path("api/jobs/<str:token>/cancel", job_views.job_cancel, name="job_cancel"),
+    path("metrics", api_views.metrics_view, name="metrics"),
+    path("readyz", api_views.readyz, name="readyz"),
+    path("debug/memory/snapshot", views.memory_snapshot, name="memory_snapshot"),
 ]
 
 
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import api_views
+
+app_name = "criteria"
+
+urlpatterns = [
+    path("api/score", api_views.api_score, name="api_score"),
+    path("api/score/<str:ana>/<str:mask>", api_views.api_score_get, name="api_score_get"),
+    path("metrics", api_views.metrics_view, name="metrics"),
+    path("readyz", api_views.readyz, name="readyz"),
+]
@@ -0,0 +1,17 @@
+from django.urls import path
+
+from . import async_views
+from .urls import app_name, urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    "api_score": async_views.api_score,
+    "test_cases_run": async_views.test_cases_run,
+    "export_pdf": async_views.export_pdf,
+}
+
+urlpatterns = [
+    path(str(p.pattern), ASYNC_VIEWS.get(p.name, p.callback), name=p.name)
+    for p in sync_urlpatterns
+]
+
+__all__ = ["app_name", "urlpatterns"]
@@ -1,16 +1,23 @@
 import json
+import os
 from pathlib import Path
 from datetime import datetime
 
+from django.conf import settings
 from django.http import HttpRequest, JsonResponse
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
-from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
 from django.views.decorators.http import require_http_methods
 
+from . import audit, memory, metrics, profiling, reachability, run_cache
+from .api_views import api_response, api_score, api_score_get, metrics_view, readyz  # noqa: F401
 from .forms import CriteriaForm
+from .pdf import PdfUnavailable, html_to_pdf, load_weasyprint, pdf_filename, render_report_html
 from .scoring import compute_score, get_domains
-from .testcase_runner import normalize_suite, run_case
+from .testcase_runner import iter_run_cases, normalize_suite, run_cases, run_result_to_dict
+
+TEST_CASES_PATH = Path(__file__).resolve().parent.parent / "docs" / "test_cases.json"
 
 
 def _domain_blocks(form: CriteriaForm):
@@ -93,11 +100,13 @@ def _result_to_dict(result):
 def index(request: HttpRequest):
     if request.method == "POST":
         form = CriteriaForm(request.POST)
-        if form.is_valid():
-            result = compute_score(
-                ana_positive=form.cleaned_ana_positive(),
-                selections=form.cleaned_selections(),
-            )
+        with metrics.stage("form_validation"):
+            valid = form.is_valid()
+        if valid:
+            ana_positive, selections = form.cleaned_ana_positive(), form.cleaned_selections()
+            with metrics.stage("compute_score"):
+                result = compute_score(ana_positive=ana_positive, selections=selections)
+            audit.record_request("index", request, ana_positive, selections, result)
             patient_info = form.cleaned_patient_info()
             request.session["last_report"] = {
                 "generated_at": datetime.now().isoformat(timespec="seconds"),
@@ -105,25 +114,28 @@ def index(request: HttpRequest):
                 "result": _result_to_dict(result),
                 "radar_axes": _radar_payload(result),
             }
-            return render(
-                request,
-                "criteria/result.html",
-                {
-                    "form": form,
-                    "result": result,
-                    "domain_blocks": _domain_blocks(form),
-                    "radar_axes": _radar_payload(result),
-                    "patient_info": patient_info,
-                },
-            )
+            with metrics.stage("template_render"):
+                return render(
+                    request,
+                    "criteria/result.html",
+                    {
+                        "form": form,
+                        "result": result,
+                        "domain_blocks": _domain_blocks(form),
+                        "radar_axes": _radar_payload(result),
+                        "reachability": reachability.reach_for_result(result),
+                        "patient_info": patient_info,
+                    },
+                )
     else:
         form = CriteriaForm()
 
-    return render(
-        request,
-        "criteria/index.html",
-        {"form": form, "domain_blocks": _domain_blocks(form)},
-    )
+    with metrics.stage("template_render"):
+        return render(
+            request,
+            "criteria/index.html",
+            {"form": form, "domain_blocks": _domain_blocks(form)},
+        )
 
 
 def about(request: HttpRequest):
@@ -141,7 +153,7 @@ def test_cases(request: HttpRequest):
     """
     data = None
     error = None
-    path = Path(__file__).resolve().parent.parent / "docs" / "test_cases.json"
+    path = TEST_CASES_PATH
     try:
         raw = path.read_text(encoding="utf-8")
         data = json.loads(raw)
@@ -162,18 +174,65 @@ def test_cases_normalized_json(request: HttpRequest):
     """
     Download a normalized schema-v2 JSON for easier UI loading/running.
     """
-    path = Path(__file__).resolve().parent.parent / "docs" / "test_cases.json"
+    path = TEST_CASES_PATH
     raw = path.read_text(encoding="utf-8")
     data = json.loads(raw)
     normalized = normalize_suite(data)
     return JsonResponse(normalized, json_dumps_params={"ensure_ascii": False, "indent": 2})
 
 
+def _run_result_to_dict(r):
+    return {**run_result_to_dict(r), "cached": r.cached}
+
+
+def _run_summary(results):
+    summary = {"PASS": 0, "FAIL": 0, "SKIP": 0, "ERROR": 0, "TOTAL": 0, "CACHED": 0}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+        summary["TOTAL"] += 1
+        summary["CACHED"] += 1 if r.get("cached") else 0
+    return summary
+
+
+def _selected_cases(suite, mode, wanted_id):
+    cases = []
+    for group in suite.get("test_cases", []):
+        for tc in group.get("cases", []):
+            if mode == "one" and wanted_id and tc.get("id") != wanted_id:
+                continue
+            cases.append(tc)
+    return cases
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _stream_run_events(cases):
+    """
+    Yield one `result` event per case as soon as it finishes, then a `summary`.
+    """
+    results = []
+    for r in iter_run_cases(cases, max_workers=_run_workers(), cache=run_cache.default_cache()):
+        row = _run_result_to_dict(r)
+        results.append({"status": row["status"], "cached": row["cached"]})
+        yield _sse_event("result", row)
+    yield _sse_event("summary", _run_summary(results))
+
+
+def _run_workers() -> int:
+    return int(getattr(settings, "TEST_CASES_RUN_WORKERS", 4))
+
+
 @require_http_methods(["POST"])
 def test_cases_run(request: HttpRequest):
     """
     POST JSON:
       { "mode": "all" } or { "mode": "one", "id": "TC-09" }
+
+    Add "stream": true (or send `Accept: text/event-stream`) to receive each
+    result as a Server-Sent Event as soon as it completes, followed by a
+    final `summary` event.
     """
     try:
         payload = json.loads(request.body.decode("utf-8"))
@@ -183,53 +242,21 @@ def test_cases_run(request: HttpRequest):
     mode = payload.get("mode", "all")
     wanted_id = payload.get("id")
 
-    path = Path(__file__).resolve().parent.parent / "docs" / "test_cases.json"
+    path = TEST_CASES_PATH
     raw = path.read_text(encoding="utf-8")
     suite = json.loads(raw)
-
-    results = []
-    for group in suite.get("test_cases", []):
-        for tc in group.get("cases", []):
-            if mode == "one" and wanted_id and tc.get("id") != wanted_id:
-                continue
-            r = run_case(tc)
-            results.append(
-                {
-                    "id": r.id,
-                    "description": r.description,
-                    "status": r.status,
-                    "reason": r.reason,
-                    "normalized_input": (
-                        {
-                            "ana_positive": r.normalized_input.ana_positive,
-                            "selections": r.normalized_input.selections,
-                        }
-                        if r.normalized_input
-                        else None
-                    ),
-                    "expected": (
-                        {
-                            "total_score": r.expected.total_score,
-                            "meets_classification": r.expected.meets_classification,
-                            "risk_tier": r.expected.risk_tier,
-                            "domain_id": r.expected.domain_id,
-                            "domain_score": r.expected.domain_score,
-                        }
-                        if r.expected
-                        else None
-                    ),
-                    "actual": r.actual,
-                    "diffs": r.diffs,
-                }
-            )
-
-    summary = {
-        "PASS": sum(1 for r in results if r["status"] == "PASS"),
-        "FAIL": sum(1 for r in results if r["status"] == "FAIL"),
-        "SKIP": sum(1 for r in results if r["status"] == "SKIP"),
-        "ERROR": sum(1 for r in results if r["status"] == "ERROR"),
-        "TOTAL": len(results),
-    }
+    cases = _selected_cases(suite, mode, wanted_id)
+
+    stream = bool(payload.get("stream")) or "text/event-stream" in request.headers.get("Accept", "")
+    if stream:
+        resp = StreamingHttpResponse(_stream_run_events(cases), content_type="text/event-stream; charset=utf-8")
+        resp["Cache-Control"] = "no-cache"
+        resp["X-Accel-Buffering"] = "no"
+        return resp
+
+    run = run_cases(cases, max_workers=_run_workers(), cache=run_cache.default_cache())
+    results = [_run_result_to_dict(r) for r in run]
+    summary = _run_summary(results)
     return JsonResponse({"summary": summary, "results": results}, json_dumps_params={"ensure_ascii": False})
 
 
@@ -243,23 +270,16 @@ def export_pdf(request: HttpRequest):
         return JsonResponse({"error": "Chưa có kết quả để xuất PDF. Hãy tính điểm trước."}, status=400)
 
     try:
-        from weasyprint import HTML  # type: ignore
-    except Exception as e:
-        return JsonResponse({"error": f"Thiếu weasyprint để xuất PDF: {type(e).__name__}"}, status=500)
+        load_weasyprint()
+    except PdfUnavailable as e:
+        return JsonResponse({"error": str(e)}, status=500)
 
-    html = render(
-        request,
-        "criteria/pdf_result.html",
-        {
-            "report": report,
-        },
-    ).content.decode("utf-8")
-
-    pdf_bytes = HTML(string=html, base_url=str(Path(__file__).resolve().parent)).write_pdf()
+    with metrics.stage("template_render"):
+        html = render_report_html(report)
 
-    code = (report.get("patient_info", {}) or {}).get("patient_code") or "sle"
-    safe = "".join(ch for ch in str(code) if ch.isalnum() or ch in ("-", "_")).strip() or "sle"
-    filename = f"{safe}-eular-acr-2019.pdf"
+    with metrics.stage("weasyprint_render"):
+        pdf_bytes = html_to_pdf(html)
+    filename = pdf_filename(report)
 
     resp = HttpResponse(pdf_bytes, content_type="application/pdf")
     resp["Content-Disposition"] = f'attachment; filename="{filename}"'
@@ -267,59 +287,26 @@ def export_pdf(request: HttpRequest):
 
 
 @require_http_methods(["POST"])
-def api_score(request: HttpRequest):
+@csrf_exempt
+def memory_snapshot(request: HttpRequest):
     """
-    POST JSON:
-    {
-      "ana_positive": true,
-      "selections": { "fever": true, "leukopenia": false, ... }
-    }
+    Dump a tracemalloc snapshot of this worker for `manage.py memory_snapshot diff`.
+    Only available with MEMORY_PROFILING_ENABLED + MEMORY_TRACEMALLOC, and only
+    in DEBUG or with a signed X-Profile header.
     """
+    enabled = getattr(settings, "MEMORY_PROFILING_ENABLED", False) and getattr(settings, "MEMORY_TRACEMALLOC", False)
+    allowed = settings.DEBUG or profiling.token_valid(request.headers.get("X-Profile"))
+    if not enabled or not allowed:
+        return JsonResponse({"error": "Not found"}, status=404)
     try:
-        payload = json.loads(request.body.decode("utf-8"))
-    except Exception:
-        return JsonResponse({"error": "Invalid JSON body"}, status=400)
-
-    ana_positive = bool(payload.get("ana_positive"))
-    selections = payload.get("selections") or {}
-    if not isinstance(selections, dict):
-        return JsonResponse({"error": "selections must be an object/dict"}, status=400)
-
-    # Only accept known criterion IDs
-    allowed_ids = {c.id for d in get_domains() for c in d.criteria}
-    filtered = {k: bool(v) for k, v in selections.items() if k in allowed_ids}
-
-    result = compute_score(ana_positive=ana_positive, selections=filtered)
+        path = memory.dump_snapshot()
+    except RuntimeError as e:
+        return JsonResponse({"error": str(e)}, status=409)
     return JsonResponse(
         {
-            "ana_positive": result.ana_positive,
-            "eligible": result.eligible,
-            "ineligible_reason": result.ineligible_reason,
-            "total_score": result.total_score,
-            "meets_classification": result.meets_classification,
-            "risk_tier": result.risk_tier,
-            "risk_note": result.risk_note,
-            "domains": [
-                {
-                    "domain_id": ds.domain_id,
-                    "domain_label": ds.domain_label,
-                    "awarded_points": ds.awarded_points,
-                    "awarded_criterion": (
-                        {
-                            "id": ds.awarded_criterion.id,
-                            "label": ds.awarded_criterion.label,
-                            "points": ds.awarded_criterion.points,
-                        }
-                        if ds.awarded_criterion
-                        else None
-                    ),
-                    "selected_criteria": [
-                        {"id": c.id, "label": c.label, "points": c.points}
-                        for c in ds.selected_criteria
-                    ],
-                    "note": ds.note,
-                }
-                for ds in result.domain_scores
-            ],
+            "snapshot": str(path),
+            "pid": os.getpid(),
+            "rss_bytes": memory.current_rss(),
+            "peak_rss_bytes": memory.peak_rss(),
         }
     )
@@ -0,0 +1,183 @@
+"""
+Worker warm-up and readiness.
+
+warm_up() does, once per process, the work that otherwise lands on the first
+requests a fresh worker serves: importing the views, building the ruleset and
+its derived tables, setting up the form class, compiling and rendering the
+page templates, resolving URLs and (if installed) importing WeasyPrint and
+rendering a tiny PDF so fonts are loaded. `/readyz` reports 503 until it has
+finished.
+
+Entry points:
+- gunicorn: `post_worker_init` in gunicorn.conf.py calls warm_up() before the
+  worker accepts connections;
+- ASGI (sleweb/asgi.py) and WARMUP_ON_READY=1 (CriteriaConfig.ready) start it
+  in a background thread;
+- otherwise the first `/readyz` request starts it in the background.
+
+settings.WARMUP_STEPS limits the steps (the API-only profile skips forms,
+templates and PDF).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger("criteria.warmup")
+
+_lock = threading.Lock()
+_done = threading.Event()
+_thread: Optional[threading.Thread] = None
+_report: Dict[str, object] = {"steps": {}, "errors": {}}
+
+SAMPLE_SELECTIONS = {"fever": True, "leukopenia": True, "proteinuria": True, "low_c3_or_c4": True}
+
+
+def _request():
+    from django.http import HttpRequest
+
+    request = HttpRequest()
+    request.method = "GET"
+    request.META.update({"SERVER_NAME": "localhost", "SERVER_PORT": "80"})
+    return request
+
+
+def _ruleset() -> None:
+    from . import api, reachability
+    from .scoring import compute_score, criterion_ids, get_domains, ruleset_version
+
+    get_domains()
+    criterion_ids()
+    ruleset_version()
+    reachability.index()
+    result = compute_score(ana_positive=True, selections={"fever": True})
+    for media_type in api.MEDIA_TYPES:
+        api.encode(api.score_payload(result), media_type)
+    api.negotiate(None)
+
+
+def _forms() -> None:
+    from .forms import CriteriaForm
+
+    CriteriaForm().is_valid()
+    CriteriaForm({"ana_positive": "true", "fever": "on"}).is_valid()
+
+
+def _templates() -> None:
+    from django.shortcuts import render
+
+    from . import reachability, views
+    from .forms import CriteriaForm
+    from .scoring import compute_score, get_domains
+
+    form = CriteriaForm()
+    render(_request(), "criteria/index.html", {"form": form, "domain_blocks": views._domain_blocks(form)})
+
+    bound = CriteriaForm({"ana_positive": "true", **{k: "on" for k in SAMPLE_SELECTIONS}})
+    bound.is_valid()
+    result = compute_score(ana_positive=True, selections=SAMPLE_SELECTIONS)
+    render(
+        _request(),
+        "criteria/result.html",
+        {
+            "form": bound,
+            "result": result,
+            "domain_blocks": views._domain_blocks(bound),
+            "radar_axes": views._radar_payload(result),
+            "reachability": reachability.reach_for_result(result),
+            "patient_info": {},
+        },
+    )
+    for name, context in (
+        ("criteria/about.html", {}),
+        ("criteria/theory.html", {"domains": get_domains()}),
+    ):
+        render(_request(), name, context)
+
+
+def _urls() -> None:
+    from django.urls import get_resolver, resolve, reverse
+
+    get_resolver().reverse_dict  # populate the resolver caches
+    for path in ("/api/score", "/api/score/1/1", "/readyz"):
+        resolve(path)
+    reverse("criteria:api_score")
+
+
+def _pdf() -> None:
+    if not getattr(settings, "WARMUP_PDF", True):
+        return
+    from . import pdf
+
+    try:
+        pdf.load_weasyprint()
+    except pdf.PdfUnavailable:
+        return
+    pdf.html_to_pdf("<p>warm-up</p>")
+
+
+STEPS: Tuple[Tuple[str, Callable[[], None]], ...] = (
+    ("ruleset", _ruleset),
+    ("forms", _forms),
+    ("templates", _templates),
+    ("urls", _urls),
+    ("pdf", _pdf),
+)
+
+
+def warm_up() -> Dict[str, object]:
+    """
+    Run every warm-up step once per process (later calls return the first
+    report). A failing step is logged and recorded, not fatal: the worker is
+    still able to serve, only colder.
+    """
+    with _lock:
+        if _done.is_set():
+            return _report
+        t0 = time.perf_counter()
+        steps: Dict[str, float] = {}
+        errors: Dict[str, str] = {}
+        enabled = getattr(settings, "WARMUP_STEPS", None)
+        for name, step in STEPS:
+            if enabled is not None and name not in enabled:
+                continue
+            s0 = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                errors[name] = f"{type(e).__name__}: {e}"
+                logger.exception("Warm-up step %s failed", name)
+            steps[name] = round(time.perf_counter() - s0, 4)
+        _report.update(steps=steps, errors=errors, seconds=round(time.perf_counter() - t0, 4))
+        _done.set()
+    logger.info("Worker warm-up finished in %.3fs: %s", _report["seconds"], steps)
+    return _report
+
+
+def start_background() -> None:
+    """
+    Start warm_up() in a daemon thread unless it has already run or started.
+    """
+    global _thread
+    with _lock:
+        if _done.is_set() or _thread is not None:
+            return
+        _thread = threading.Thread(target=warm_up, name="criteria-warmup", daemon=True)
+        _thread.start()
+
+
+def is_ready() -> bool:
+    return _done.is_set()
+
+
+def wait(timeout: Optional[float] = None) -> bool:
+    return _done.wait(timeout)
+
+
+def report() -> Dict[str, object]:
+    return dict(_report)
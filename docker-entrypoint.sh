@@ -0,0 +1,11 @@
+#!/bin/sh
+# Every process in the image shares the "idempotency" database cache
+# (sleweb/settings.py), so make sure its table exists before starting
+# whatever command was given. createcachetable is a no-op when it does;
+# if the database cannot be reached the container exits here with the error
+# instead of failing later on the first Idempotency-Key request.
+set -e
+
+python manage.py createcachetable
+
+exec "$@"
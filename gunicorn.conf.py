@@ -0,0 +1,26 @@
+"""
+gunicorn settings, picked up automatically from the working directory.
+
+Bind address, worker count etc. stay on the command line (see Dockerfile);
+this file only adds the warm-up hook so a new or restarted worker does its
+first-request work (template compilation, ruleset, WeasyPrint import) before
+it accepts connections, and drains the worker's audit buffer and writes its
+final metrics snapshot when it exits.
+"""
+
+
+def post_worker_init(worker):
+    from criteria.warmup import warm_up
+
+    report = warm_up()
+    worker.log.info("Warm-up done in %ss %s", report.get("seconds"), report.get("steps"))
+
+
+def worker_exit(server, worker):
+    from criteria.audit import BUFFER
+    from criteria.metrics import flush_at_exit
+
+    flush_at_exit()
+
+    written = BUFFER.drain()
+    worker.log.info("Audit buffer drained (%s events written)", written)
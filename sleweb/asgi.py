@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sleweb.settings')
 
 application = get_asgi_application()
+
+# ASGI servers have no per-worker hook; warm up in the background (see /readyz).
+from criteria import warmup  # noqa: E402
+
+warmup.start_background()
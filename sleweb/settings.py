@@ -43,8 +43,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'criteria.metrics.MetricsMiddleware',
+    'criteria.async_views.AsgiUrlconfMiddleware',
+    'criteria.admission.AdmissionMiddleware',
+    'criteria.profiling.ProfilingMiddleware',
+    'criteria.memory.MemoryAccountingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'criteria.metrics.TimedSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -101,6 +106,19 @@ else:
     }
 
 
+# Caches
+# `idempotency` lives in the database so every worker process sees the same keys
+# (create its table with `manage.py createcachetable`).
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "idempotency": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "criteria_idempotency_cache",
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -141,3 +159,142 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Test-case runner
+# Worker threads used by /test-cases/run to execute independent cases concurrently.
+
+TEST_CASES_RUN_WORKERS = int(_env("TEST_CASES_RUN_WORKERS", "4"))
+# Results of unchanged cases are reused from disk (criteria/run_cache.py); the key
+# covers the case, the ruleset version and the runner code. Unset dir = system temp.
+TEST_CASES_CACHE = _env("TEST_CASES_CACHE", "1") == "1"
+TEST_CASES_CACHE_DIR = _env("TEST_CASES_CACHE_DIR")
+# Entries also kept in memory per process (warm reruns skip SQLite).
+TEST_CASES_CACHE_MEMORY = int(_env("TEST_CASES_CACHE_MEMORY", "10000"))
+# Days after which cache files of other ruleset/code versions are deleted.
+TEST_CASES_CACHE_MAX_AGE = float(_env("TEST_CASES_CACHE_MAX_AGE", "7"))
+
+
+# Raw WSGI fast path for POST /api/score (sleweb/wsgi.py)
+# Serves the scoring API without URL resolution or middleware, with identical
+# responses; set API_FAST_PATH=0 to route it through Django like any other view.
+
+API_FAST_PATH = _env("API_FAST_PATH", "1") == "1"
+
+# Freshness of GET /api/score/<ana>/<mask> responses. The URL has no ruleset
+# version, so keep it short: caches then revalidate with the ETag, which does.
+API_SCORE_CACHE_MAX_AGE = int(_env("API_SCORE_CACHE_MAX_AGE", "60"))
+
+
+# ASGI deployment (sleweb/asgi.py, e.g. uvicorn)
+# ASGI requests are routed through ASGI_URLCONF, which swaps in the async views
+# (criteria/async_views.py). Blocking work runs on bounded per-process pools.
+
+ASGI_URLCONF = 'sleweb.urls_asgi'
+ASYNC_PDF_WORKERS = int(_env("ASYNC_PDF_WORKERS", "2"))
+ASYNC_IO_WORKERS = int(_env("ASYNC_IO_WORKERS", "4"))
+
+
+# Admission control (criteria/admission.py)
+# Per-endpoint concurrency limits shared by all workers on the host (flock'ed
+# files in ADMISSION_DIR): `slots` running, `queue` waiting up to `timeout`
+# seconds, everything else gets 503 + Retry-After. The queue is used by async
+# (ASGI) requests; a queued sync request would hold its worker while it waits,
+# so sync requests only queue with ADMISSION_SYNC_QUEUE=1.
+
+ADMISSION_ENABLED = _env("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_SYNC_QUEUE = _env("ADMISSION_SYNC_QUEUE", "0") == "1"
+ADMISSION_DIR = _env("ADMISSION_DIR")
+ADMISSION_LIMITS = {
+    "criteria:export_pdf": {
+        "slots": int(_env("ADMISSION_PDF_SLOTS", "2")),
+        "queue": int(_env("ADMISSION_PDF_QUEUE", "4")),
+        "timeout": 5.0,
+        "retry_after": 2,
+    },
+    "criteria:test_cases_run": {
+        "slots": int(_env("ADMISSION_TEST_RUN_SLOTS", "1")),
+        "queue": int(_env("ADMISSION_TEST_RUN_QUEUE", "2")),
+        "timeout": 5.0,
+        "retry_after": 5,
+    },
+}
+
+
+# Worker warm-up (criteria/warmup.py, /readyz)
+# gunicorn.conf.py warms each worker before it accepts requests; WARMUP_ON_READY=1
+# also starts it from AppConfig.ready() for other servers. WARMUP_PDF loads WeasyPrint.
+
+WARMUP_ON_READY = _env("WARMUP_ON_READY", "0") == "1"
+WARMUP_STEPS = None  # all of criteria.warmup.STEPS
+WARMUP_PDF = _env("WARMUP_PDF", "1") == "1"
+
+
+# Background jobs (criteria/jobs.py, `manage.py jobworker`, /api/jobs)
+# Failed attempts are retried after JOBS_RETRY_BACKOFF * 2**(attempt-1) seconds;
+# running jobs without a heartbeat for JOBS_STALE_AFTER seconds are requeued
+# (failed if that was their last attempt). Finished jobs and their artifacts
+# are deleted JOBS_RETENTION seconds after finishing (0 = keep).
+
+JOBS_MAX_ATTEMPTS = int(_env("JOBS_MAX_ATTEMPTS", "3"))
+# Upper bound for a max_attempts given in POST /api/jobs.
+JOBS_MAX_ATTEMPTS_LIMIT = int(_env("JOBS_MAX_ATTEMPTS_LIMIT", "10"))
+JOBS_RETRY_BACKOFF = float(_env("JOBS_RETRY_BACKOFF", "5"))
+JOBS_STALE_AFTER = float(_env("JOBS_STALE_AFTER", "300"))
+JOBS_POLL_INTERVAL = float(_env("JOBS_POLL_INTERVAL", "1"))
+JOBS_RETENTION = float(_env("JOBS_RETENTION", str(7 * 86400)))
+
+# Idempotency-Key on POST /api/score and POST /api/jobs (criteria/idempotency.py)
+# Responses are kept IDEMPOTENCY_TTL seconds in the Django cache IDEMPOTENCY_CACHE
+# (shared by all workers; a per-process backend is refused); duplicates of a request still running
+# wait up to IDEMPOTENCY_WAIT seconds for its response. IDEMPOTENCY_STORE swaps the store.
+
+IDEMPOTENCY_STORE = "criteria.idempotency.CacheStore"
+IDEMPOTENCY_CACHE = _env("IDEMPOTENCY_CACHE", "idempotency")
+IDEMPOTENCY_TTL = int(_env("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_LOCK_TTL = int(_env("IDEMPOTENCY_LOCK_TTL", "60"))
+IDEMPOTENCY_WAIT = float(_env("IDEMPOTENCY_WAIT", "10"))
+
+
+# Audit log of scoring events (criteria/audit.py, models.AuditEvent)
+# Events are buffered per process and written in batches by a background thread
+# (AUDIT_BATCH_SIZE events or every AUDIT_FLUSH_INTERVAL seconds); batches the
+# database rejects go to JSON-lines files in AUDIT_SPOOL_DIR and are replayed later.
+
+AUDIT_ENABLED = _env("AUDIT_ENABLED", "1") == "1"
+AUDIT_BATCH_SIZE = int(_env("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(_env("AUDIT_FLUSH_INTERVAL", "2"))
+AUDIT_MAX_BUFFER = int(_env("AUDIT_MAX_BUFFER", "10000"))
+AUDIT_SPOOL_DIR = _env("AUDIT_SPOOL_DIR", str(BASE_DIR / "audit_spool"))
+
+# Metrics (/metrics, Prometheus text format)
+# Set METRICS_DIR to a directory shared by all gunicorn workers on the host so
+# /metrics aggregates every worker; leave unset for single-process servers.
+
+METRICS_DIR = _env("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(_env("METRICS_FLUSH_INTERVAL", "1.0"))
+
+
+# Per-request CPU profiling (opt-in)
+# Requests carrying a signed `X-Profile` header (manage.py profile_summary --make-token)
+# or picked by PROFILING_SAMPLE_RATE are run under cProfile and saved to PROFILING_DIR.
+
+PROFILING_ENABLED = _env("PROFILING_ENABLED", "0") == "1"
+PROFILING_SAMPLE_RATE = float(_env("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_DIR = _env("PROFILING_DIR", str(BASE_DIR / "profiles"))
+PROFILING_MAX_FILES = int(_env("PROFILING_MAX_FILES", "200"))
+PROFILING_TOKEN_MAX_AGE = int(_env("PROFILING_TOKEN_MAX_AGE", "3600"))
+
+
+# Per-request memory accounting (opt-in)
+# Logs requests whose RSS / peak RSS / traced Python allocations grow by more than
+# MEMORY_LOG_THRESHOLD_KB; MEMORY_TRACEMALLOC adds the traced peak, and top
+# allocation sites for a MEMORY_SNAPSHOT_SAMPLE_RATE fraction of requests (slower).
+
+MEMORY_PROFILING_ENABLED = _env("MEMORY_PROFILING_ENABLED", "0") == "1"
+MEMORY_TRACEMALLOC = _env("MEMORY_TRACEMALLOC", "0") == "1"
+MEMORY_TRACEMALLOC_FRAMES = int(_env("MEMORY_TRACEMALLOC_FRAMES", "1"))
+MEMORY_LOG_THRESHOLD_KB = int(_env("MEMORY_LOG_THRESHOLD_KB", "1024"))
+MEMORY_TOP_N = int(_env("MEMORY_TOP_N", "10"))
+MEMORY_SNAPSHOT_SAMPLE_RATE = float(_env("MEMORY_SNAPSHOT_SAMPLE_RATE", "0.01"))
+MEMORY_SNAPSHOT_DIR = _env("MEMORY_SNAPSHOT_DIR", str(BASE_DIR / "memory_snapshots"))
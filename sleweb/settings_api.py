@@ -0,0 +1,35 @@
+"""
+API-only settings profile for scoring-API replicas.
+
+Serves POST /api/score, GET /api/score/<ana>/<mask>, /readyz and /metrics
+with the minimal app and middleware set: no admin, auth, sessions, messages,
+staticfiles, templates or WeasyPrint. Responses of the scoring endpoints are
+identical to the full profile (same security headers).
+
+Entry point: sleweb/wsgi_api.py, e.g.
+    gunicorn sleweb.wsgi_api:application
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'criteria',
+]
+
+MIDDLEWARE = [
+    'criteria.metrics.MetricsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'sleweb.urls_api'
+WSGI_APPLICATION = 'sleweb.wsgi_api.application'
+
+# Only the synchronous API views exist in this profile.
+ASGI_URLCONF = None
+
+TEMPLATES = []
+
+WARMUP_STEPS = ("ruleset", "urls")
+WARMUP_PDF = False
@@ -0,0 +1,9 @@
+"""
+URL configuration of the API-only profile (sleweb.settings_api): the scoring
+API, /readyz and /metrics; no admin or HTML pages.
+"""
+from django.urls import include, path
+
+urlpatterns = [
+    path('', include('criteria.urls_api')),
+]
@@ -0,0 +1,11 @@
+"""
+URL configuration used for ASGI requests (see criteria.async_views.AsgiUrlconfMiddleware):
+the same routes as sleweb.urls, with the async criteria views.
+"""
+from django.contrib import admin
+from django.urls import include, path
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include('criteria.urls_asgi')),
+]
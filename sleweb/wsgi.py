@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sleweb.settings')
 
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.API_FAST_PATH:
+    from criteria.fastpath import ScoreFastPath  # noqa: E402
+
+    application = ScoreFastPath(application)
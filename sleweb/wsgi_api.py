@@ -0,0 +1,22 @@
+"""
+WSGI entry point of the API-only profile (sleweb.settings_api).
+
+Always uses the API settings, whatever DJANGO_SETTINGS_MODULE says, so the
+same image can run either profile by choosing the entry point:
+    gunicorn sleweb.wsgi_api:application
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ['DJANGO_SETTINGS_MODULE'] = 'sleweb.settings_api'
+
+application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.API_FAST_PATH:
+    from criteria.fastpath import ScoreFastPath  # noqa: E402
+
+    application = ScoreFastPath(application)